@@ -0,0 +1,39 @@
+"""
+Сценарии измерения производительности каталога.
+
+Запуск из корня проекта, например:
+    python -m benchmarks.query_plans --copies 100000
+
+Каждый сценарий работает с отдельной временной базой SQLite и не трогает db.sqlite3.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_name=None, settings_module='locallibrary.settings', migrate=True):
+    """Настраивает Django на отдельную базу данных (по умолчанию - новый временный файл) и создаёт таблицы."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    from django.conf import settings
+
+    if db_name is None:
+        db_name = os.path.join(tempfile.mkdtemp(prefix='catalog-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_name
+    django.setup()
+
+    # Разрешает тестовый клиент (ALLOWED_HOSTS = testserver) и почту в памяти
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    return db_name
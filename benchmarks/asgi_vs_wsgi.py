@@ -0,0 +1,152 @@
+"""
+Пропускная способность и задержка страниц каталога под WSGI (синхронные представления, gunicorn)
+и под ASGI (асинхронные представления catalog/async_views.py, uvicorn) на одной и той же заполненной базе.
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.asgi_vs_wsgi --copies 100000 --clients 32 --duration 20
+
+Серверы запускаются по очереди на локальном порту с настройками benchmarks/settings.py; нагрузку создают
+clients потоков с постоянными HTTP-соединениями, каждый по кругу запрашивает страницы каталога.
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks import BASE_DIR, setup_django
+
+SERVERS = {
+    'wsgi': lambda args: ['gunicorn', 'locallibrary.wsgi:application', '--bind', '127.0.0.1:{0}'.format(args.port),
+                          '--workers', str(args.workers), '--threads', str(args.threads), '--worker-class', 'gthread',
+                          '--log-level', 'warning'],
+    'asgi': lambda args: ['uvicorn', 'locallibrary.asgi:application', '--host', '127.0.0.1', '--port', str(args.port),
+                          '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log'],
+}
+
+
+def get_paths():
+    from django.urls import reverse
+    from catalog.models import Author, Book
+
+    book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True)[:50])
+    author_ids = list(Author.objects.order_by('pk').values_list('pk', flat=True)[:50])
+    return ([reverse('index'), reverse('books'), reverse('authors')]
+            + [reverse('book-detail', args=[pk]) for pk in book_ids]
+            + [reverse('author-detail', args=[pk]) for pk in author_ids])
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Сервер завершился с кодом {0}'.format(process.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Сервер не начал принимать соединения за {0} с'.format(timeout))
+
+
+def client(port, paths, offset, stop, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    number = offset
+    while not stop.is_set():
+        path = paths[number % len(paths)]
+        number += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        if response.status != 200:
+            errors.append(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+    connection.close()
+
+
+def run_load(port, paths, clients, duration, warmup):
+    latencies, errors = [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=client, args=(port, paths, number * 7, stop, latencies, errors))
+               for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    # Запросы прогрева не учитываются
+    del latencies[:], errors[:]
+    started = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+    return latencies, errors, elapsed
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def benchmark(mode, args, db_name, paths):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings', CATALOG_BENCH_DB=db_name,
+               CATALOG_ASYNC_VIEWS='1' if mode == 'asgi' else '0', CATALOG_BENCH_CACHE='1' if args.cache else '0')
+    process = subprocess.Popen(SERVERS[mode](args), cwd=str(BASE_DIR), env=env)
+    try:
+        wait_for_port(args.port, process)
+        latencies, errors, elapsed = run_load(args.port, paths, args.clients, args.duration, args.warmup)
+    finally:
+        process.terminate()
+        process.wait()
+    print('{0:<5} {1:>9.1f} запросов/с  p50 {2:>8.2f} мс  p99 {3:>8.2f} мс  ошибок {4}'.format(
+        mode, len(latencies) / elapsed, statistics.median(latencies) if latencies else float('nan'),
+        percentile(latencies, 0.99), len(errors)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=100000, help='количество экземпляров книг')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    parser.add_argument('--clients', type=int, default=32, help='одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=20, help='длительность измерения, с')
+    parser.add_argument('--warmup', type=float, default=3, help='прогрев перед измерением, с')
+    parser.add_argument('--workers', type=int, default=1, help='процессов сервера')
+    parser.add_argument('--threads', type=int, default=8, help='потоков в процессе gunicorn (WSGI)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache', action='store_true', help='включить кэш страниц (по умолчанию отключён)')
+    parser.add_argument('--mode', choices=sorted(SERVERS), action='append', help='только указанный режим')
+    args = parser.parse_args()
+
+    modes = args.mode or ['wsgi', 'asgi']
+    missing = [SERVERS[mode](args)[0] for mode in modes if shutil.which(SERVERS[mode](args)[0]) is None]
+    if missing:
+        sys.exit('Не найдены серверы: {0} (pip install {0})'.format(' '.join(missing)))
+
+    db_name = setup_django(args.db)
+    from django.db import connections
+    from benchmarks.factory import seed
+
+    print('База данных: {0}, экземпляров: {1}, клиентов: {2}'.format(db_name, args.copies, args.clients))
+    seed(args.copies)
+    paths = get_paths()
+    connections.close_all()
+
+    for mode in modes:
+        benchmark(mode, args, db_name, paths)
+
+
+if __name__ == '__main__':
+    main()
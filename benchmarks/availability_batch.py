@@ -0,0 +1,75 @@
+"""
+Доступность копий для пакета ISBN (catalog/availability.py): по одному запросу к базе на книгу (как при
+загрузке страницы каждой книги) и пакетом - один сгруппированный запрос на порцию из CHUNK_SIZE ISBN.
+Пакетный вариант измеряется через представление /catalog/availability/ целиком, без сжатия и с gzip.
+
+    python -m benchmarks.availability_batch --copies 100000 --isbns 10000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+
+
+def per_book(isbns):
+    """Счётчики копий отдельным запросом для каждой книги."""
+    from catalog.availability import counts
+
+    return [counts([isbn]).get(isbn) for isbn in isbns]
+
+
+def batch(isbns, encoding=''):
+    """Ответ представления целиком; возвращает размер тела в байтах."""
+    from django.test import Client
+
+    response = Client().post('/catalog/availability/', '\n'.join(isbns), content_type='text/plain',
+                             HTTP_ACCEPT_ENCODING=encoding)
+    assert response.status_code == 200, response.status_code
+    return len(b''.join(response.streaming_content))
+
+
+def measure(name, function, *args):
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    # Счётчик через execute_wrapper: журнал connection.queries очищается в начале каждого запроса клиента
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+    size = '{0:>9} байт'.format(result) if isinstance(result, int) else ''
+    print('{0:<16} {1:>8.1f} мс  запросов {2:>6}  {3}'.format(name, elapsed * 1000, queries, size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=100000, help='количество экземпляров книг')
+    parser.add_argument('--isbns', type=int, default=10000, help='ISBN в пакете (10%% - неизвестные)')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from catalog.models import Book
+    from benchmarks.factory import seed
+
+    print('База данных: {0}, экземпляров: {1}, ISBN в пакете: {2}'.format(db_name, args.copies, args.isbns))
+    seed(args.copies)
+    rnd = random.Random(0)
+    known = list(Book.objects.values_list('isbn', flat=True))
+    isbns = [rnd.choice(known) if number % 10 else 'X{0:012d}'.format(number) for number in range(args.isbns)]
+
+    measure('по одной книге', per_book, isbns)
+    measure('пакет', batch, isbns)
+    measure('пакет, gzip', batch, isbns, 'gzip')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Детерминированное заполнение каталога синтетическими данными (bulk_create пачками).
+"""
+
+import datetime
+import itertools
+import random
+
+BATCH_SIZE = 5000
+
+# Распределение статусов копий: в наличии, выдана, зарезервирована, на обслуживании
+STATUS_WEIGHTS = (('н', 50), ('в', 30), ('р', 10), ('о', 10))
+
+
+def bulk_create(model, objs):
+    """bulk_create по частям: генератор не разворачивается в список целиком."""
+    objs = iter(objs)
+    while True:
+        batch = list(itertools.islice(objs, BATCH_SIZE))
+        if not batch:
+            break
+        model.objects.bulk_create(batch)
+
+
+def popularity(count, skew):
+    """Накопленные веса для random.choices(): вес элемента с номером n пропорционален 1 / (n + 1) ** skew (Ципф)."""
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def seed(copies, books=None, authors=None, genres=20, languages=5, borrowers=50, random_seed=0, skew=0):
+    """Создаёт copies экземпляров книг; книг по умолчанию в 4 раза меньше, авторов - в 10 раз меньше книг.
+
+    skew = 0 - авторы, жанры и копии распределены по книгам равномерно; skew > 0 - неравномерно, как в настоящем
+    каталоге: у немногих авторов много книг, у популярных жанров и книг - больше книг и копий.
+    """
+    from django.contrib.auth.models import User, Permission
+    from catalog.models import Author, Genre, Language, Book, BookInstance
+
+    rnd = random.Random(random_seed)
+    books = books or max(1, copies // 4)
+    authors = authors or max(1, books // 10)
+    today = datetime.date.today()
+
+    def chooser(ids):
+        """Выбор одного из ids: равномерно или с учётом популярности (skew)."""
+        if not skew:
+            return lambda: rnd.choice(ids)
+        cum_weights = popularity(len(ids), skew)
+        return lambda: rnd.choices(ids, cum_weights=cum_weights)[0]
+
+    genre_ids = [Genre.objects.create(name='Жанр {0}'.format(number)).pk for number in range(genres)]
+    language_ids = [Language.objects.create(name='Язык {0}'.format(number)).pk for number in range(languages)]
+
+    staff = User.objects.create_user('staff', password='staff', is_staff=True, is_superuser=True)
+    staff.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+    User.objects.bulk_create(User(username='reader{0}'.format(number)) for number in range(borrowers))
+    borrower_ids = list(User.objects.values_list('pk', flat=True))
+
+    bulk_create(Author, (
+        Author(first_name='Имя{0}'.format(number % 97), last_name='Фамилия{0}'.format(number))
+        for number in range(authors)))
+    author_ids = list(Author.objects.values_list('pk', flat=True))
+    choose_author = chooser(author_ids)
+
+    bulk_create(Book, (
+        Book(title='Книга {0}'.format(number), summary='Краткое изложение книги {0}'.format(number),
+             isbn='{0:013d}'.format(number), author_id=choose_author(),
+             language_id=rnd.choice(language_ids))
+        for number in range(books)))
+    book_ids = list(Book.objects.values_list('pk', flat=True))
+
+    choose_genre = chooser(genre_ids)
+    choose_book = chooser(book_ids)
+
+    def book_genres():
+        if not skew:
+            return rnd.sample(genre_ids, rnd.randint(1, 3))
+        return sorted({choose_genre() for _ in range(rnd.randint(1, 3))})
+
+    through = Book.genre.through
+    bulk_create(through, (
+        through(book_id=book_id, genre_id=genre_id)
+        for book_id in book_ids for genre_id in book_genres()))
+
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+
+    def instances():
+        for number in range(copies):
+            status = rnd.choices(statuses, weights)[0]
+            loaned = status in ('в', 'р')
+            yield BookInstance(book_id=choose_book() if skew else book_ids[number % len(book_ids)],
+                               imprint='Издание {0}'.format(number % 13),
+                               status=status,
+                               due_back=today + datetime.timedelta(days=rnd.randint(-30, 30)) if loaned else None,
+                               borrower_id=rnd.choice(borrower_ids) if loaned else None)
+
+    bulk_create(BookInstance, instances())
+    return staff
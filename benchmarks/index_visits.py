@@ -0,0 +1,117 @@
+"""
+Пропускная способность главной страницы при одновременных посетителях: счётчик посещений в сессии
+(как было: запись django_session на каждый просмотр) и в подписанном cookie (catalog/visits.py).
+
+    python -m benchmarks.index_visits --clients 16 --duration 10
+
+Каждый поток - отдельный авторизованный посетитель со своим тестовым клиентом и соединением с базой данных.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks import setup_django
+
+
+def session_index(request):
+    """Главная страница со счётчиком посещений в сессии (вариант до переноса счётчика в cookie)."""
+    from django.shortcuts import render
+    from catalog.stats import CatalogStats
+    from catalog.visits import the_ending
+
+    num_visits = request.session.get('num_visits', 0)
+    request.session['num_visits'] = num_visits + 1
+    return render(request, 'catalog/index.html', context={
+        **CatalogStats.get(),
+        'num_visits': num_visits,
+        'the_ending': the_ending(num_visits),
+    })
+
+
+# URLconf сценария (ROOT_URLCONF): заполняется в main() после настройки Django
+urlpatterns = []
+
+
+def visitor(user, url, stop, latencies, counters, lock):
+    from django.db import connection, OperationalError
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+    client.get(url)
+    writes = errors = 0
+    timings = []
+
+    def count_writes(execute, sql, params, many, context):
+        nonlocal writes
+        if not sql.lstrip().upper().startswith('SELECT'):
+            writes += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_writes):
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = client.get(url)
+            except OperationalError:
+                # database is locked: запись сессии не дождалась блокировки SQLite
+                errors += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+    connection.close()
+    with lock:
+        latencies.extend(timings)
+        counters['writes'] += writes
+        counters['errors'] += errors
+
+
+def measure(name, url, users, duration):
+    latencies, counters, lock = [], {'writes': 0, 'errors': 0}, threading.Lock()
+    stop = threading.Event()
+    threads = [threading.Thread(target=visitor, args=(user, url, stop, latencies, counters, lock))
+               for user in users]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    print('{0:<8} {1:>8.1f} запросов/с  p50 {2:>7.2f} мс  p99 {3:>7.2f} мс  записей {4:>6}  ошибок {5}'.format(
+        name, len(latencies) / duration, statistics.median(latencies),
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], counters['writes'], counters['errors']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=10000, help='количество экземпляров книг')
+    parser.add_argument('--clients', type=int, default=16, help='одновременных посетителей')
+    parser.add_argument('--duration', type=float, default=10, help='длительность измерения, с')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.urls import include, path
+    from benchmarks.factory import seed
+
+    urlpatterns.extend([
+        path('session-index/', session_index),
+        path('catalog/', include('catalog.urls')),
+        path('accounts/', include('django.contrib.auth.urls')),
+    ])
+    settings.ROOT_URLCONF = __name__
+    print('База данных: {0}, экземпляров: {1}, посетителей: {2}'.format(db_name, args.copies, args.clients))
+    seed(args.copies)
+    users = list(User.objects.filter(username__startswith='reader').order_by('pk')[:args.clients])
+
+    measure('сессия', '/session-index/', users, args.duration)
+    measure('cookie', '/catalog/', users, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Нагрузочная проверка сервиса выдачи (catalog/loans.py): процессы-читатели одновременно берут копии одной
+книги с ограниченным количеством копий, возвращают их и встают в очередь, когда копий нет.
+
+    python -m benchmarks.loan_stress --copies 10 --borrowers 16 --duration 15
+
+Первый этап - одновременная выдача: все читатели в один момент запрашивают книгу, выдано должно быть ровно
+--copies разных копий. Второй этап - выдача, возврат и очередь в течение --duration секунд; каждый процесс
+записывает интервалы, когда копия была у его читателя. После него проверяется, что интервалы владения одной
+копией у разных читателей не пересекаются (копия не выдана дважды) и журнал доступности совпадает с копиями.
+Используются настройки рабочего сервера (WAL, BEGIN IMMEDIATE, busy_timeout): locallibrary/settings_production.py.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+from benchmarks import setup_django
+
+SETTINGS = 'locallibrary.settings_production'
+
+
+def worker(number, db_name, barrier, duration, results):
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    setup_django(db_name, SETTINGS, migrate=False)
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+    from catalog import loans
+    from catalog.models import Book, BookInstance, Hold
+
+    rnd = random.Random(number)
+    book = Book.objects.get()
+    user = User.objects.get(username='reader{0}'.format(number))
+
+    # Этап 1: все процессы запрашивают книгу в один и тот же момент
+    barrier.wait()
+    try:
+        first = loans.checkout_book(book, user).pk
+    except loans.LoanError:
+        first = None
+    results.put(('burst', number, first))
+    # Возврат - только после того, как все процессы сделали первую попытку
+    barrier.wait()
+    if first is not None:
+        loans.return_book(BookInstance(pk=first, book_id=book.pk))
+
+    # Этап 2: выдача - чтение - возврат; без копий - очередь и ожидание резерва
+    intervals, latencies = [], []
+    checkouts = holds = locked = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            try:
+                copy = loans.checkout_book(book, user)
+            except loans.LoanError:
+                hold = loans.reserve_book(book, user)
+                holds += 1
+                while hold.copy_id is None and time.time() < deadline:
+                    time.sleep(0.005)
+                    hold = Hold.objects.filter(pk=hold.pk).first()
+                    if hold is None:
+                        break
+                if hold is None or hold.copy_id is None:
+                    if hold is not None:
+                        loans.cancel_hold(hold)
+                    continue
+                started = time.perf_counter()
+                copy = loans.checkout_book(book, user)
+            latencies.append((time.perf_counter() - started) * 1000)
+            checkouts += 1
+            taken = time.time()
+            time.sleep(rnd.uniform(0, 0.01))
+            returned = time.time()
+            loans.return_book(copy)
+            intervals.append((str(copy.pk), taken, returned))
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+    results.put(('churn', number, (intervals, latencies, checkouts, holds, locked)))
+
+
+def overlaps(intervals):
+    """Пары пересекающихся интервалов владения одной копией у разных читателей."""
+    by_copy = {}
+    for borrower, (copy, taken, returned) in intervals:
+        by_copy.setdefault(copy, []).append((taken, returned, borrower))
+    found = []
+    for copy, spans in by_copy.items():
+        spans.sort()
+        for (taken, returned, borrower), (next_taken, _, next_borrower) in zip(spans, spans[1:]):
+            # Запись времени идёт после выдачи и до возврата, поэтому настоящие интервалы вложены в записанные
+            if next_taken < returned and borrower != next_borrower:
+                found.append((copy, borrower, next_borrower))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=10, help='копий книги')
+    parser.add_argument('--borrowers', type=int, default=16, help='процессов-читателей')
+    parser.add_argument('--duration', type=float, default=15, help='длительность второго этапа, с')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    db_name = setup_django(None, SETTINGS)
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from catalog import loans
+    from catalog.models import Author, Book, BookInstance, Hold
+
+    author = Author.objects.create(first_name='Имя', last_name='Фамилия')
+    book = Book.objects.create(title='Книга', summary='Краткое изложение', isbn='0000000000001', author=author)
+    BookInstance.objects.bulk_create(BookInstance(book=book, imprint='Издание', status='н')
+                                     for _ in range(args.copies))
+    loans.refresh([book.pk])
+    User.objects.bulk_create(User(username='reader{0}'.format(number)) for number in range(args.borrowers))
+    connections.close_all()
+    print('База данных: {0}, копий: {1}, читателей: {2}'.format(db_name, args.copies, args.borrowers))
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    barrier = context.Barrier(args.borrowers)
+    processes = [context.Process(target=worker, args=(number, db_name, barrier, args.duration, results))
+                 for number in range(args.borrowers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in range(2 * len(processes))]
+    for process in processes:
+        process.join()
+
+    failures = []
+    burst = [copy for kind, _, copy in collected if kind == 'burst' and copy is not None]
+    print('Одновременная выдача: выдано {0} из {1} копий, разных копий: {2}'.format(
+        len(burst), args.copies, len(set(burst))))
+    if len(burst) != min(args.copies, args.borrowers) or len(set(burst)) != len(burst):
+        failures.append('одновременная выдача: ожидалось {0} разных копий'.format(min(args.copies, args.borrowers)))
+
+    churn = [result for kind, _, result in collected if kind == 'churn']
+    intervals = [(borrower, span) for borrower, result in enumerate(churn) for span in result[0]]
+    latencies = sorted(value for result in churn for value in result[1])
+    print('Выдач: {0} ({1:.1f}/с), постановок в очередь: {2}, "database is locked": {3}'.format(
+        sum(result[2] for result in churn), sum(result[2] for result in churn) / args.duration,
+        sum(result[3] for result in churn), sum(result[4] for result in churn)))
+    if latencies:
+        print('Выдача: p50 {0:.2f} мс, p99 {1:.2f} мс'.format(
+            statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]))
+
+    conflicts = overlaps(intervals)
+    if conflicts:
+        failures.append('копия выдана двум читателям одновременно: {0}'.format(conflicts[:5]))
+    if loans.refresh([book.pk]):
+        failures.append('журнал доступности расходится с копиями')
+    if BookInstance.objects.exclude(status='н').exists() or Hold.objects.exists():
+        failures.append('после возврата всех копий остались выданные копии или записи очереди')
+
+    if failures:
+        print('\nОшибки:\n    ' + '\n    '.join(failures))
+        sys.exit(1)
+    print('Проверки пройдены: двойных выдач нет, журнал доступности совпадает с копиями.')
+
+
+if __name__ == '__main__':
+    main()
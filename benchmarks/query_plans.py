@@ -0,0 +1,115 @@
+"""
+Планы запросов (EXPLAIN QUERY PLAN) и время ответа представлений каталога
+без индексов из миграции 0006_catalog_indexes и с ними.
+
+    python -m benchmarks.query_plans --copies 100000 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks import setup_django
+
+
+def get_urls(staff):
+    from django.urls import reverse
+    from catalog.models import Author, Book
+
+    book = Book.objects.order_by('pk').first()
+    author = Author.objects.order_by('pk').first()
+    return [
+        ('index', reverse('index'), None),
+        ('books', reverse('books'), None),
+        ('book-detail', reverse('book-detail', args=[book.pk]), None),
+        ('authors', reverse('authors'), None),
+        ('author-detail', reverse('author-detail', args=[author.pk]), None),
+        ('my-borrowed', reverse('my-borrowed'), staff),
+        ('all-borrowed', reverse('all-borrowed'), staff),
+        ('admin-bookinstance', '/admin/catalog/bookinstance/?status__exact=в', staff),
+    ]
+
+
+def measure(urls, repeat):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    results = []
+    for name, url, user in urls:
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        timings = []
+        for _ in range(repeat):
+            # Счётчики главной страницы кэшируются - сбрасываем, чтобы измерять запросы
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        results.append((name, url, statistics.median(timings), len(queries), plans))
+    return results
+
+
+def report(title, results, verbose):
+    print('\n=== {0}'.format(title))
+    for name, url, latency, num_queries, plans in results:
+        print('{0:<20} {1:>9.2f} мс  {2:>3} запросов  {3}'.format(name, latency, num_queries, url))
+        for sql, plan in plans:
+            if verbose:
+                print('    ' + sql[:200])
+            for line in plan:
+                print('        ' + line)
+
+
+def catalog_indexes():
+    from catalog.models import Author, Book, BookInstance
+
+    return [(model, index) for model in (Author, Book, BookInstance) for index in model._meta.indexes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=100000, help='количество экземпляров книг')
+    parser.add_argument('--repeat', type=int, default=5, help='повторов каждого запроса')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    parser.add_argument('--verbose', action='store_true', help='выводить SQL запросов')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from django.db import connection
+    from benchmarks.factory import seed
+
+    print('База данных: {0}, экземпляров: {1}'.format(db_name, args.copies))
+    staff = seed(args.copies)
+    urls = get_urls(staff)
+
+    with connection.schema_editor() as editor:
+        for model, index in catalog_indexes():
+            editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    report('До: без индексов 0006_catalog_indexes', measure(urls, args.repeat), args.verbose)
+
+    with connection.schema_editor() as editor:
+        for model, index in catalog_indexes():
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    report('После: с индексами 0006_catalog_indexes', measure(urls, args.repeat), args.verbose)
+
+
+if __name__ == '__main__':
+    main()
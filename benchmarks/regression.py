@@ -0,0 +1,274 @@
+"""
+Контроль производительности каталога: количество SQL-запросов, время ответа (p50/p99) и пиковая память
+(tracemalloc) для каждого адреса catalog/urls.py и списков изменений администратора на синтетических данных
+заданного размера. Результаты сравниваются с базовыми значениями benchmarks/baselines/<размер>.json:
+при регрессии количества запросов или памяти сценарий завершается с кодом 1, отклонение времени ответа
+выводится как предупреждение.
+
+    python -m benchmarks.regression --scale 100k             # сравнить с базовыми значениями
+    python -m benchmarks.regression --scale 100k --update    # записать новые базовые значения
+    python -m benchmarks.regression --scale 1m --db /tmp/catalog-1m.sqlite3   # база заполняется один раз
+
+Данные создаются детерминированно (benchmarks/factory.py, неравномерное распределение авторов, жанров
+и копий). Для страниц книги и автора берутся книга с наибольшим числом копий и автор с наибольшим числом
+книг - на них проблема N+1 заметнее всего, для обзора - жанр с наибольшим числом книг. Кэш очищается
+перед каждым запросом: измеряется работа с базой.
+Время зависит от машины и её загрузки: даже на той же машине быстрые страницы (единицы миллисекунд)
+от запуска к запуску колеблются в разы, поэтому время не останавливает проверку, а только предупреждает.
+Базовые значения времени и памяти нужно записывать на той же машине, где идёт сравнение; количество
+запросов от машины не зависит.
+"""
+
+import argparse
+import gc
+import io
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks import setup_django
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+BASELINES_DIR = Path(__file__).resolve().parent / 'baselines'
+
+# Неравномерность распределения по популярности (показатель Ципфа, см. benchmarks/factory.py)
+SKEW = 0.8
+
+# Допустимые отклонения от базовых значений (записываются в файл базовых значений вместе с ними):
+# запросов - сверх базового количества; время и память - в долях от базового значения, но не меньше *_floor.
+# Порог времени - только для предупреждений: шум планировщика и кэшей ОС не должен давать ложных срабатываний.
+THRESHOLDS = {
+    'queries': 0,
+    'p50': 1.0,
+    'p99': 2.0,
+    'latency_floor_ms': 25.0,
+    'peak': 0.5,
+    'peak_floor_kib': 256,
+}
+
+
+class Sample:
+    """Измеряемый адрес: name - имя в отчёте, url_name - имя маршрута, repeat - предел количества повторов."""
+
+    def __init__(self, name, url_name, url, user=None, repeat=None):
+        self.name = name
+        self.url_name = url_name
+        self.url = url
+        self.user = user
+        self.repeat = repeat
+
+
+def get_samples(staff):
+    from django.contrib import admin
+    from django.db.models import Count
+    from django.urls import reverse
+    from catalog.models import Author, Book, Genre
+
+    book = Book.objects.annotate(copies=Count('bookinstance')).order_by('-copies', 'pk').first()
+    author = Author.objects.annotate(books=Count('book')).order_by('-books', 'pk').first()
+    genre = Genre.objects.annotate(books=Count('book')).order_by('-books', 'pk').first()
+    word = book.title.split()[0]
+
+    samples = [
+        Sample('index', 'index', reverse('index')),
+        Sample('books', 'books', reverse('books')),
+        Sample('book-detail', 'book-detail', reverse('book-detail', args=[book.pk])),
+        Sample('authors', 'authors', reverse('authors')),
+        Sample('author-detail', 'author-detail', reverse('author-detail', args=[author.pk])),
+        Sample('my-borrowed', 'my-borrowed', reverse('my-borrowed'), staff),
+        Sample('all-borrowed', 'all-borrowed', reverse('all-borrowed'), staff),
+        Sample('search', 'search', reverse('search') + '?q=' + word),
+        Sample('browse', 'browse', reverse('browse') + '?genre={0}'.format(genre.pk)),
+        # Выгрузка всего набора данных: повторов меньше, важны запросы и память (поток)
+        Sample('export-books', 'catalog-export', reverse('catalog-export', args=['books']) + '?format=jsonl',
+               staff, repeat=3),
+        Sample('availability', 'availability',
+               reverse('availability') + '?isbn=' + ','.join(Book.objects.order_by('pk')
+                                                             .values_list('isbn', flat=True)[:100])),
+        Sample('metrics', 'metrics', reverse('metrics'), staff),
+        Sample('api-books', 'api-list', reverse('api-list', args=['books']) + '?fields=id,title,genres&limit=100'),
+        Sample('api-book', 'api-detail', reverse('api-detail', args=['books', book.pk])),
+    ]
+    for model in admin.site._registry:
+        if model._meta.app_label == 'catalog':
+            url_name = 'admin:catalog_{0}_changelist'.format(model._meta.model_name)
+            samples.append(Sample(url_name.split(':')[1], url_name, reverse(url_name), staff))
+    return samples
+
+
+def check_coverage(samples):
+    """Каждый адрес catalog/urls.py должен измеряться: новый адрес без Sample - ошибка сценария."""
+    from catalog.urls import urlpatterns
+
+    missing = {pattern.name for pattern in urlpatterns} - {sample.url_name for sample in samples}
+    if missing:
+        sys.exit('Нет измерения для адресов catalog/urls.py: {0} (добавьте Sample в get_samples())'.format(
+            ', '.join(sorted(missing))))
+
+
+def request(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def measure(sample, repeat):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    if sample.user is not None:
+        client.force_login(sample.user)
+    # Первый запрос - прогрев (загрузка шаблонов, ContentType и т. п.)
+    cache.clear()
+    request(client, sample.url)
+
+    counts = []
+
+    def count(execute, sql, params, many, context):
+        counts[-1] += 1
+        return execute(sql, params, many, context)
+
+    # Сборка мусора во время измерения даёт случайные выбросы p99: она выполняется заранее и отключается
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(min(repeat, sample.repeat or repeat)):
+            cache.clear()
+            counts.append(0)
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                request(client, sample.url)
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+
+    # Память - отдельным запросом: tracemalloc замедляет выполнение
+    cache.clear()
+    tracemalloc.start()
+    try:
+        request(client, sample.url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'url': sample.url,
+        'queries': max(counts),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def compare(name, result, baseline, thresholds):
+    """Регрессии результата result относительно baseline: (количество запросов и память, время ответа)."""
+    problems, warnings = [], []
+    if result['queries'] > baseline['queries'] + thresholds['queries']:
+        problems.append('запросов {0} вместо {1}'.format(result['queries'], baseline['queries']))
+    allowed = baseline['peak_kib'] + max(baseline['peak_kib'] * thresholds['peak'], thresholds['peak_floor_kib'])
+    if result['peak_kib'] > allowed:
+        problems.append('память {0} КиБ, допустимо до {1:.0f} КиБ'.format(result['peak_kib'], allowed))
+    for key, limit in (('p50_ms', thresholds['p50']), ('p99_ms', thresholds['p99'])):
+        allowed = baseline[key] + max(baseline[key] * limit, thresholds['latency_floor_ms'])
+        if result[key] > allowed:
+            warnings.append('{0} {1} мс, допустимо до {2:.2f} мс'.format(key[:3], result[key], allowed))
+    return (['{0}: {1}'.format(name, problem) for problem in problems],
+            ['{0}: {1}'.format(name, warning) for warning in warnings])
+
+
+def prepare(scale, db):
+    """Заполняет базу (или проверяет уже заполненную --db) и возвращает сотрудника."""
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from catalog.models import BookInstance
+    from benchmarks.factory import seed
+
+    copies = SCALES[scale]
+    existing = BookInstance.objects.count()
+    if existing:
+        if existing != copies:
+            sys.exit('В базе {0} уже {1} экземпляров, а для размера {2} нужно {3}.'.format(
+                db, existing, scale, copies))
+        return User.objects.get(username='staff')
+    staff = seed(copies, skew=SKEW)
+    # bulk_create не вызывает сигналы: индекс поиска, сводки обзора и статистика планировщика строятся отдельно
+    call_command('rebuild_search_index', stdout=io.StringIO())
+    call_command('rebuild_facets', stdout=io.StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return staff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='размер данных (экземпляров книг)')
+    parser.add_argument('--repeat', type=int, default=50, help='повторов каждого запроса')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    parser.add_argument('--update', action='store_true', help='записать результаты как базовые значения')
+    parser.add_argument('--only', action='append', help='измерять только указанные адреса (имя в отчёте)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from django.conf import settings
+    # Журнал медленных запросов (catalog/metrics.py) не нужен: замер памяти под tracemalloc всегда медленный
+    settings.CATALOG_SLOW_REQUEST_MS = float('inf')
+    print('База данных: {0}, размер: {1} ({2} экземпляров)'.format(db_name, args.scale, SCALES[args.scale]))
+    staff = prepare(args.scale, db_name)
+    samples = get_samples(staff)
+    check_coverage(samples)
+    if args.only:
+        samples = [sample for sample in samples if sample.name in args.only]
+
+    baseline_path = BASELINES_DIR / '{0}.json'.format(args.scale)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    thresholds = baseline['thresholds'] if baseline else THRESHOLDS
+
+    results, regressions, slow = {}, [], []
+    for sample in samples:
+        result = results[sample.name] = measure(sample, args.repeat)
+        previous = baseline['views'].get(sample.name) if baseline else None
+        problems, warnings = compare(sample.name, result, previous, thresholds) if previous else ([], [])
+        regressions.extend(problems)
+        slow.extend(warnings)
+        print('{0:<32} {1:>4} запросов  p50 {2:>8.2f} мс  p99 {3:>8.2f} мс  {4:>7} КиБ  {5}'.format(
+            sample.name, result['queries'], result['p50_ms'], result['p99_ms'], result['peak_kib'],
+            'РЕГРЕССИЯ' if problems else 'медленнее' if warnings else ('новый' if baseline and not previous else '')))
+
+    if args.update:
+        views = dict(baseline['views']) if baseline and args.only else {}
+        views.update(results)
+        BASELINES_DIR.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps({
+            'scale': args.scale,
+            'copies': SCALES[args.scale],
+            'thresholds': thresholds,
+            'views': views,
+        }, ensure_ascii=False, indent=2) + '\n')
+        print('Базовые значения записаны: {0}'.format(baseline_path))
+    elif baseline is None:
+        print('Нет базовых значений {0}: запустите с --update.'.format(baseline_path))
+    if slow and not args.update:
+        print('\nПредупреждения (время ответа зависит от загрузки машины, проверка не останавливается):')
+        for warning in slow:
+            print('    ' + warning)
+    if regressions and not args.update:
+        print('\nРегрессии:')
+        for problem in regressions:
+            print('    ' + problem)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""
+Настройки для запуска сервера приложений в сценариях benchmarks/ (см. benchmarks/asgi_vs_wsgi.py).
+
+База данных и режим задаются переменными окружения, которые выставляет сценарий:
+    CATALOG_BENCH_DB - файл заполненной базы данных SQLite;
+    CATALOG_ASYNC_VIEWS=1 - асинхронные представления каталога;
+    CATALOG_BENCH_CACHE=1 - кэш страниц в памяти (по умолчанию кэш отключён и измеряется работа с базой данных).
+"""
+
+import os
+
+from locallibrary.settings import *  # noqa: F401,F403
+from locallibrary.settings import DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES['default']['NAME'] = os.environ['CATALOG_BENCH_DB']
+
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS') == '1'
+
+if os.environ.get('CATALOG_BENCH_CACHE') != '1':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
@@ -0,0 +1,149 @@
+"""
+Смешанная нагрузка на SQLite: процессы-читатели (списки и страницы книг, счётчики главной страницы)
+и процессы-писатели (выдача и возврат копий через catalog/loans.py) одновременно работают с одной базой.
+Сравниваются настройки разработки (locallibrary/settings.py) и рабочего сервера
+(locallibrary/settings_production.py: WAL, PRAGMA, BEGIN IMMEDIATE, постоянные соединения).
+
+    python -m benchmarks.sqlite_concurrency --copies 100000 --readers 6 --writers 4 --duration 15
+
+Каждая операция оформлена как запрос (сигналы request_started/request_finished), поэтому соединения
+закрываются или переиспользуются так же, как на сервере, в зависимости от CONN_MAX_AGE.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import time
+
+from benchmarks import setup_django
+
+PROFILES = [
+    ('разработка', 'locallibrary.settings'),
+    ('рабочий', 'locallibrary.settings_production'),
+]
+
+
+def read_operation(rnd, book_ids):
+    from catalog.models import Book
+    from catalog.stats import CatalogStats
+
+    kind = rnd.randrange(3)
+    if kind == 0:
+        list(Book.objects.select_related('author', 'availability').filter(pk__gt=rnd.choice(book_ids))
+             .order_by('pk')[:20])
+    elif kind == 1:
+        book = Book.objects.select_related('author', 'language').prefetch_related('genre', 'bookinstance_set') \
+            .get(pk=rnd.choice(book_ids))
+        list(book.bookinstance_set.all())
+    else:
+        CatalogStats.compute()
+
+
+def write_operation(rnd, copies, user_ids):
+    from django.contrib.auth.models import User
+    from catalog import loans
+    from catalog.models import BookInstance
+
+    pk, book_id = rnd.choice(copies)
+    copy = BookInstance(pk=pk, book_id=book_id)
+    try:
+        loans.checkout_copy(copy, User(pk=rnd.choice(user_ids)))
+    except loans.LoanError:
+        try:
+            loans.return_copy(copy)
+        except loans.LoanError:
+            return False
+    return True
+
+
+def worker(role, settings_module, db_name, duration, random_seed, results):
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    setup_django(db_name, settings_module, migrate=False)
+
+    from django.contrib.auth.models import User
+    from django.core.signals import request_started, request_finished
+    from django.db import OperationalError
+    from catalog.models import Book, BookInstance
+
+    rnd = random.Random(random_seed)
+    book_ids = list(Book.objects.values_list('pk', flat=True))
+    copies = list(BookInstance.objects.values_list('pk', 'book_id'))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+
+    latencies, locked, conflicts = [], 0, 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        request_started.send(sender=worker)
+        started = time.perf_counter()
+        try:
+            if role == 'read':
+                read_operation(rnd, book_ids)
+            elif not write_operation(rnd, copies, user_ids):
+                conflicts += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+        finally:
+            request_finished.send(sender=worker)
+    results.put((role, latencies, locked, conflicts))
+
+
+def run_profile(name, settings_module, db_name, args):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    roles = ['read'] * args.readers + ['write'] * args.writers
+    processes = [context.Process(target=worker, args=(role, settings_module, db_name, args.duration, number, results))
+                 for number, role in enumerate(roles)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print('\n=== {0} ({1})'.format(name, settings_module))
+    for role, title in (('read', 'чтение'), ('write', 'запись')):
+        latencies = sorted(value for result in collected if result[0] == role for value in result[1])
+        locked = sum(result[2] for result in collected if result[0] == role)
+        conflicts = sum(result[3] for result in collected if result[0] == role)
+        if not latencies:
+            print('{0:<7} нет выполненных операций, "database is locked": {1}'.format(title, locked))
+            continue
+        print('{0:<7} {1:>8.1f} опер./с  p50 {2:>7.2f} мс  p99 {3:>8.2f} мс  "database is locked": {4}'
+              '  конфликтов: {5}'.format(title, len(latencies) / args.duration, statistics.median(latencies),
+                                        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+                                        locked, conflicts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=100000, help='количество экземпляров книг')
+    parser.add_argument('--readers', type=int, default=6, help='процессов-читателей')
+    parser.add_argument('--writers', type=int, default=4, help='процессов-писателей')
+    parser.add_argument('--duration', type=float, default=15, help='длительность измерения, с')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from django.db import connections
+    from benchmarks.factory import seed
+
+    print('База данных: {0}, экземпляров: {1}, читателей: {2}, писателей: {3}'.format(
+        db_name, args.copies, args.readers, args.writers))
+    seed(args.copies)
+    connections.close_all()
+
+    for name, settings_module in PROFILES:
+        # Отдельная копия базы для каждого профиля: режим WAL сохраняется в файле базы данных
+        profile_db = '{0}.{1}'.format(db_name, settings_module.rsplit('.', 1)[-1])
+        shutil.copyfile(db_name, profile_db)
+        run_profile(name, settings_module, profile_db, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Время запуска процесса приложения и команд manage.py с настройками разработки (locallibrary/settings.py)
+и рабочего сервера (locallibrary/settings_production.py), и отчёт python -X importtime: какие модули
+и пакеты импортируются дольше всего на каждом этапе запуска рабочего процесса.
+
+    python -m benchmarks.startup --repeat 10
+
+Рабочий процесс запускается заново repeat раз и проходит те же этапы, что и locallibrary/wsgi.py:
+    настройка    - django.setup() и создание WSGIHandler (настройки, приложения, модели, промежуточные слои);
+    preload      - URLconf и шаблонные движки (locallibrary/preload.py; без неё это часть первого запроса);
+    1-й запрос   - первая страница каталога (соединение с базой данных, отрисовка шаблона);
+    2-й запрос   - следующая страница, для сравнения с первым.
+Время процесса - от запуска интерпретатора до завершения, "python -c pass" - запуск самого интерпретатора.
+Сценарий не трогает db.sqlite3: процессы работают с временной заполненной базой.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import BASE_DIR, setup_django
+
+PROFILES = [
+    ('разработка', 'locallibrary.settings'),
+    ('рабочий сервер', 'locallibrary.settings_production'),
+]
+
+PHASES = ['настройка', 'preload', '1-й запрос', '2-й запрос']
+
+# Выполняется в отдельном процессе: время этапов в мс в stdout, метка этапа в stderr (для -X importtime)
+WORKER = '''
+import io, sys, time
+start = time.perf_counter()
+timings = []
+
+def phase(name):
+    global start
+    now = time.perf_counter()
+    timings.append((now - start) * 1000)
+    sys.stderr.write('#phase ' + name + '\\n')
+    start = time.perf_counter()
+
+def get(handler, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+               'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+               'wsgi.errors': sys.stderr}
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(response)
+    response.close()
+    assert statuses[0].startswith('200'), (path, statuses[0])
+
+import django
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = sys.argv[1]
+settings.STATIC_ROOT = sys.argv[2]
+django.setup(set_prefix=False)
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+phase('настройка')
+from locallibrary.preload import preload
+preload()
+phase('preload')
+get(handler, '/catalog/books/')
+phase('1-й запрос')
+get(handler, '/catalog/authors/')
+phase('2-й запрос')
+print(' '.join('{0:.3f}'.format(ms) for ms in timings))
+'''
+
+COMMANDS = [
+    ('manage.py check', ['manage.py', 'check']),
+    ('manage.py showmigrations', ['manage.py', 'showmigrations', 'catalog']),
+]
+
+
+def environment(settings_module, db_name):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, DJANGO_DB_PATH=db_name)
+    env.setdefault('DJANGO_SECRET_KEY', 'benchmark-startup')
+    return env
+
+
+def run(args, env):
+    """Запускает python args; возвращает (время процесса в мс, stdout, stderr)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode:
+        raise RuntimeError('{0} завершился с кодом {1}:\n{2}'.format(' '.join(args), result.returncode, result.stderr))
+    return elapsed, result.stdout, result.stderr
+
+
+def parse_importtime(stderr):
+    """[(этап, модуль, собственное время, суммарное время в мкс, вложенность)] из вывода -X importtime."""
+    rows = []
+    phases = iter(PHASES)
+    current = next(phases)
+    for line in stderr.splitlines():
+        if line.startswith('#phase '):
+            current = next(phases, None)
+            continue
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((current, name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+    return rows
+
+
+def package(module):
+    top = module.split('.')[0]
+    return 'стандартная библиотека' if top in sys.stdlib_module_names else top
+
+
+def report_imports(rows, top):
+    for phase in PHASES:
+        phase_rows = [row for row in rows if row[0] == phase]
+        if not phase_rows:
+            print('\n{0}: новых импортов нет'.format(phase))
+            continue
+        by_package = {}
+        for _, module, self_us, _, _ in phase_rows:
+            by_package[package(module)] = by_package.get(package(module), 0) + self_us
+        print('\n{0}: {1} модулей, {2:.1f} мс'.format(
+            phase, len(phase_rows), sum(row[2] for row in phase_rows) / 1000))
+        print('    по пакетам (собственное время, мс): ' + ', '.join(
+            '{0} {1:.1f}'.format(name, us / 1000)
+            for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]))
+        print('    модули верхнего уровня этапа (суммарное время, мс):')
+        outer = min(row[4] for row in phase_rows)
+        for _, module, _, cumulative_us, _ in sorted(
+                (row for row in phase_rows if row[4] == outer), key=lambda row: -row[3])[:top]:
+            print('        {0:<48}{1:>8.1f}'.format(module, cumulative_us / 1000))
+
+
+def measure(args, db_name, static_root):
+    interpreter = statistics.median(run(['-c', 'pass'], os.environ)[0] for _ in range(args.repeat))
+    print('База данных: {0}; запуск интерпретатора (python -c pass): {1:.1f} мс'.format(db_name, interpreter))
+
+    print('\nМедиана, мс')
+    print('{0:<28}'.format('') + ''.join('{0:>16}'.format(name) for name, _ in PROFILES))
+    results = {}
+    for name, settings_module in PROFILES:
+        env = environment(settings_module, db_name)
+        processes, phases = [], []
+        for _ in range(args.repeat):
+            elapsed, stdout, _ = run(['-c', WORKER, db_name, static_root], env)
+            processes.append(elapsed)
+            phases.append([float(ms) for ms in stdout.split()])
+        results[(name, 'процесс целиком')] = statistics.median(processes)
+        for number, phase in enumerate(PHASES):
+            results[(name, phase)] = statistics.median(timings[number] for timings in phases)
+        for label, command in COMMANDS:
+            results[(name, label)] = statistics.median(run(command, env)[0] for _ in range(args.repeat))
+    for label in PHASES + ['процесс целиком'] + [label for label, _ in COMMANDS]:
+        print('{0:<28}'.format(label) + ''.join('{0:>16.1f}'.format(results[(name, label)]) for name, _ in PROFILES))
+
+    for name, settings_module in PROFILES:
+        print('\n=== Импорты рабочего процесса ({0}), python -X importtime ==='.format(name))
+        _, _, stderr = run(['-X', 'importtime', '-c', WORKER, db_name, static_root],
+                           environment(settings_module, db_name))
+        report_imports(parse_importtime(stderr), args.top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=100, help='количество экземпляров книг во временной базе')
+    parser.add_argument('--repeat', type=int, default=10, help='запусков каждого процесса (берётся медиана)')
+    parser.add_argument('--top', type=int, default=8, help='строк в отчёте об импортах')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from catalog import vendor
+
+    # Страницы со статикой рабочего сервера ссылаются на библиотеки интерфейса через манифест collectstatic
+    missing = vendor.missing()
+    if missing:
+        raise SystemExit('Нет библиотек интерфейса ({0}): загрузите их командой python manage.py vendor_static'.format(
+            ', '.join(missing)))
+
+    from benchmarks.factory import seed
+
+    seed(args.copies)
+    # Соединение сценария закрывается, чтобы процессы работали с базой без блокировок
+    from django.db import connections
+    connections.close_all()
+
+    # Настройкам рабочего сервера нужен манифест collectstatic (locallibrary/staticfiles.py)
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    static_root = tempfile.mkdtemp(prefix='catalog-static-')
+    storages = {'staticfiles': {'BACKEND': 'locallibrary.staticfiles.CompressedManifestStaticFilesStorage'}}
+    with override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+        call_command('collectstatic', interactive=False, verbosity=0)
+    try:
+        measure(args, db_name, static_root)
+    finally:
+        shutil.rmtree(static_root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Передача статических файлов при первом и повторном посещении страниц: сколько запросов и байт нужно
+браузеру для CSS/JS/изображений страницы с обычным хранилищем (имена без хэша, без сжатия) и со сборкой
+рабочего сервера (хэшированные имена, .gz/.br, см. locallibrary/staticfiles.py).
+
+    python -m benchmarks.static_assets
+
+Браузер моделируется просто: при первом посещении загружаются все локальные файлы страницы с
+Accept-Encoding: gzip, br; при повторном файлы с Cache-Control: immutable берутся из кэша без запроса,
+остальные проверяются условным запросом (If-None-Match). Библиотеки интерфейса (Bootstrap, jQuery) учитываются
+вместе с остальными файлами; без них (python manage.py vendor_static, см. catalog/vendor.py) сценарий не запускается.
+"""
+
+import argparse
+import re
+import shutil
+import tempfile
+
+from benchmarks import setup_django
+
+PROFILES = [
+    ('без хэшей и сжатия', 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    ('хэши + сжатие', 'locallibrary.staticfiles.CompressedManifestStaticFilesStorage'),
+]
+
+ASSET = re.compile(r'(?:href|src)="([^"]+\.(?:css|js|png|jpg|gif|svg|ico|woff2?))"')
+
+
+def assets(html):
+    return sorted(set(ASSET.findall(html)))
+
+
+def visit(client, middleware, page, cache):
+    """Посещение страницы page: (запросов, байт статических файлов); cache - ETag и immutable с прошлых посещений."""
+    from django.test import RequestFactory
+
+    html = client.get(page).content.decode()
+    requests = transferred = 0
+    for url in assets(html):
+        # Внешних адресов на страницах нет: библиотеки интерфейса - локальные копии (catalog/vendor.py)
+        assert url.startswith('/'), url
+        cached = cache.get(url)
+        if cached and cached[1]:
+            continue
+        headers = {'HTTP_ACCEPT_ENCODING': 'gzip, br'}
+        if cached:
+            headers['HTTP_IF_NONE_MATCH'] = cached[0]
+        response = middleware(RequestFactory().get(url, **headers))
+        assert response.status_code in (200, 304), (url, response.status_code)
+        requests += 1
+        transferred += int(response.get('Content-Length', 0))
+        cache[url] = (response['ETag'], 'immutable' in response['Cache-Control'])
+    return requests, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from catalog import vendor
+
+    missing = vendor.missing()
+    if missing:
+        raise SystemExit('Нет библиотек интерфейса ({0}): загрузите их командой python manage.py vendor_static'.format(
+            ', '.join(missing)))
+
+    from django.core.management import call_command
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from locallibrary.staticfiles import StaticFilesMiddleware
+    from benchmarks.factory import seed
+
+    staff = seed(100)
+    client = Client()
+    client.force_login(staff)
+    pages = [reverse('index'), reverse('books'), reverse('admin:index'), reverse('admin:catalog_book_changelist')]
+
+    print('{0:<22}{1:>28}{2:>28}'.format('', 'первое посещение', 'повторное посещение'))
+    for name, backend in PROFILES:
+        root = tempfile.mkdtemp(prefix='catalog-static-')
+        storages = {'staticfiles': {'BACKEND': backend}}
+        try:
+            # При DEBUG = True ManifestStaticFilesStorage выдаёт адреса без хэша, поэтому DEBUG выключен
+            with override_settings(DEBUG=False, STATIC_ROOT=root, STORAGES=storages):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                middleware = StaticFilesMiddleware(lambda request: None)
+                cache = {}
+                first = [visit(client, middleware, page, cache) for page in pages]
+                repeat = [visit(client, middleware, page, cache) for page in pages]
+        finally:
+            shutil.rmtree(root)
+        print('{0:<22}{1:>10} запросов {2:>9} байт{3:>10} запросов {4:>9} байт'.format(
+            name, sum(r for r, _ in first), sum(b for _, b in first),
+            sum(r for r, _ in repeat), sum(b for _, b in repeat)))
+
+
+if __name__ == '__main__':
+    main()
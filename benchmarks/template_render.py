@@ -0,0 +1,104 @@
+"""
+Время отрисовки шаблонов страниц каталога для авторизованных читателя и сотрудника (их страницы не кэшируются
+целиком, см. catalog/caching.py): без кэша скомпилированных шаблонов и фрагментов, только с кэшем шаблонов
+(cached loader) и с кэшем фрагментов (боковая панель base_generic.html, строки списков книг и авторов).
+
+    python -m benchmarks.template_render --repeat 200
+
+Время отрисовки берётся из заголовка Server-Timing (tpl), который добавляет catalog/metrics.py.
+"""
+
+import argparse
+import re
+import statistics
+
+from benchmarks import setup_django
+
+LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+def profiles():
+    from django.conf import settings
+
+    def templates(loaders):
+        engine = settings.TEMPLATES[0]
+        return [{**engine, 'APP_DIRS': False, 'OPTIONS': {**engine['OPTIONS'], 'loaders': loaders}}]
+
+    def caches(fragments):
+        return {**settings.CACHES, 'template_fragments': {'BACKEND': fragments}}
+
+    dummy = 'django.core.cache.backends.dummy.DummyCache'
+    locmem = 'django.core.cache.backends.locmem.LocMemCache'
+    return [
+        ('без кэша', templates(LOADERS), caches(dummy)),
+        ('шаблоны', templates([('django.template.loaders.cached.Loader', LOADERS)]), caches(dummy)),
+        ('шаблоны+фрагменты', templates([('django.template.loaders.cached.Loader', LOADERS)]), caches(locmem)),
+    ]
+
+
+def get_urls():
+    from django.urls import reverse
+    from catalog.models import Author, Book
+
+    book = Book.objects.order_by('pk').first()
+    author = Author.objects.order_by('pk').first()
+    return [
+        ('index', reverse('index')),
+        ('books', reverse('books')),
+        ('book-detail', reverse('book-detail', args=[book.pk])),
+        ('authors', reverse('authors')),
+        ('author-detail', reverse('author-detail', args=[author.pk])),
+        ('my-borrowed', reverse('my-borrowed')),
+        ('all-borrowed', reverse('all-borrowed')),
+        ('search', reverse('search') + '?q=Книга'),
+    ]
+
+
+def render_ms(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    return float(re.search(r'tpl;dur=([\d.]+)', response['Server-Timing']).group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=1000, help='количество экземпляров книг')
+    parser.add_argument('--repeat', type=int, default=200, help='повторов каждого запроса')
+    parser.add_argument('--db', help='файл базы данных (по умолчанию - временный)')
+    args = parser.parse_args()
+
+    db_name = setup_django(args.db)
+    from django.contrib.auth.models import User
+    from django.core.cache import caches
+    from django.test import Client, override_settings
+    from benchmarks.factory import seed
+
+    print('База данных: {0}, экземпляров: {1}'.format(db_name, args.copies))
+    staff = seed(args.copies)
+    reader = User.objects.get(username='reader0')
+    urls = get_urls()
+
+    results = {}
+    for name, templates, cache_settings in profiles():
+        with override_settings(TEMPLATES=templates, CACHES=cache_settings):
+            caches['default'].clear()
+            for user in (reader, staff):
+                client = Client()
+                client.force_login(user)
+                for label, url in urls:
+                    if label == 'all-borrowed' and user is reader:
+                        continue
+                    render_ms(client, url)
+                    timings = [render_ms(client, url) for _ in range(args.repeat)]
+                    results.setdefault((label, user.username), {})[name] = statistics.median(timings)
+
+    names = [name for name, _, _ in profiles()]
+    print('\nМедиана времени отрисовки шаблонов, мс')
+    print('{0:<28}'.format('страница (пользователь)') + ''.join('{0:>20}'.format(name) for name in names))
+    for (label, username), timings in results.items():
+        print('{0:<28}'.format('{0} ({1})'.format(label, username))
+              + ''.join('{0:>20.3f}'.format(timings[name]) for name in names))
+
+
+if __name__ == '__main__':
+    main()
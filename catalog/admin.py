@@ -1,5 +1,13 @@
-from django.contrib import admin
-from .models import Author, Genre, Language, Book, BookInstance
+import datetime
+
+from django.contrib import admin, messages
+from django.db.models import Case, DateField, ExpressionWrapper, F, Value, When
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html
+from . import loans
+from .models import Author, Genre, Language, Book, BookInstance, Hold
+from .pagination import EstimatedCountPaginator
 
 # Зарегистрируйте свои модели здесь.
 
@@ -17,12 +25,72 @@ https://django.fun/docs/django/ru/4.0/ref/contrib/admin/
 Объекты ModelAdmin:
 https://docs.djangoproject.com/en/4.0/ref/contrib/admin/#modeladmin-objects
 https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#modeladmin-objects
+
+Списки больших таблиц (книги, копии) строятся фиксированным числом запросов: связанные объекты
+подтягиваются list_select_related / prefetch_related, общее количество записей без фильтров не считается
+(show_full_result_count = False) или берётся из статистики базы данных (EstimatedCountPaginator).
+Внешние ключи редактируются виджетом автодополнения вместо <select> со всеми строками таблицы:
+https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#django.contrib.admin.ModelAdmin.autocomplete_fields
+
+Вставки (inlines) книг автора и копий книги только для чтения и показывают первые записи; все записи
+открываются ссылкой в отфильтрованном списке с постраничным выводом и групповыми действиями (actions):
+https://django.fun/docs/django/ru/4.0/ref/contrib/admin/actions/
 """
 
 
-class BookInline(admin.TabularInline):
-    model = Book
+class LimitedInlineFormSet(BaseInlineFormSet):
+    """Формы только для первых limit связанных записей (одним запросом с LIMIT)."""
+
+    limit = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_limited_queryset'):
+            self._limited_queryset = super().get_queryset()[:self.limit]
+        return self._limited_queryset
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        # Родительский объект уже загружен: __str__ записи (например, BookInstance) не запросит его заново
+        setattr(form.instance, self.fk.name, self.instance)
+        return form
+
+
+class SummaryInline(admin.TabularInline):
+    """Вставка только для чтения: первые limit записей; остальные - в списке по ссылке из формы."""
+
+    formset = LimitedInlineFormSet
+    limit = 20
     extra = 0
+    show_change_link = True
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.limit = self.limit
+        return formset
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+def changelist_link(model, field, obj, text):
+    """Ссылка на список model администратора, отфильтрованный по field = obj."""
+    url = reverse('admin:{0}_{1}_changelist'.format(model._meta.app_label, model._meta.model_name))
+    return format_html('<a href="{0}?{1}__id__exact={2}">{3}</a>', url, field, obj.pk, text)
+
+
+class BookInline(SummaryInline):
+    model = Book
+    fields = ('title', 'isbn', 'language')
+    verbose_name_plural = 'книги (первые {0})'.format(SummaryInline.limit)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('language')
 
 
 # Определяем класс администратора
@@ -34,10 +102,20 @@ class AuthorAdmin(admin.ModelAdmin):
 
     # Настройка в макете форм на страницах «добавить» и «изменить»
     # https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#django.contrib.admin.ModelAdmin.fields
-    fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
+    fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death'), 'books_summary']
+    readonly_fields = ['books_summary']
+
+    # Поиск по фамилии и имени (нужен и для автодополнения автора в BookAdmin)
+    search_fields = ['last_name', 'first_name']
 
     inlines = [BookInline]
 
+    @admin.display(description='книги')
+    def books_summary(self, obj):
+        if obj.pk is None:
+            return '-'
+        return changelist_link(Book, 'author', obj, 'Все книги автора: {0}'.format(obj.book_set.count()))
+
 
 # Зарегистрируйте класс администратора с соответствующей моделью
 admin.site.register(Author, AuthorAdmin)
@@ -48,25 +126,58 @@ admin.site.register(Author, AuthorAdmin)
 # https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#django.contrib.admin.InlineModelAdmin
 # TabularInline (горизонтальное расположение)
 # StackedInline (вертикальное расположение, так же как и в модели по умолчанию)
-class BookInstanceInline(admin.TabularInline):
+class BookInstanceInline(SummaryInline):
     model = BookInstance
+    fields = ('imprint', 'status', 'due_back', 'borrower')
+    verbose_name_plural = 'копии (первые {0})'.format(SummaryInline.limit)
 
     # Количество дополнительных форм, по умолчанию = 3
     # https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#django.contrib.admin.InlineModelAdmin.extra
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('borrower')
+
 
 # Зарегистрируйте классы администратора для книги с помощью декоратора
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
+    list_select_related = ('author',)
+    search_fields = ['title', 'isbn']
+    autocomplete_fields = ['author']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    readonly_fields = ['copies_summary']
     inlines = [BookInstanceInline]
 
+    def get_queryset(self, request):
+        # Жанры всех книг страницы загружаются одним запросом (display_genre берёт их из кэша prefetch_related)
+        return super().get_queryset(request).prefetch_related('genre')
+
+    @admin.display(description='копии')
+    def copies_summary(self, obj):
+        # Сводка из журнала доступности (одна строка), а не подсчёт копий
+        availability = getattr(obj, 'availability', None) if obj.pk else None
+        if availability is None:
+            return '-'
+        text = 'Всего: {0}, в наличии: {1}, выдано: {2}, в резерве: {3}, на обслуживании: {4}'.format(
+            availability.total, availability.available, availability.loaned, availability.reserved,
+            availability.maintenance)
+        return format_html('{0}<br>{1}', text, changelist_link(BookInstance, 'book', obj, 'Все копии книги'))
+
 
 # Зарегистрируйте классы администратора для BookInstance с помощью декоратора.
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
+    list_select_related = ('book', 'borrower')
+    autocomplete_fields = ['book', 'borrower']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    # Порядок по первичному ключу (UUID): страница читается по его индексу. Порядок модели (due_back) потребовал бы
+    # сортировки всей таблицы для каждой страницы; сортировка по сроку возврата доступна по заголовку столбца.
+    ordering = ('-pk',)
 
     # Добавление фильтров списка:
     # https://django.fun/docs/django/ru/4.0/ref/contrib/admin/#django.contrib.admin.ModelAdmin.list_filter
@@ -83,3 +194,69 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+    actions = ['mark_returned', 'extend_due_back', 'mark_available', 'mark_maintenance']
+
+    # Групповые действия меняют выбранные копии одним UPDATE (loans.bulk_update), без сохранения каждой формы
+    @admin.action(description='Отметить возвращёнными', permissions=['mark_returned'])
+    def mark_returned(self, request, queryset):
+        updated = loans.bulk_update(queryset.filter(status__in=('в', 'р')),
+                                    status='н', borrower=None, due_back=None, overdue=False)
+        self.message_user(request, 'Возвращено копий: {0}'.format(updated), messages.SUCCESS)
+
+    @admin.action(description='Продлить срок возврата на {0} дней'.format(loans.EXTEND_DAYS),
+                  permissions=['mark_returned'])
+    def extend_due_back(self, request, queryset):
+        delta = datetime.timedelta(days=loans.EXTEND_DAYS)
+        updated = loans.bulk_update(
+            queryset.filter(status='в', due_back__isnull=False),
+            due_back=ExpressionWrapper(F('due_back') + delta, output_field=DateField()),
+            # Отметка о просрочке снимается, если новый срок ещё не наступил
+            overdue=Case(When(due_back__gte=datetime.date.today() - delta, then=Value(False)),
+                         default=F('overdue')),
+        )
+        self.message_user(request, 'Продлено выдач: {0}'.format(updated), messages.SUCCESS)
+
+    @admin.action(description='Отметить: в наличии (после обслуживания)', permissions=['change'])
+    def mark_available(self, request, queryset):
+        updated = loans.bulk_update(queryset.filter(status='о'), status='н')
+        self.message_user(request, 'Изменено копий: {0}'.format(updated), messages.SUCCESS)
+
+    @admin.action(description='Отметить: на обслуживании', permissions=['change'])
+    def mark_maintenance(self, request, queryset):
+        # Выданные копии сначала должны быть возвращены
+        updated = loans.bulk_update(queryset.exclude(status='в'),
+                                    status='о', borrower=None, due_back=None, overdue=False)
+        self.message_user(request, 'Изменено копий: {0}'.format(updated), messages.SUCCESS)
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalog.can_mark_returned')
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    """Очереди на книги: запись добавляется и удаляется через сервис выдачи (catalog/loans.py)."""
+    list_display = ('book', 'user', 'created', 'copy')
+    list_select_related = ('book', 'user', 'copy')
+    autocomplete_fields = ['book', 'user']
+    fields = ('book', 'user', 'created', 'copy')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Копию резервирует сервис; существующая запись не редактируется
+        if obj is None:
+            return ('created', 'copy')
+        return self.fields
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return
+        # Доступная копия сразу резервируется за читателем
+        hold = loans.reserve_book(obj.book, obj.user)
+        obj.pk, obj.created, obj.copy_id = hold.pk, hold.created, hold.copy_id
+
+    def delete_model(self, request, obj):
+        loans.cancel_hold(obj)
+
+    def delete_queryset(self, request, queryset):
+        for hold in queryset:
+            loans.cancel_hold(hold)
@@ -0,0 +1,175 @@
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views import View
+
+from .caching import CachedViewMixin, book_tag, author_tag
+from .models import Author, Genre, Language, Book, BookInstance
+from .pagination import CursorPaginator, InvalidCursor, cursor_url
+
+"""
+JSON API каталога только для чтения: /catalog/api/<ресурс>/ и /catalog/api/<ресурс>/<pk>/
+
+    GET /catalog/api/books/?fields=id,title,genres&limit=50&cursor=...
+
+Строки читаются values() - только запрошенные в fields столбцы (и поля сортировки для курсора), без создания
+объектов моделей, и сериализуются как есть. Списки выводятся по курсору (catalog/pagination.py).
+ETag и кэш ответов - по тем же меткам, что и HTML-страницы (catalog/caching.py): если у клиента актуальная
+версия (If-None-Match), ответ 304 отдаётся до обращения к данным.
+
+Методы QuerySet values() и JsonResponse:
+https://django.fun/docs/django/ru/4.0/ref/models/querysets/#values
+https://django.fun/docs/django/ru/4.0/ref/request-response/#jsonresponse-objects
+"""
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    """Неверный запрос к API (ответ 400)."""
+
+
+class Resource:
+    """Описание ресурса API: модель, поля (имя в API -> поле модели) и метки кэша."""
+
+    def __init__(self, model, fields, default_fields=None, tags=(), detail_tag=None, ordering=None):
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields or list(fields)
+        self.tags = list(tags)
+        self.detail_tag = detail_tag
+        self.ordering = ordering or list(model._meta.ordering) + ['pk']
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def get_cache_tags(self, pk=None):
+        if pk is not None and self.detail_tag is not None:
+            return [self.detail_tag(pk)]
+        return self.tags
+
+    def parse_fields(self, value):
+        if not value:
+            return self.default_fields
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise ApiError('Неизвестные поля: {0}. Доступны: {1}'.format(', '.join(unknown), ', '.join(self.fields)))
+        return names
+
+    def columns(self, names):
+        """Поля модели для values(): запрошенные (кроме вычисляемых отдельно) и поля сортировки."""
+        columns = [self.fields[name] for name in names if self.fields[name] is not None]
+        for name in self.ordering:
+            name = name.lstrip('-')
+            column = self.model._meta.pk.attname if name == 'pk' else self.model._meta.get_field(name).attname
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    def serialize(self, rows, names):
+        columns = [(name, self.fields[name]) for name in names if self.fields[name] is not None]
+        return [{name: row[column] for name, column in columns} for row in rows]
+
+
+class BookResource(Resource):
+    """Книги; жанры (genres) - список id, загружается одним запросом для всей страницы."""
+
+    def serialize(self, rows, names):
+        data = super().serialize(rows, names)
+        if 'genres' in names:
+            book_ids = [row['id'] for row in rows]
+            genres = {book_id: [] for book_id in book_ids}
+            through = Book.genre.through.objects.filter(book_id__in=book_ids).order_by('genre_id')
+            for book_id, genre_id in through.values_list('book_id', 'genre_id'):
+                genres[book_id].append(genre_id)
+            for item, row in zip(data, rows):
+                item['genres'] = genres[row['id']]
+        return data
+
+
+RESOURCES = {
+    'books': BookResource(
+        Book,
+        {'id': 'id', 'title': 'title', 'summary': 'summary', 'isbn': 'isbn', 'author': 'author_id',
+         'language': 'language_id', 'genres': None},
+        default_fields=['id', 'title', 'author', 'isbn'],
+        # 'book-genres' - изменения жанров книг (m2m), см. catalog/signals.py
+        tags=['books', 'book-genres'], detail_tag=book_tag, ordering=['pk']),
+    'authors': Resource(
+        Author,
+        {'id': 'id', 'first_name': 'first_name', 'last_name': 'last_name',
+         'date_of_birth': 'date_of_birth', 'date_of_death': 'date_of_death'},
+        tags=['authors'], detail_tag=author_tag),
+    'genres': Resource(Genre, {'id': 'id', 'name': 'name'}, tags=['genres'], ordering=['name', 'pk']),
+    'languages': Resource(Language, {'id': 'id', 'name': 'name'}, tags=['languages'], ordering=['name', 'pk']),
+    # Копии: читатель (borrower) не выводится
+    'bookinstances': Resource(
+        BookInstance,
+        {'id': 'id', 'book': 'book_id', 'imprint': 'imprint', 'status': 'status', 'due_back': 'due_back'},
+        tags=['availability']),
+}
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+class ApiView(CachedViewMixin, View):
+    """Список ресурса (по курсору) или одна запись по pk."""
+
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        self.resource = RESOURCES.get(kwargs['resource'])
+        if self.resource is None:
+            return error_response('Неизвестный ресурс: {0}'.format(kwargs['resource']), status=404)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_cache_tags(self):
+        return self.resource.get_cache_tags(self.kwargs.get('pk'))
+
+    def get(self, request, resource, pk=None):
+        try:
+            names = self.resource.parse_fields(request.GET.get('fields'))
+            if pk is not None:
+                return self.detail(pk, names)
+            return self.list(names)
+        except ApiError as error:
+            return error_response(str(error))
+
+    def detail(self, pk, names):
+        try:
+            rows = list(self.resource.get_queryset().filter(pk=pk).values(*self.resource.columns(names)))
+        except (ValidationError, ValueError):
+            rows = []
+        if not rows:
+            return error_response('Запись не найдена.', status=404)
+        return self.json(self.resource.serialize(rows, names)[0])
+
+    def list(self, names):
+        try:
+            limit = int(self.request.GET.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise ApiError('limit должен быть числом.')
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ApiError('limit должен быть от 1 до {0}.'.format(MAX_LIMIT))
+
+        queryset = self.resource.get_queryset().values(*self.resource.columns(names))
+        paginator = CursorPaginator(queryset, limit, self.resource.ordering)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise ApiError('Неверная позиция страницы (cursor).')
+        return self.json({
+            'results': self.resource.serialize(page.object_list, names),
+            'next': self.page_url(page.next_cursor),
+            'previous': self.page_url(page.previous_cursor),
+        })
+
+    def page_url(self, cursor):
+        return self.request.build_absolute_uri(cursor_url(self.request, cursor)) if cursor else None
+
+    @staticmethod
+    def json(data):
+        return JsonResponse(data, safe=False, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
@@ -9,3 +9,11 @@ class CatalogConfig(AppConfig):
 
     # Человекочитаемое имя приложения
     verbose_name = 'каталог'
+
+    def ready(self):
+        # Подключаем обработчики сигналов моделей каталога
+        # https://django.fun/docs/django/ru/4.0/topics/signals/#connecting-receiver-functions
+        from . import signals  # noqa: F401
+        # Системные проверки приложения
+        # https://django.fun/docs/django/ru/4.0/topics/checks/
+        from . import checks  # noqa: F401
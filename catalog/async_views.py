@@ -0,0 +1,178 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.shortcuts import render
+
+from .caching import PageCache, aattach_versions, atag_versions, book_tag, author_tag
+from .models import Author, Book, BookInstance
+from .pagination import CursorPaginator, InvalidCursor, set_page_urls
+from .stats import CatalogStats
+from .views import BookDetailView
+from . import routers
+from . import visits
+
+"""
+Асинхронные варианты страниц каталога для запуска под ASGI (locallibrary/asgi.py).
+Подключаются настройкой CATALOG_ASYNC_VIEWS = True (см. catalog/urls.py).
+
+Синхронное представление под ASGI выполняется в отдельном потоке через sync_to_async. Здесь запросы
+к базе данных выполняются асинхронным API ORM (aget(), async for), а шаблон получает только уже загруженные
+объекты: обращение к базе данных из шаблона в асинхронном контексте вызвало бы SynchronousOnlyOperation.
+Пользователь, сессия и разрешения (нужны боковой панели) загружаются заранее в _load_user().
+
+Асинхронная поддержка и асинхронные запросы ORM:
+https://django.fun/docs/django/ru/4.0/topics/async/
+https://docs.djangoproject.com/en/4.2/topics/db/queries/#asynchronous-queries
+"""
+
+
+def _user_with_permissions(request):
+    user = request.user
+    if user.is_authenticated:
+        # Кэшируются в объекте пользователя: {% if perms... %} в шаблоне не обращается к базе данных
+        user.get_all_permissions()
+    return user
+
+
+async def _load_user(request):
+    """Пользователь запроса с разрешениями (ленивый request.user загружается из сессии в потоке)."""
+    return await sync_to_async(_user_with_permissions)(request)
+
+
+async def _cached(request, tags, view):
+    """Асинхронный вариант CachedViewMixin: ответ 304, ответ из кэша или отрисовка view()."""
+    page = PageCache(request, await atag_versions(tags))
+    response = page.conditional_response() or await page.aget()
+    if response is None:
+        with routers.pin_to_primary(page.recently_changed()):
+            response = await view()
+        await page.aset(response)
+    return page.finalize(response)
+
+
+async def _paginate(request, queryset, per_page, ordering=None):
+    """Контекст курсорной страницы, как у ListView с CursorPaginationMixin."""
+    if ordering is None:
+        ordering = list(queryset.model._meta.ordering) + ['pk']
+    paginator = CursorPaginator(queryset, per_page, ordering)
+    try:
+        page = await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Неверная позиция страницы.')
+    set_page_urls(request, page)
+    return {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+    }
+
+
+async def index(request):
+    """Асинхронный вариант views.index."""
+    await _load_user(request)
+    # Все счётчики считаются одним запросом и берутся из кэша, пока каталог не изменится (см. catalog/stats.py)
+    stats = await CatalogStats.aget()
+
+    num_visits = visits.get_visits(request)
+    response = render(request, 'catalog/index.html', context={
+        **stats,
+        'num_visits': num_visits,
+        'the_ending': visits.the_ending(num_visits),
+    })
+    return visits.set_visits(response, num_visits + 1)
+
+
+async def book_list(request):
+    """Асинхронный вариант views.BookListView."""
+    await _load_user(request)
+
+    async def view():
+        queryset = Book.objects.select_related('author', 'availability')
+        context = await _paginate(request, queryset, 3, ['pk'])
+        context['book_list'] = await aattach_versions(context['object_list'], book_tag)
+        context['some_data'] = 'Это просто некоторые данные'
+        return render(request, 'catalog/book_list.html', context)
+
+    return await _cached(request, ['books', 'availability'], view)
+
+
+async def book_detail(request, pk):
+    """Асинхронный вариант views.BookDetailView."""
+    await _load_user(request)
+
+    async def view():
+        queryset = Book.objects.select_related('author', 'language', 'availability').prefetch_related('genre')
+        try:
+            book = await queryset.aget(pk=pk)
+        except Book.DoesNotExist:
+            raise Http404('Книга не найдена.')
+        copies = [copy async for copy in book.bookinstance_set.order_by()[:BookDetailView.copies_limit]]
+        return render(request, 'catalog/book_detail.html', {'book': book, 'object': book, 'copies': copies})
+
+    return await _cached(request, [book_tag(pk), 'genres', 'languages'], view)
+
+
+async def author_list(request):
+    """Асинхронный вариант views.AuthorListView."""
+    await _load_user(request)
+
+    async def view():
+        context = await _paginate(request, Author.objects.select_related('summary'), 3)
+        context['author_list'] = await aattach_versions(context['object_list'], author_tag)
+        return render(request, 'catalog/author_list.html', context)
+
+    return await _cached(request, ['authors'], view)
+
+
+async def author_detail(request, pk):
+    """Асинхронный вариант views.AuthorDetailView."""
+    await _load_user(request)
+
+    async def view():
+        books = Book.objects.annotate(num_copies=Coalesce('availability__total', 0))
+        queryset = Author.objects.select_related('summary').prefetch_related(Prefetch('book_set', queryset=books))
+        try:
+            author = await queryset.aget(pk=pk)
+        except Author.DoesNotExist:
+            raise Http404('Автор не найден.')
+        return render(request, 'catalog/author_detail.html', {'author': author, 'object': author})
+
+    return await _cached(request, [author_tag(pk)], view)
+
+
+async def loaned_books_by_user(request):
+    """Асинхронный вариант views.LoanedBooksByUserListView."""
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    queryset = BookInstance.objects.filter(borrower=user).filter(status__exact='в') \
+        .select_related('book').order_by('due_back')
+    context = await _paginate(request, queryset, 10)
+    context['bookinstance_list'] = context['object_list']
+    return render(request, 'catalog/bookinstance_list_borrowed_user.html', context)
+
+
+async def loaned_books_by_staff(request):
+    """Асинхронный вариант views.LoanedBooksByStaffListView."""
+    user = await _load_user(request)
+    if not user.has_perm('catalog.can_mark_returned'):
+        if user.is_authenticated:
+            raise PermissionDenied
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    overdue_only = request.GET.get('overdue') == '1'
+    queryset = BookInstance.objects.filter(status__exact='в').select_related('book', 'borrower')
+    if overdue_only:
+        queryset = queryset.filter(due_back__lt=date.today())
+    context = await _paginate(request, queryset.order_by('due_back'), 10)
+    context['bookinstance_list'] = context['object_list']
+    context['overdue_only'] = overdue_only
+    return render(request, 'catalog/bookinstance_list_all_book_borrowed_staff.html', context)
@@ -0,0 +1,51 @@
+from django.db.models import Count, Min, Q
+
+from .models import Book
+
+"""
+Доступность копий для списка ISBN (запросы библиотек-партнёров, см. представление book_availability).
+
+ISBN обрабатываются порциями по CHUNK_SIZE: на порцию - один запрос с GROUP BY по книге, который считает
+копии по статусам и ближайший срок возврата выданных копий. Результат - поток строк в порядке запроса,
+его можно сразу кодировать и отправлять клиенту (catalog/export.py), не собирая весь ответ в памяти.
+
+Агрегирование:
+https://django.fun/docs/django/ru/4.0/topics/db/aggregation/#filtering-on-annotations
+"""
+
+CHUNK_SIZE = 500
+
+# Наибольшее количество ISBN в одном запросе
+MAX_ISBNS = 20000
+
+COLUMNS = ('isbn', 'found', 'available', 'loaned', 'reserved', 'earliest_due_back')
+
+
+def normalize(isbns):
+    """ISBN без пробелов, пустых значений и повторов, в исходном порядке."""
+    return list(dict.fromkeys(isbn.strip() for isbn in isbns if isbn and isbn.strip()))
+
+
+def counts(isbns):
+    """Счётчики копий для книг с ISBN из isbns (один сгруппированный запрос): ISBN -> строка."""
+    rows = Book.objects.filter(isbn__in=isbns).order_by().values('isbn').annotate(
+        available=Count('bookinstance', filter=Q(bookinstance__status='н')),
+        loaned=Count('bookinstance', filter=Q(bookinstance__status='в')),
+        reserved=Count('bookinstance', filter=Q(bookinstance__status='р')),
+        earliest_due_back=Min('bookinstance__due_back', filter=Q(bookinstance__status='в')),
+    )
+    return {row['isbn']: row for row in rows}
+
+
+def lookup(isbns):
+    """Генератор кортежей COLUMNS для каждого ISBN в порядке запроса; неизвестные ISBN - с found = False."""
+    isbns = normalize(isbns)
+    for start in range(0, len(isbns), CHUNK_SIZE):
+        chunk = isbns[start:start + CHUNK_SIZE]
+        found = counts(chunk)
+        for isbn in chunk:
+            row = found.get(isbn)
+            if row is None:
+                yield isbn, False, 0, 0, 0, None
+            else:
+                yield isbn, True, row['available'], row['loaned'], row['reserved'], row['earliest_due_back']
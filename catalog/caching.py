@@ -0,0 +1,189 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+from . import routers
+
+"""
+Кэширование страниц каталога с точечной инвалидацией по меткам (tags).
+
+Каждая страница зависит от набора меток ('book:5', 'author:3', 'books', ...). Метка хранит в кэше свою
+"версию" - время последнего изменения в наносекундах. Ключ закэшированного ответа и ETag строятся из URL,
+языка и версий меток, поэтому изменение данных (см. catalog/signals.py) лишь "поднимает" версии нужных меток,
+и только зависящие от них страницы перестают находиться в кэше. Если версия метки вытеснена из кэша,
+она создаётся заново - это безопасно: страница просто будет отрисована ещё раз.
+
+Низкоуровневый API кэша и условные запросы:
+https://django.fun/docs/django/ru/4.0/topics/cache/#the-low-level-cache-api
+https://django.fun/docs/django/ru/4.0/topics/conditional-view-processing/
+"""
+
+TAG_PREFIX = 'catalog:tag:'
+PAGE_PREFIX = 'catalog:page:'
+
+
+def book_tag(pk):
+    return 'book:{0}'.format(pk)
+
+
+def author_tag(pk):
+    return 'author:{0}'.format(pk)
+
+
+def tag_versions(tags):
+    """Версии меток (создаёт отсутствующие)."""
+    keys = {TAG_PREFIX + tag: tag for tag in tags}
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+async def atag_versions(tags):
+    """Асинхронный вариант tag_versions для асинхронных представлений."""
+    keys = {TAG_PREFIX + tag: tag for tag in tags}
+    versions = await cache.aget_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def attach_versions(objects, tag):
+    """Записывает в obj.cache_version версию метки tag(obj.pk) каждого объекта (одним обращением к кэшу).
+
+    Версия входит в ключ кэша фрагмента строки списка в шаблоне ({% cache ... obj.pk obj.cache_version %}):
+    изменение объекта поднимает версию, и строка отрисовывается заново.
+    """
+    versions = tag_versions({tag(obj.pk) for obj in objects})
+    for obj in objects:
+        obj.cache_version = versions[tag(obj.pk)]
+    return objects
+
+
+async def aattach_versions(objects, tag):
+    """Асинхронный вариант attach_versions."""
+    versions = await atag_versions({tag(obj.pk) for obj in objects})
+    for obj in objects:
+        obj.cache_version = versions[tag(obj.pk)]
+    return objects
+
+
+def _bump(tags):
+    version = time.time_ns()
+    cache.set_many({TAG_PREFIX + tag: version for tag in tags}, None)
+
+
+def invalidate_tags(*tags):
+    """Поднимает версии меток после фиксации транзакции (до неё страница могла бы закэшировать старые данные)."""
+    tags = {tag for tag in tags if tag}
+    if tags:
+        transaction.on_commit(lambda: _bump(tags))
+
+
+class PageCache:
+    """Ключ, ETag и Last-Modified страницы по версиям её меток; общая часть синхронного и асинхронного кэша."""
+
+    timeout = 60 * 60
+
+    def __init__(self, request, versions, timeout=None):
+        self.request = request
+        user = request.user
+        key_material = '|'.join([
+            request.get_full_path(), get_language() or '', str(user.pk if user.is_authenticated else ''),
+            *('{0}={1}'.format(tag, versions[tag]) for tag in sorted(versions)),
+        ])
+        digest = hashlib.md5(key_material.encode('utf-8')).hexdigest()
+        self.key = PAGE_PREFIX + digest
+        self.etag = quote_etag(digest)
+        self.newest = max(versions.values()) if versions else None
+        self.last_modified = self.newest // 10 ** 9 if versions else None
+        # Целиком кэшируются только ответы анонимным пользователям
+        self.cacheable = not user.is_authenticated
+        if timeout is not None:
+            self.timeout = timeout
+
+    def recently_changed(self):
+        """Данные страницы изменились недавно - реплики базы данных могут их ещё не содержать."""
+        if not routers.replicas() or self.newest is None:
+            return False
+        return time.time_ns() - self.newest < routers.replica_lag() * 10 ** 9
+
+    def conditional_response(self):
+        """Ответ 304, если клиент уже имеет эту версию страницы, иначе None."""
+        return get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
+
+    @staticmethod
+    def from_cache(cached):
+        if cached is None:
+            return None
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def to_cache(self, response):
+        """Значение для кэша или None, если ответ не кэшируется."""
+        if self.cacheable and response.status_code == 200:
+            return response.content, response['Content-Type']
+        return None
+
+    def get(self):
+        return self.from_cache(cache.get(self.key)) if self.cacheable else None
+
+    async def aget(self):
+        return self.from_cache(await cache.aget(self.key)) if self.cacheable else None
+
+    def set(self, response):
+        value = self.to_cache(response)
+        if value is not None:
+            cache.set(self.key, value, self.timeout)
+
+    async def aset(self, response):
+        value = self.to_cache(response)
+        if value is not None:
+            await cache.aset(self.key, value, self.timeout)
+
+    def finalize(self, response):
+        if response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified is not None:
+                response['Last-Modified'] = http_date(self.last_modified)
+            patch_vary_headers(response, ['Cookie'])
+        return response
+
+
+class CachedViewMixin:
+    """Кэширование ответа представления и условные ответы 304 (ETag / Last-Modified).
+
+    Целиком кэшируются только ответы анонимным пользователям: боковая панель содержит имя пользователя
+    и ссылки по разрешениям. ETag учитывает пользователя, поэтому 304 получают все.
+    """
+
+    cache_timeout = 60 * 60
+
+    def get_cache_tags(self):
+        raise NotImplementedError('Определите get_cache_tags() в представлении.')
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        page = PageCache(request, tag_versions(self.get_cache_tags()), self.cache_timeout)
+        # Условный запрос: если клиент уже имеет эту версию страницы - ответ 304 без отрисовки
+        response = page.conditional_response() or page.get()
+        if response is None:
+            # Иначе страница, отрисованная с отстающей реплики, попала бы в кэш под новыми версиями меток
+            with routers.pin_to_primary(page.recently_changed()):
+                response = super().dispatch(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+            page.set(response)
+        return page.finalize(response)
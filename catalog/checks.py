@@ -0,0 +1,32 @@
+from django.core.checks import Error, Tags, Warning, register
+
+from . import vendor
+
+"""
+Системные проверки приложения каталога (manage.py check).
+
+catalog.W001 / catalog.E001 - нет локальных копий библиотек интерфейса (catalog/vendor.py): при разработке
+это предупреждение, а для рабочего сервера (manage.py check --deploy) - ошибка, потому что у шаблонного тега
+vendor_url нет запасного адреса на CDN.
+
+Системные проверки:
+https://django.fun/docs/django/ru/4.0/topics/checks/
+"""
+
+HINT = 'Загрузите их командой "python manage.py vendor_static" и добавьте в репозиторий.'
+
+
+def vendor_message(paths):
+    return 'Нет статических файлов библиотек интерфейса: {0}.'.format(', '.join(paths))
+
+
+@register(Tags.staticfiles)
+def check_vendor_files(app_configs, **kwargs):
+    paths = vendor.missing()
+    return [Warning(vendor_message(paths), hint=HINT, id='catalog.W001')] if paths else []
+
+
+@register(Tags.staticfiles, deploy=True)
+def check_vendor_files_deploy(app_configs, **kwargs):
+    paths = vendor.missing()
+    return [Error(vendor_message(paths), hint=HINT, id='catalog.E001')] if paths else []
@@ -0,0 +1,136 @@
+import csv
+import json
+import zlib
+
+from .models import Author, Genre, Book, BookInstance
+
+"""
+Потоковая выгрузка каталога в CSV или JSONL (при необходимости - сжатая gzip).
+
+Строки читаются через values_list().iterator(chunk_size=...) без создания объектов моделей и сразу
+записываются в поток, поэтому расход памяти не зависит от количества строк.
+Формат набора books совместим с командой import_catalog.
+
+Итерация по QuerySet порциями:
+https://django.fun/docs/django/ru/4.0/ref/models/querysets/#iterator
+"""
+
+CHUNK_SIZE = 2000
+
+# Размер порции вывода: строки накапливаются до этого размера перед отправкой
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def book_rows():
+    """Книги с автором, языком и жанрами. Жанры присоединяются слиянием двух упорядоченных по книге потоков."""
+    books = Book.objects.order_by('pk').values_list(
+        'pk', 'isbn', 'title', 'summary', 'author__first_name', 'author__last_name', 'language__name'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    genres = Book.genre.through.objects.order_by('book_id').values_list(
+        'book_id', 'genre__name'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+    genre_row = next(genres, None)
+    for pk, *values in books:
+        names = []
+        while genre_row is not None and genre_row[0] <= pk:
+            if genre_row[0] == pk:
+                names.append(genre_row[1])
+            genre_row = next(genres, None)
+        yield (*values, ';'.join(names))
+
+
+def author_rows():
+    return Author.objects.order_by('pk').values_list(
+        'pk', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def bookinstance_rows():
+    # Читатель (borrower) не выгружается: выгрузка передаётся партнёрам, как и API (catalog/api.py)
+    return BookInstance.objects.order_by('book_id', 'pk').values_list(
+        'pk', 'book__isbn', 'imprint', 'status', 'due_back'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def genre_rows():
+    return Genre.objects.order_by('pk').values_list('pk', 'name').iterator(chunk_size=CHUNK_SIZE)
+
+
+# Набор данных: (столбцы, функция-генератор строк)
+DATASETS = {
+    'books': (('isbn', 'title', 'summary', 'author_first_name', 'author_last_name', 'language', 'genres'),
+              book_rows),
+    'authors': (('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'), author_rows),
+    'bookinstances': (('id', 'isbn', 'imprint', 'status', 'due_back'), bookinstance_rows),
+    'genres': (('id', 'name'), genre_rows),
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку вместо сохранения."""
+
+    def write(self, value):
+        return value
+
+
+def _lines(columns, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + '\n'
+
+
+def _chunks(lines):
+    """Склеивает строки в порции по BUFFER_SIZE байт; первая строка отправляется сразу."""
+    buffer, size = [], 0
+    first = True
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if first or size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+            first = False
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Первая порция выталкивается сразу, чтобы клиент получил первые байты без ожидания
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode(columns, rows, fmt='csv', compress=False):
+    """Генератор байтовых порций строк rows (кортежи значений в порядке columns) в формате fmt."""
+    chunks = _chunks(_lines(columns, rows, fmt))
+    return _gzip(chunks) if compress else chunks
+
+
+def stream(dataset, fmt='csv', compress=False):
+    """Генератор байтовых порций выгрузки набора dataset в формате fmt."""
+    columns, rows = DATASETS[dataset]
+    return encode(columns, rows(), fmt, compress)
+
+
+def filename(dataset, fmt, compress=False):
+    return '{0}.{1}{2}'.format(dataset, fmt, '.gz' if compress else '')
@@ -0,0 +1,211 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .routers import pin_to_primary
+from .models import (Author, Genre, Language, Book, BookInstance,
+                     GenreSummary, LanguageSummary, GenreLanguageSummary, AuthorSummary)
+
+"""
+Сводки для обзора каталога: количество книг по жанрам, языкам и парам жанр-язык, количество книг и копий
+у каждого автора. Страница обзора (BrowseView) и страница автора читают готовые счётчики - несколько строк
+на жанр и язык - вместо подсчёта книг через промежуточную таблицу жанров и копий при каждом запросе.
+
+Сигналы (catalog/signals.py) меняют счётчики на разницу (UPDATE ... SET books = books + 1) без подсчёта всех книг
+жанра, языка или автора: добавление, удаление книги и смена её языка или автора (apply_changes), добавление
+и удаление жанров книги (genres_changed), добавление, удаление и перенос копии (copies_changed); правка,
+не меняющая язык и автора, сводок не касается, нулевые счётчики не хранятся. Массовые операции сообщают
+об изменённых книгах сигналом books_bulk_changed. Полный пересчёт (refresh) выполняют только массовые операции
+без прежнего состояния книг и команда rebuild_facets, которая исправляет расхождения (например, после изменений
+через update() в обход сигналов).
+"""
+
+CHUNK_SIZE = 500
+
+# Счётчики сводок с несколькими полями (у остальных - только books)
+COUNTERS = {AuthorSummary: ['books', 'copies']}
+
+
+def _chunks(ids):
+    ids = sorted(set(ids) - {None})
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _sync(queryset, key_fields, fields, actual):
+    """Приводит строки сводки queryset к actual ({значения key_fields: значения fields}).
+
+    Строки, которых нет в actual (счётчики стали нулевыми), удаляются. Возвращает количество исправленных строк.
+    """
+    stored = {}
+    for pk, *values in queryset.values_list('pk', *key_fields, *fields):
+        stored[tuple(values[:len(key_fields)])] = (pk, tuple(values[len(key_fields):]))
+    stale = [pk for key, (pk, _) in stored.items() if key not in actual]
+    if stale:
+        queryset.filter(pk__in=stale).delete()
+    changed = [queryset.model(**dict(zip(key_fields, key)), **dict(zip(fields, values)))
+               for key, values in actual.items() if key not in stored or stored[key][1] != values]
+    if changed:
+        queryset.model.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=key_fields, update_fields=fields)
+    return len(stale) + len(changed)
+
+
+def _grouped(queryset, *keys):
+    """{значения keys: (количество,)} - один сгруппированный запрос."""
+    rows = queryset.order_by().values(*keys).annotate(count=Count('pk')).values_list(*keys, 'count')
+    return {tuple(row[:-1]): (row[-1],) for row in rows}
+
+
+def refresh_genres(genre_ids):
+    """Пересчитывает сводки жанров и пар жанр-язык для жанров genre_ids."""
+    fixed = 0
+    for chunk in _chunks(genre_ids):
+        through = Book.genre.through.objects.filter(genre_id__in=chunk)
+        fixed += _sync(GenreSummary.objects.filter(genre_id__in=chunk), ['genre_id'], ['books'],
+                       _grouped(through, 'genre_id'))
+        fixed += _sync(GenreLanguageSummary.objects.filter(genre_id__in=chunk), ['genre_id', 'language_id'], ['books'],
+                       _grouped(through.filter(book__language__isnull=False), 'genre_id', 'book__language_id'))
+    return fixed
+
+
+def refresh_languages(language_ids):
+    """Пересчитывает сводки языков language_ids."""
+    fixed = 0
+    for chunk in _chunks(language_ids):
+        fixed += _sync(LanguageSummary.objects.filter(language_id__in=chunk), ['language_id'], ['books'],
+                       _grouped(Book.objects.filter(language_id__in=chunk), 'language_id'))
+    return fixed
+
+
+def refresh_authors(author_ids):
+    """Пересчитывает количество книг и копий авторов author_ids."""
+    fixed = 0
+    for chunk in _chunks(author_ids):
+        books = _grouped(Book.objects.filter(author_id__in=chunk), 'author_id')
+        copies = _grouped(BookInstance.objects.filter(book__author_id__in=chunk), 'book__author_id')
+        actual = {key: books.get(key, (0,)) + copies.get(key, (0,)) for key in books.keys() | copies.keys()}
+        fixed += _sync(AuthorSummary.objects.filter(author_id__in=chunk), ['author_id'], ['books', 'copies'], actual)
+    return fixed
+
+
+def refresh(genre_ids=(), language_ids=(), author_ids=()):
+    """Пересчитывает сводки указанных жанров, языков и авторов; возвращает количество исправленных строк."""
+    with pin_to_primary():
+        return refresh_genres(genre_ids) + refresh_languages(language_ids) + refresh_authors(author_ids)
+
+
+def book_keys(book_ids):
+    """Жанры, языки и авторы книг book_ids - аргументы refresh()."""
+    book_ids = list(book_ids)
+    with pin_to_primary():
+        books = list(Book.objects.filter(pk__in=book_ids).values_list('language_id', 'author_id'))
+        genres = Book.genre.through.objects.filter(book_id__in=book_ids).values_list('genre_id', flat=True)
+        return {
+            'genre_ids': set(genres),
+            'language_ids': {language_id for language_id, _ in books},
+            'author_ids': {author_id for _, author_id in books},
+        }
+
+
+def rebuild():
+    """Пересчитывает все сводки; возвращает количество исправленных строк."""
+    return refresh(Genre.objects.values_list('pk', flat=True), Language.objects.values_list('pk', flat=True),
+                   Author.objects.values_list('pk', flat=True))
+
+
+def snapshot(book_ids):
+    """Состояние книг book_ids для сводок: {pk: (язык, автор, жанры, количество копий)}."""
+    state = {}
+    with pin_to_primary():
+        for chunk in _chunks(book_ids):
+            genres = {}
+            for book_id, genre_id in Book.genre.through.objects.filter(book_id__in=chunk).values_list(
+                    'book_id', 'genre_id'):
+                genres.setdefault(book_id, set()).add(genre_id)
+            copies = _grouped(BookInstance.objects.filter(book_id__in=chunk), 'book_id')
+            for pk, language_id, author_id in Book.objects.filter(pk__in=chunk).values_list(
+                    'pk', 'language_id', 'author_id'):
+                state[pk] = (language_id, author_id, frozenset(genres.get(pk, ())), copies.get((pk,), (0,))[0])
+    return state
+
+
+def _contributions(state):
+    """Вклад книги в состоянии state в счётчики сводок: {(модель, ключ): {поле: значение}}."""
+    language_id, author_id, genre_ids, copies = state
+    contributions = {}
+    for genre_id in genre_ids:
+        contributions[GenreSummary, (('genre_id', genre_id),)] = {'books': 1}
+        if language_id is not None:
+            contributions[GenreLanguageSummary, (('genre_id', genre_id), ('language_id', language_id))] = {'books': 1}
+    if language_id is not None:
+        contributions[LanguageSummary, (('language_id', language_id),)] = {'books': 1}
+    if author_id is not None:
+        contributions[AuthorSummary, (('author_id', author_id),)] = {'books': 1, 'copies': copies}
+    return contributions
+
+
+def _add(model, keys, deltas):
+    """Прибавляет deltas к счётчикам строки сводки keys; строка создаётся или удаляется вместе со счётчиками."""
+    queryset = model.objects.filter(**keys)
+    # Greatest: рассогласованная сводка (исправляется rebuild_facets) не должна ломать сохранение книги
+    if queryset.update(**{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}):
+        if any(delta < 0 for delta in deltas.values()):
+            # Строка удаляется, только когда обнулились все её счётчики, а не только изменённые
+            queryset.filter(**{field: 0 for field in COUNTERS.get(model, deltas)}).delete()
+    elif all(delta >= 0 for delta in deltas.values()):
+        model.objects.create(**keys, **deltas)
+
+
+def apply_changes(before, after):
+    """Переводит книги в сводках из состояния before в after ({pk: состояние} из snapshot()).
+
+    Книги, которой нет в before, добавляются, которой нет в after - вычитаются. Запросы выполняются только
+    для строк, счётчики которых изменились.
+    """
+    deltas = {}
+    for book_id in before.keys() | after.keys():
+        for sign, state in ((-1, before.get(book_id)), (1, after.get(book_id))):
+            if state is None:
+                continue
+            for key, counters in _contributions(state).items():
+                delta = deltas.setdefault(key, dict.fromkeys(counters, 0))
+                for field, value in counters.items():
+                    delta[field] += sign * value
+    with pin_to_primary(), transaction.atomic():
+        for (model, keys), delta in deltas.items():
+            if any(delta.values()):
+                _add(model, dict(keys), delta)
+
+
+def genres_changed(links, added):
+    """Меняет сводки жанров на разницу: links - пары (книга, жанр), добавленные (added) или удалённые."""
+    genres = {}
+    for book_id, genre_id in links:
+        genres.setdefault(book_id, set()).add(genre_id)
+    if not genres:
+        return
+    with pin_to_primary():
+        languages = dict(Book.objects.filter(pk__in=genres).values_list('pk', 'language_id'))
+    # Язык в обоих состояниях один и тот же - меняются только счётчики жанров и пар жанр-язык
+    without = {pk: (languages[pk], None, frozenset(), 0) for pk in genres if pk in languages}
+    with_genres = {pk: (languages[pk], None, frozenset(genres[pk]), 0) for pk in without}
+    if added:
+        apply_changes(without, with_genres)
+    else:
+        apply_changes(with_genres, without)
+
+
+def copies_changed(deltas):
+    """Меняет количество копий авторов на разницу: deltas - {pk книги: изменение количества её копий}."""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+    authors = {}
+    with pin_to_primary(), transaction.atomic():
+        for book_id, author_id in Book.objects.filter(pk__in=deltas).values_list('pk', 'author_id'):
+            if author_id is not None:
+                authors[author_id] = authors.get(author_id, 0) + deltas[book_id]
+        for author_id, delta in authors.items():
+            if delta:
+                _add(AuthorSummary, {'author_id': author_id}, {'copies': delta})
@@ -0,0 +1,266 @@
+import datetime
+import random
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .caching import invalidate_tags, book_tag, author_tag
+from .routers import pin_to_primary
+from .models import Book, BookInstance, BookAvailability, Hold
+from .stats import CatalogStats
+
+"""
+Выдача, возврат и резервирование копий книг и журнал доступности (BookAvailability).
+
+Статус копии меняется только условным UPDATE ("... WHERE status = <ожидаемый>"), поэтому две одновременные
+выдачи одной копии не пройдут обе. Счётчики журнала меняются тем же транзакционным UPDATE с выражениями F(),
+без чтения и пересчёта строк BookInstance.
+
+Выдача и резервирование книги (checkout_book, reserve_book) берут любую доступную копию: где СУБД умеет
+SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL, MySQL 8), кандидаты блокируются, и одновременные выдачи разбирают
+разные копии, не дожидаясь друг друга; на SQLite (без блокировки строк) копия, которую успели забрать,
+не пройдёт условие UPDATE, и берётся следующая. Если копий нет, читатель встаёт в очередь (Hold); возвращённая
+копия резервируется за первым в очереди. Чтение здесь всегда идёт из основной базы, а не с реплик
+(см. catalog/routers.py): решение о записи нельзя принимать по отстающим данным.
+
+Выражения F() и update():
+https://django.fun/docs/django/ru/4.0/ref/models/expressions/#f-expressions
+"""
+
+# Срок выдачи по умолчанию и продление срока
+LOAN_DAYS = 21
+EXTEND_DAYS = 14
+
+# Сколько дней копия, зарезервированная по очереди, ждёт читателя
+HOLD_DAYS = 3
+
+# Сколько доступных копий выбирается за одну попытку взять копию книги
+CANDIDATES = 20
+
+CHUNK_SIZE = 500
+
+
+class LoanError(Exception):
+    """Операция над копией невозможна в её текущем состоянии."""
+
+
+def _counter(status):
+    return BookAvailability.STATUS_FIELDS.get(status)
+
+
+def record_status_change(book_id, old_status=None, new_status=None):
+    """Переносит копию между счётчиками книги: old_status=None - копия добавлена, new_status=None - удалена."""
+    if book_id is None:
+        return
+    changes = {}
+    # Greatest: разошедшийся с копиями журнал (исправляется reconcile_availability) не должен ломать сохранение копии
+    # нарушением CHECK (счётчик >= 0) при уменьшении нулевого счётчика
+    if old_status is None:
+        changes['total'] = F('total') + 1
+    if new_status is None:
+        changes['total'] = Greatest(F('total') - 1, 0)
+    old_field, new_field = _counter(old_status), _counter(new_status)
+    if old_field != new_field:
+        if old_field:
+            changes[old_field] = Greatest(F(old_field) - 1, 0)
+        if new_field:
+            changes[new_field] = F(new_field) + 1
+    if not changes:
+        return
+    if not BookAvailability.objects.filter(book_id=book_id).update(**changes):
+        # Строки журнала ещё нет (книга без копий до этого момента) - считаем её целиком
+        refresh([book_id])
+
+
+def count_copies(book_ids):
+    """Фактические счётчики по строкам BookInstance для книг book_ids (один сгруппированный запрос)."""
+    aggregates = {'total': Count('pk')}
+    for status, field in BookAvailability.STATUS_FIELDS.items():
+        aggregates[field] = Count('pk', filter=Q(status=status))
+    rows = BookInstance.objects.filter(book_id__in=book_ids).order_by().values('book_id').annotate(**aggregates)
+    counts = {book_id: dict.fromkeys(aggregates, 0) for book_id in book_ids}
+    for row in rows:
+        counts[row.pop('book_id')] = row
+    return counts
+
+
+def refresh(book_ids):
+    """Пересчитывает журнал для книг book_ids; возвращает список книг, строки которых исправлены."""
+    book_ids = list(book_ids)
+    fixed = []
+    with pin_to_primary():
+        for start in range(0, len(book_ids), CHUNK_SIZE):
+            chunk = book_ids[start:start + CHUNK_SIZE]
+            actual = count_copies(chunk)
+            stored = {
+                row.pop('book_id'): row
+                for row in BookAvailability.objects.filter(book_id__in=chunk).values('book_id', *actual[chunk[0]])
+            }
+            # Книги, удалённые в то же время, не попадают в журнал
+            existing = set(Book.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+            drifted = [BookAvailability(book_id=book_id, **counts)
+                       for book_id, counts in actual.items() if book_id in existing and stored.get(book_id) != counts]
+            if drifted:
+                BookAvailability.objects.bulk_create(
+                    drifted, update_conflicts=True, unique_fields=['book'], update_fields=list(actual[chunk[0]]))
+            fixed += [row.book_id for row in drifted]
+    return fixed
+
+
+def _changed(copy, old_status):
+    """Журнал, кэш страниц и счётчики главной страницы после изменения статуса копии через update()."""
+    record_status_change(copy.book_id, old_status, copy.status)
+    author_id = Book.objects.filter(pk=copy.book_id).values_list('author_id', flat=True).first()
+    invalidate_tags('availability', book_tag(copy.book_id), author_id and author_tag(author_id))
+    transaction.on_commit(CatalogStats.invalidate)
+
+
+def _transition(copy, allowed, **fields):
+    """Условно переводит копию в новое состояние, если она удовлетворяет условию allowed (Q).
+
+    Статус, прочитанный в начале, входит в условие UPDATE: если копию успели изменить, обновится 0 строк.
+    """
+    with pin_to_primary(), transaction.atomic():
+        copies = BookInstance.objects.filter(allowed, pk=copy.pk)
+        old_status = copies.values_list('status', flat=True).first()
+        if old_status is None or not copies.filter(status=old_status).update(**fields):
+            raise LoanError('Копия {0} недоступна для этой операции.'.format(copy.pk))
+        for name, value in fields.items():
+            setattr(copy, name, value)
+        _changed(copy, old_status)
+    return copy
+
+
+def checkout_copy(copy, user, due_back=None):
+    """Выдаёт копию пользователю: из наличия или из резерва этого же пользователя."""
+    due_back = due_back or datetime.date.today() + datetime.timedelta(days=LOAN_DAYS)
+    allowed = Q(status='н') | Q(status='р', borrower=user) | Q(status='р', borrower__isnull=True)
+    return _transition(copy, allowed, status='в', borrower=user, due_back=due_back, overdue=False)
+
+
+def return_copy(copy):
+    """Принимает выданную или зарезервированную копию обратно в наличие."""
+    return _transition(copy, Q(status__in=('в', 'р')), status='н', borrower=None, due_back=None, overdue=False)
+
+
+def reserve_copy(copy, user, due_back=None):
+    """Резервирует копию в наличии за пользователем (due_back - до какого дня держать резерв)."""
+    return _transition(copy, Q(status='н'), status='р', borrower=user, due_back=due_back)
+
+
+def bulk_update(copies, **fields):
+    """Изменяет набор копий (QuerySet) одним UPDATE; журнал и кэш пересчитываются только по затронутым книгам.
+
+    Возвращает количество изменённых копий.
+    """
+    with pin_to_primary(), transaction.atomic():
+        book_ids = set(copies.order_by().values_list('book_id', flat=True).distinct())
+        updated = copies.update(**fields)
+        if updated:
+            refresh(book_ids)
+            if 'status' in fields:
+                # Резервы, снятые с копий, освобождают место в очереди; доступные копии - первым в очереди
+                Hold.objects.filter(book_id__in=book_ids, copy__isnull=False).exclude(copy__status='р').delete()
+                for book_id in Hold.objects.filter(book_id__in=book_ids, copy__isnull=True).order_by() \
+                        .values_list('book_id', flat=True).distinct():
+                    allocate(book_id)
+            author_ids = Book.objects.filter(pk__in=book_ids).order_by().values_list('author_id', flat=True).distinct()
+            invalidate_tags('availability', *map(book_tag, book_ids),
+                            *(author_tag(author_id) for author_id in author_ids if author_id))
+            transaction.on_commit(CatalogStats.invalidate)
+    return updated
+
+
+def _take_available(book_id, **fields):
+    """Переводит любую доступную копию книги в новое состояние; None - доступных копий нет."""
+    while True:
+        copies = BookInstance.objects.filter(book_id=book_id, status='н').order_by()
+        if connection.features.has_select_for_update_skip_locked:
+            copies = copies.select_for_update(skip_locked=True)
+        candidates = list(copies[:CANDIDATES])
+        if not candidates:
+            return None
+        # Одновременные выдачи начинают с разных копий и реже мешают друг другу
+        random.shuffle(candidates)
+        for copy in candidates:
+            try:
+                return _transition(copy, Q(status='н'), **fields)
+            except LoanError:
+                continue
+
+
+def allocate(book_id):
+    """Резервирует доступные копии книги за первыми в очереди; возвращает количество обслуженных записей."""
+    due_back = datetime.date.today() + datetime.timedelta(days=HOLD_DAYS)
+    served = 0
+    with pin_to_primary(), transaction.atomic():
+        for hold in Hold.objects.filter(book_id=book_id, copy__isnull=True).order_by('pk'):
+            try:
+                with transaction.atomic():
+                    copy = _take_available(book_id, status='р', borrower_id=hold.user_id, due_back=due_back)
+                    if copy is None:
+                        break
+                    # Запись могли обслужить или отменить одновременно - тогда резерв копии откатывается
+                    if not Hold.objects.filter(pk=hold.pk, copy__isnull=True).update(copy=copy):
+                        raise LoanError('Запись очереди {0} уже обслужена.'.format(hold.pk))
+            except LoanError:
+                continue
+            served += 1
+    return served
+
+
+def checkout_book(book, user, due_back=None):
+    """Выдаёт читателю копию книги: зарезервированную за ним по очереди или любую доступную."""
+    due_back = due_back or datetime.date.today() + datetime.timedelta(days=LOAN_DAYS)
+    with pin_to_primary(), transaction.atomic():
+        hold = Hold.objects.filter(book=book, user=user).select_related('copy').first()
+        if hold is not None and hold.copy is not None:
+            copy = checkout_copy(hold.copy, user, due_back)
+        else:
+            copy = _take_available(book.pk, status='в', borrower=user, due_back=due_back, overdue=False)
+            if copy is None:
+                raise LoanError('Нет доступных копий книги {0}.'.format(book.pk))
+        if hold is not None:
+            hold.delete()
+    return copy
+
+
+def reserve_book(book, user):
+    """Ставит читателя в очередь на книгу; если есть доступная копия, она сразу резервируется за ним.
+
+    Возвращает запись очереди: hold.copy - зарезервированная копия или None, пока читатель ждёт.
+    """
+    with pin_to_primary(), transaction.atomic():
+        hold, created = Hold.objects.get_or_create(book=book, user=user)
+        if created and allocate(book.pk):
+            hold.refresh_from_db(fields=['copy'])
+    return hold
+
+
+def return_book(copy):
+    """Принимает выданную или зарезервированную копию и резервирует её за первым в очереди на книгу."""
+    with pin_to_primary(), transaction.atomic():
+        Hold.objects.filter(copy=copy).delete()
+        return_copy(copy)
+        allocate(copy.book_id)
+    return copy
+
+
+def cancel_hold(hold):
+    """Убирает читателя из очереди; зарезервированная за ним копия переходит следующему."""
+    with pin_to_primary(), transaction.atomic():
+        # Копию, которую читатель уже забрал (выдана), отмена записи не затрагивает
+        copy = BookInstance.objects.filter(hold__pk=hold.pk, status='р').first()
+        Hold.objects.filter(pk=hold.pk).delete()
+        if copy is not None:
+            return_book(copy)
+
+
+def expire_holds(today=None):
+    """Снимает резервы по очереди, которые читатели не забрали до copy.due_back; возвращает их количество."""
+    today = today or datetime.date.today()
+    expired = list(Hold.objects.filter(copy__status='р', copy__due_back__lt=today).order_by('pk'))
+    for hold in expired:
+        cancel_hold(hold)
+    return len(expired)
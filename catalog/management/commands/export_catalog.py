@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from catalog import export
+
+"""
+Потоковая выгрузка каталога (см. catalog/export.py).
+
+    python manage.py export_catalog books --format jsonl --gzip -o books.jsonl.gz
+"""
+
+
+class Command(BaseCommand):
+    help = 'Выгружает книги, авторов, экземпляры или жанры в CSV/JSONL (gzip) с постоянным расходом памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS), help='набор данных')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv', help='формат вывода')
+        parser.add_argument('--gzip', action='store_true', help='сжать вывод gzip')
+        parser.add_argument('-o', '--output', help='файл вывода (по умолчанию - стандартный вывод)')
+
+    def handle(self, *args, **options):
+        chunks = export.stream(options['dataset'], options['format'], options['gzip'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
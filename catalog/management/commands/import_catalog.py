@@ -0,0 +1,253 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction, DatabaseError
+
+from catalog import facets
+from catalog.models import Author, Genre, Language, Book, BookInstance
+from catalog.signals import books_bulk_changed
+
+"""
+Массовый импорт каталога партнёрской библиотеки из CSV или JSONL.
+
+    python manage.py import_catalog partner.csv --batch-size 1000
+    python manage.py import_catalog partner.jsonl --resume
+
+Поля строки: isbn, title, summary, author_first_name, author_last_name, language, genres (в CSV - через ';',
+в JSONL - списком или строкой через ';'), copies (количество создаваемых копий), imprint, status.
+Целые числа в текстовых полях JSONL (например, isbn) приводятся к строкам, значения других типов
+(списки, объекты, true/false) отклоняют только свою строку, как и прочие ошибки данных.
+Книга обновляется по уникальному isbn; копии создаются только для новых книг, поэтому повторный импорт
+того же файла не размножает экземпляры.
+
+Массовое создание объектов:
+https://django.fun/docs/django/ru/4.0/ref/models/querysets/#bulk-create
+"""
+
+BOOK_UPDATE_FIELDS = ['title', 'summary', 'author', 'language']
+STATUSES = dict(BookInstance.LOAN_STATUS)
+
+
+class RowError(ValueError):
+    """Строка файла не может быть импортирована."""
+
+
+def read_rows(path, fmt, skip=0):
+    """Потоково читает файл: (номер строки, словарь полей), начиная после строки skip."""
+    with open(path, newline='', encoding='utf-8') as stream:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(stream), start=1):
+                if number > skip:
+                    yield number, row
+        else:
+            for number, line in enumerate(stream, start=1):
+                if number > skip and line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError:
+                        yield number, None
+
+
+def text(value, name, default=''):
+    """Строковое значение поля без пробелов по краям; в JSONL число (например, isbn) приводится к строке."""
+    if value is None or value == '':
+        return default
+    # bool - подкласс int, но true/false в текстовом поле - ошибка данных
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise RowError('поле {0}: ожидается строка, получено {1!r}'.format(name, value))
+    return value.strip()
+
+
+def split_genres(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    elif not isinstance(value, list):
+        raise RowError('поле genres: ожидается список или строка, получено {0!r}'.format(value))
+    return [name for name in (text(name, 'genres') for name in value) if name]
+
+
+def clean_row(row):
+    """Проверяет и нормализует строку."""
+    if not isinstance(row, dict):
+        raise RowError('строка не является объектом JSON')
+    isbn = text(row.get('isbn'), 'isbn')
+    title = text(row.get('title'), 'title')
+    if not isbn or len(isbn) > 13:
+        raise RowError('неверный ISBN {0!r}'.format(isbn))
+    if not title:
+        raise RowError('пустой заголовок')
+    status = text(row.get('status'), 'status', 'н')
+    if status not in STATUSES:
+        raise RowError('неизвестный статус {0!r}'.format(status))
+    try:
+        copies = int(row.get('copies') or 0)
+    except (TypeError, ValueError):
+        raise RowError('неверное количество копий {0!r}'.format(row.get('copies')))
+    first_name = text(row.get('author_first_name'), 'author_first_name')
+    last_name = text(row.get('author_last_name'), 'author_last_name')
+    # Ключ автора - в порядке полей LookupMap(Author, ['last_name', 'first_name'])
+    return {
+        'isbn': isbn,
+        'title': title[:200],
+        'summary': text(row.get('summary'), 'summary')[:1000],
+        'author': (last_name[:100], first_name[:100]) if first_name or last_name else None,
+        'language': text(row.get('language'), 'language')[:200] or None,
+        'genres': [name[:200] for name in split_genres(row.get('genres'))],
+        'copies': max(copies, 0),
+        'imprint': text(row.get('imprint'), 'imprint')[:200],
+        'status': status,
+    }
+
+
+class LookupMap:
+    """Словарь "ключ -> pk" для справочника; недостающие записи создаются одним bulk_create на пачку."""
+
+    def __init__(self, model, key_fields):
+        self.model = model
+        self.key_fields = key_fields
+        self.ids = {
+            tuple(values): pk
+            for pk, *values in model.objects.values_list('pk', *key_fields).iterator(chunk_size=2000)
+        }
+        self.created = 0
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        if missing:
+            self.model.objects.bulk_create(self.model(**dict(zip(self.key_fields, key))) for key in missing)
+            self.created += len(missing)
+            # pk созданных записей читаются заново: не все СУБД возвращают их из bulk_create
+            lookup = {self.key_fields[0] + '__in': {key[0] for key in missing}}
+            for pk, *values in self.model.objects.filter(**lookup).values_list('pk', *self.key_fields):
+                self.ids.setdefault(tuple(values), pk)
+
+    def __getitem__(self, key):
+        return self.ids[key]
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт книг, авторов, жанров и копий из CSV или JSONL с пакетной записью.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл CSV или JSONL')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='формат (по умолчанию - по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='строк в одной транзакции')
+        parser.add_argument('--state', help='файл контрольной точки (по умолчанию <path>.import-state)')
+        parser.add_argument('--resume', action='store_true', help='продолжить после последней успешной пачки')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('Файл {0} не найден.'.format(path))
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        state_path = options['state'] or path + '.import-state'
+        batch_size = options['batch_size']
+
+        skip = self.load_state(state_path) if options['resume'] else 0
+        if skip:
+            self.stdout.write('Продолжение после строки {0}'.format(skip))
+
+        self.authors = LookupMap(Author, ['last_name', 'first_name'])
+        self.genres = LookupMap(Genre, ['name'])
+        self.languages = LookupMap(Language, ['name'])
+        self.stats = {'rows': 0, 'skipped': 0, 'books_created': 0, 'books_updated': 0, 'copies': 0}
+
+        rows = read_rows(path, fmt, skip)
+        started = time.perf_counter()
+        last_row = skip
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            records = self.clean_batch(batch)
+            try:
+                with transaction.atomic():
+                    self.write_batch(records)
+            except DatabaseError as exc:
+                raise CommandError('Ошибка в пачке строк {0}-{1}: {2}. Исправьте данные и запустите команду '
+                                   'с --resume.'.format(batch[0][0], batch[-1][0], exc))
+            last_row = batch[-1][0]
+            self.save_state(state_path, last_row)
+            self.stats['rows'] += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write('Строк: {0} ({1:.0f} строк/с)'.format(self.stats['rows'], self.stats['rows'] / elapsed))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Импорт завершён за {0:.2f} с: строк {rows}, пропущено {skipped}, новых книг {books_created}, '
+            'обновлено книг {books_updated}, копий {copies}; новых авторов {1}, жанров {2}, языков {3}'.format(
+                elapsed, self.authors.created, self.genres.created, self.languages.created, **self.stats)))
+
+    def clean_batch(self, batch):
+        # Последняя строка с тем же ISBN в пачке побеждает
+        records = {}
+        for number, row in batch:
+            try:
+                record = clean_row(row)
+            except RowError as exc:
+                self.stats['skipped'] += 1
+                self.stderr.write('Строка {0} пропущена: {1}'.format(number, exc))
+                continue
+            records[record['isbn']] = record
+        return list(records.values())
+
+    def write_batch(self, records):
+        if not records:
+            return
+        self.authors.resolve({record['author'] for record in records if record['author']})
+        self.languages.resolve({(record['language'],) for record in records if record['language']})
+        self.genres.resolve({(name,) for record in records for name in record['genres']})
+
+        isbns = [record['isbn'] for record in records]
+        existing = dict(Book.objects.filter(isbn__in=isbns).values_list('isbn', 'pk'))
+        # Состояние обновляемых книг до записи: сводки обзора каталога изменятся на разницу (см. catalog/facets.py)
+        previous = facets.snapshot(existing.values())
+
+        # Вставка или обновление по уникальному isbn (INSERT ... ON CONFLICT DO UPDATE)
+        Book.objects.bulk_create(
+            [Book(isbn=record['isbn'], title=record['title'], summary=record['summary'],
+                  author_id=self.authors[record['author']] if record['author'] else None,
+                  language_id=self.languages[(record['language'],)] if record['language'] else None)
+             for record in records],
+            update_conflicts=True, unique_fields=['isbn'], update_fields=BOOK_UPDATE_FIELDS)
+        book_ids = dict(Book.objects.filter(isbn__in=isbns).values_list('isbn', 'pk'))
+
+        # Жанры книги заменяются жанрами из файла - прямой записью в промежуточную таблицу
+        through = Book.genre.through
+        through.objects.filter(book_id__in=book_ids.values()).delete()
+        through.objects.bulk_create(
+            [through(book_id=book_ids[record['isbn']], genre_id=self.genres[(name,)])
+             for record in records for name in set(record['genres'])],
+            ignore_conflicts=True)
+
+        instances = [
+            BookInstance(book_id=book_ids[record['isbn']], imprint=record['imprint'], status=record['status'])
+            for record in records if record['isbn'] not in existing for _ in range(record['copies'])
+        ]
+        BookInstance.objects.bulk_create(instances)
+
+        self.stats['books_created'] += len(records) - len(existing)
+        self.stats['books_updated'] += len(existing)
+        self.stats['copies'] += len(instances)
+        books_bulk_changed.send(sender=Book, book_ids=list(book_ids.values()), previous=previous)
+
+    @staticmethod
+    def load_state(state_path):
+        try:
+            with open(state_path, encoding='utf-8') as stream:
+                return json.load(stream)['last_row']
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def save_state(state_path, last_row):
+        with open(state_path, 'w', encoding='utf-8') as stream:
+            json.dump({'last_row': last_row}, stream)
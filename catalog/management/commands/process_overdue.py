@@ -0,0 +1,75 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import loans
+from catalog.models import BookInstance, BatchWatermark
+
+"""
+Пакетная обработка просроченных выдач. Запускается по расписанию (cron), например раз в сутки:
+    python manage.py process_overdue
+
+Просматриваются только выдачи, чей срок возврата (due_back) наступил после предыдущего запуска: от сохранённой
+отметки до сегодняшнего дня, по индексу (status, due_back). Каждая порция отмечается (overdue = True),
+и напоминания читателям отправляются одним соединением через send_mass_mail и настроенный EMAIL_BACKEND.
+Затем снимаются резервы по очереди, которые читатели не забрали в срок (копии переходят следующим в очереди).
+
+Отправка электронной почты:
+https://django.fun/docs/django/ru/4.0/topics/email/#send-mass-mail
+"""
+
+WATERMARK = 'process_overdue'
+
+SUBJECT = 'Просрочен возврат книги'
+MESSAGE = ('Здравствуйте, {name}!\n\n'
+           'Срок возврата книги «{title}» истёк {due_back:%d.%m.%Y}. Пожалуйста, верните её в библиотеку.\n')
+
+
+class Command(BaseCommand):
+    help = 'Отмечает просроченные с прошлого запуска выдачи и отправляет читателям напоминания.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='выдач в одной порции')
+        parser.add_argument('--dry-run', action='store_true', help='только показать количество, без изменений')
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        watermark = BatchWatermark.objects.filter(name=WATERMARK).first()
+
+        pending = BookInstance.objects.filter(status__exact='в', overdue=False, due_back__lt=today)
+        if watermark is not None:
+            pending = pending.filter(due_back__gte=watermark.value)
+        pending = pending.order_by('due_back', 'pk')
+
+        if options['dry_run']:
+            self.stdout.write('Новых просроченных выдач: {0}'.format(pending.count()))
+            return
+
+        started = time.perf_counter()
+        marked = sent = 0
+        while True:
+            # Отмеченные выдачи выпадают из выборки, поэтому каждый раз берётся первая порция
+            with transaction.atomic():
+                chunk = list(pending.values_list('pk', 'due_back', 'book__title', 'borrower__username',
+                                               'borrower__first_name', 'borrower__email')[:options['chunk_size']])
+                if not chunk:
+                    break
+                BookInstance.objects.filter(pk__in=[row[0] for row in chunk]).update(overdue=True)
+                messages = [
+                    (SUBJECT, MESSAGE.format(name=first_name or username, title=title, due_back=due_back),
+                     settings.DEFAULT_FROM_EMAIL, [email])
+                    for pk, due_back, title, username, first_name, email in chunk if email
+                ]
+                # Ошибка отправки откатывает отметки порции: при следующем запуске она будет обработана снова
+                sent += send_mass_mail(messages, fail_silently=False) if messages else 0
+            marked += len(chunk)
+
+        BatchWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': today})
+        expired = loans.expire_holds(today)
+        self.stdout.write(self.style.SUCCESS('Отмечено просроченных выдач: {0}, отправлено напоминаний: {1}, '
+                                             'снято резервов по очереди: {2} за {3:.2f} с'.format(
+                                                 marked, sent, expired, time.perf_counter() - started)))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import search
+
+"""
+Собственные команды manage.py:
+https://django.fun/docs/django/ru/4.0/howto/custom-management-commands/
+"""
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс книг (SQLite FTS5).'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс поддерживается только на SQLite.')
+        started = time.perf_counter()
+        with transaction.atomic():
+            total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано книг: {0} за {1:.2f} с'.format(total, time.perf_counter() - started)))
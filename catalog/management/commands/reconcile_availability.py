@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import loans
+from catalog.caching import invalidate_tags, book_tag, author_tag
+from catalog.models import Book
+
+"""
+Периодическая сверка журнала доступности (BookAvailability) с фактическими копиями книг.
+Запускается по расписанию (cron), например раз в сутки:
+    python manage.py reconcile_availability
+"""
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики доступности книг по копиям и исправляет расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=loans.CHUNK_SIZE, help='книг в одной транзакции')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            chunk = list(Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                book_ids = loans.refresh(chunk)
+                if book_ids:
+                    # Счётчики журнала показывают и списки, и страницы исправленных книг и их авторов
+                    author_ids = Book.objects.filter(pk__in=book_ids).exclude(author=None) \
+                        .order_by().values_list('author_id', flat=True).distinct()
+                    invalidate_tags('availability', *map(book_tag, book_ids), *map(author_tag, author_ids))
+            checked += len(chunk)
+            fixed += len(book_ids)
+            last_pk = chunk[-1]
+        self.stdout.write(self.style.SUCCESS('Проверено книг: {0}, исправлено: {1} за {2:.2f} с'.format(
+            checked, fixed, time.perf_counter() - started)))
@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from catalog import routers
+
+"""
+Копирование основной базы SQLite в файлы реплик (CATALOG_READ_REPLICAS) - для проверки чтения с реплик
+на одной машине (locallibrary/settings_replicas.py). С --interval копирование повторяется, имитируя
+реплику с отставанием:
+    python manage.py sync_replica --settings=locallibrary.settings_replicas --interval 5
+
+Копия делается через SQLite Online Backup API и согласована, даже если в основную базу в это время пишут:
+https://docs.python.org/3/library/sqlite3.html#sqlite3.Connection.backup
+"""
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в базы реплик каталога.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='повторять каждые N секунд')
+
+    def handle(self, *args, **options):
+        aliases = routers.replicas()
+        if not aliases:
+            raise CommandError('Реплики не настроены (CATALOG_READ_REPLICAS).')
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError('Команда работает только с SQLite: {0}'.format(alias))
+
+        while True:
+            started = time.perf_counter()
+            self.sync(aliases)
+            self.stdout.write('Реплики {0} обновлены за {1:.2f} с'.format(
+                ', '.join(aliases), time.perf_counter() - started))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, aliases):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in aliases:
+            # Соединение Django с репликой закрывается: файл перезаписывается целиком
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
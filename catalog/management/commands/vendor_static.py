@@ -0,0 +1,30 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import vendor
+
+"""
+Собственные команды manage.py:
+https://django.fun/docs/django/ru/4.0/howto/custom-management-commands/
+"""
+
+
+class Command(BaseCommand):
+    help = ('Загружает Bootstrap 3.3.7 и jQuery 1.12.4 в статические файлы каталога (catalog/static/catalog/vendor/). '
+            'Загруженные файлы добавляются в репозиторий; уже загруженные библиотеки пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='загрузить заново и уже загруженные библиотеки')
+
+    def handle(self, *args, **options):
+        try:
+            written = vendor.fetch(force=options['force'])
+        except OSError as error:
+            raise CommandError('Не удалось загрузить файлы: {0}'.format(error))
+        for path in written:
+            self.stdout.write(os.path.relpath(path))
+        missing = vendor.missing()
+        if missing:
+            raise CommandError('После загрузки нет файлов: {0}'.format(', '.join(missing)))
+        self.stdout.write(self.style.SUCCESS('Загружено файлов: {0}'.format(len(written))))
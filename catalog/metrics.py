@@ -0,0 +1,205 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.template.exceptions import TemplateDoesNotExist
+
+"""
+Измерение запросов к серверу: количество SQL-запросов и повторов, время SQL, отрисовки шаблонов и общее.
+
+RequestMetricsMiddleware (catalog/middleware.py, первым в MIDDLEWARE) для каждого запроса:
+    - считает SQL-запросы всех баз данных через connection.execute_wrapper(); повтор - тот же SQL
+      с теми же параметрами в одном запросе (обычно признак N+1);
+    - получает время отрисовки шаблонов от движка DjangoTemplates (TEMPLATES в настройках);
+    - добавляет заголовок Server-Timing (виден в инструментах разработчика браузера);
+    - добавляет значения в гистограммы представления (/catalog/metrics/ - для сотрудников);
+    - пишет в журнал 'catalog.performance' запросы дольше CATALOG_SLOW_REQUEST_MS миллисекунд.
+
+Гистограммы хранятся в памяти процесса: у каждого процесса сервера (gunicorn) они свои.
+Время отрисовки включает SQL-запросы, выполненные при отрисовке (ленивые QuerySet в шаблоне).
+Для потоковых ответов учитывается время до начала отправки.
+
+Обёртки выполнения запросов и заголовок Server-Timing:
+https://django.fun/docs/django/ru/4.0/topics/db/instrumentation/
+https://developer.mozilla.org/ru/docs/Web/HTTP/Headers/Server-Timing
+"""
+
+logger = logging.getLogger('catalog.performance')
+
+# Верхние границы интервалов гистограмм: миллисекунды и количество SQL-запросов
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('catalog_request_metrics', default=None)
+
+
+def slow_request_ms():
+    return getattr(settings, 'CATALOG_SLOW_REQUEST_MS', 500)
+
+
+class RequestMetrics:
+    """Показатели одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duplicates = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка execute_wrapper(): время и повторы SQL-запросов
+        key = (sql, repr(params))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+        self.queries += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+
+
+class Histogram:
+    """Гистограмма с фиксированными интервалами; квантили - по верхней границе интервала."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Верхняя граница интервала, в который попадает квантиль q; None - за последней границей."""
+        rank, total = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 2) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['inf'], self.counts)),
+        }
+
+
+class ViewMetrics:
+    """Гистограммы одного представления."""
+
+    def __init__(self):
+        self.total = Histogram(TIME_BUCKETS)
+        self.sql = Histogram(TIME_BUCKETS)
+        self.render = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicates = 0
+        self.slow = 0
+
+    def add(self, record, total_ms):
+        self.total.add(total_ms)
+        self.sql.add(record.sql_time * 1000)
+        self.render.add(record.render_time * 1000)
+        self.queries.add(record.queries)
+        self.duplicates += record.duplicates
+        self.slow += total_ms >= slow_request_ms()
+
+    def as_dict(self):
+        return {
+            'total_ms': self.total.as_dict(),
+            'sql_ms': self.sql.as_dict(),
+            'render_ms': self.render.as_dict(),
+            'queries': self.queries.as_dict(),
+            'duplicate_queries': self.duplicates,
+            'slow_requests': self.slow,
+        }
+
+
+_lock = threading.Lock()
+_views = defaultdict(ViewMetrics)
+
+
+def record(view_name, metrics, total_ms):
+    with _lock:
+        _views[view_name].add(metrics, total_ms)
+
+
+def snapshot():
+    """Гистограммы всех представлений этого процесса."""
+    with _lock:
+        views = {name: metrics.as_dict() for name, metrics in sorted(_views.items())}
+    return {'pid': os.getpid(), 'slow_request_ms': slow_request_ms(), 'views': views}
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+@contextmanager
+def request_scope():
+    """Границы запроса для измерения (используется RequestMetricsMiddleware); возвращает RequestMetrics."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def server_timing(metrics, total_ms):
+    return 'db;dur={0:.1f};desc="{1} queries, {2} duplicate", tpl;dur={3:.1f}, total;dur={4:.1f}'.format(
+        metrics.sql_time * 1000, metrics.queries, metrics.duplicates, metrics.render_time * 1000, total_ms)
+
+
+class Template(django_backend.Template):
+    """Шаблон, время отрисовки которого учитывается в показателях текущего запроса."""
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        # Вложенная отрисовка (render_to_string в теге шаблона) уже учтена внешней
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Движок шаблонов Django с измерением времени отрисовки (TEMPLATES['BACKEND'])."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
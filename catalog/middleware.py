@@ -0,0 +1,97 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics, routers
+
+"""
+PrimaryPinMiddleware - прикрепление клиента к основной базе данных после записи (read-your-writes при чтении с реплик).
+
+После запроса, который что-то записал (выдача книги, вход в систему, ...), клиент получает cookie на
+CATALOG_REPLICA_LAG секунд, и пока cookie не истёк, его запросы читают из основной базы, а не с реплик,
+которые могут ещё не содержать этой записи. Подключается перед SessionMiddleware, чтобы учитывалось
+и сохранение сессии. См. catalog/routers.py.
+
+RequestMetricsMiddleware - измерение запросов: SQL, шаблоны, общее время (catalog/metrics.py).
+
+Оба слоя поддерживают и синхронный, и асинхронный режим: под ASGI Django не оборачивает
+асинхронные представления (catalog/async_views.py) в async_to_sync/sync_to_async ради этих слоёв.
+Состояние запроса хранится в ContextVar, поэтому оно одинаково работает в обоих режимах.
+
+Промежуточный слой (middleware), асинхронная поддержка:
+https://django.fun/docs/django/ru/4.0/topics/http/middleware/
+https://django.fun/docs/django/ru/4.0/topics/http/middleware/#async-middleware
+"""
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PrimaryPinMiddleware:
+    cookie_name = 'catalog_primary'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.request_scope(self.pinned(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        with routers.request_scope(self.pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(state, response)
+
+    def pinned(self, request):
+        return request.method not in SAFE_METHODS or self.cookie_name in request.COOKIES
+
+    def process_response(self, state, response):
+        if state.wrote:
+            response.set_cookie(self.cookie_name, '1', max_age=routers.replica_lag(), httponly=True, samesite='Lax')
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Показатели запроса: заголовок Server-Timing, гистограммы представления, журнал медленных запросов."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.request_scope() as current:
+            response = self.get_response(request)
+        return self.process_response(request, response, current, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.request_scope() as current:
+            response = await self.get_response(request)
+        return self.process_response(request, response, current, started)
+
+    def process_response(self, request, response, current, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        # Имя маршрута, а не путь: количество гистограмм не растёт с количеством страниц
+        view_name = match.view_name if match is not None else '<unresolved>'
+        metrics.record(view_name, current, total_ms)
+        response['Server-Timing'] = metrics.server_timing(current, total_ms)
+        if total_ms >= metrics.slow_request_ms():
+            metrics.logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL-запросов %d (повторов %d) %.0f мс, шаблоны %.0f мс',
+                request.method, request.path, view_name, total_ms, current.queries, current.duplicates,
+                current.sql_time * 1000, current.render_time * 1000)
+        return response
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+"""
+Виртуальная таблица SQLite FTS5 для полнотекстового поиска по книгам (см. catalog/search.py).
+На других СУБД миграция ничего не делает - поиск работает через icontains.
+"""
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE catalog_book_fts USING fts5(
+    title, summary, isbn, author, genres,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+POPULATE_TABLE = """
+INSERT INTO catalog_book_fts (rowid, title, summary, isbn, author, genres)
+SELECT book.id, book.title, book.summary, book.isbn,
+       TRIM(COALESCE(author.first_name, '') || ' ' || COALESCE(author.last_name, '')),
+       COALESCE((SELECT GROUP_CONCAT(genre.name, ' ')
+                 FROM catalog_book_genre book_genre
+                 INNER JOIN catalog_genre genre ON genre.id = book_genre.genre_id
+                 WHERE book_genre.book_id = book.id), '')
+FROM catalog_book book
+LEFT OUTER JOIN catalog_author author ON author.id = book.author_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(POPULATE_TABLE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:37
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+STATUS_FIELDS = {'н': 'available', 'в': 'loaned', 'р': 'reserved', 'о': 'maintenance'}
+
+
+def fill_availability(apps, schema_editor):
+    """Заполняет журнал доступности по существующим копиям (один сгруппированный запрос)."""
+    Book = apps.get_model('catalog', 'Book')
+    BookAvailability = apps.get_model('catalog', 'BookAvailability')
+    aggregates = {'total': Count('bookinstance')}
+    for status, field in STATUS_FIELDS.items():
+        aggregates[field] = Count('bookinstance', filter=Q(bookinstance__status=status))
+    rows = Book.objects.order_by().values('pk').annotate(**aggregates)
+    BookAvailability.objects.bulk_create(
+        (BookAvailability(book_id=row.pop('pk'), **row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookAvailability',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='catalog.book', verbose_name='книга')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='всего копий')),
+                ('available', models.PositiveIntegerField(default=0, verbose_name='в наличии')),
+                ('loaned', models.PositiveIntegerField(default=0, verbose_name='выдано')),
+                ('reserved', models.PositiveIntegerField(default=0, verbose_name='зарезервировано')),
+                ('maintenance', models.PositiveIntegerField(default=0, verbose_name='на обслуживании')),
+            ],
+            options={
+                'verbose_name': 'доступность книги',
+                'verbose_name_plural': 'доступность книг',
+            },
+        ),
+        migrations.RunPython(fill_availability, migrations.RunPython.noop),
+    ]
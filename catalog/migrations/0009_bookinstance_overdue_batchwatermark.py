@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_bookavailability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchWatermark',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='обработка')),
+                ('value', models.DateField(verbose_name='обработано до')),
+            ],
+            options={
+                'verbose_name': 'отметка пакетной обработки',
+                'verbose_name_plural': 'отметки пакетной обработки',
+            },
+        ),
+        migrations.AddField(
+            model_name='bookinstance',
+            name='overdue',
+            field=models.BooleanField(default=False, editable=False, verbose_name='просрочена'),
+        ),
+    ]
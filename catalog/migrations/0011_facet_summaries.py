@@ -0,0 +1,95 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:29
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_summaries(apps, schema_editor):
+    """Заполняет сводки по существующим книгам и копиям (сгруппированные запросы)."""
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    through = Book.genre.through.objects.order_by()
+    summaries = {
+        'GenreSummary': through.values('genre_id').annotate(books=Count('pk')),
+        'GenreLanguageSummary': through.filter(book__language__isnull=False)
+                                       .values('genre_id', language_id=models.F('book__language_id'))
+                                       .annotate(books=Count('pk')),
+        'LanguageSummary': Book.objects.filter(language__isnull=False).order_by()
+                                       .values('language_id').annotate(books=Count('pk')),
+    }
+    for name, rows in summaries.items():
+        model = apps.get_model('catalog', name)
+        model.objects.bulk_create((model(**row) for row in rows.iterator()), batch_size=1000)
+
+    copies = dict(BookInstance.objects.filter(book__author__isnull=False).order_by()
+                  .values('book__author_id').annotate(copies=Count('pk')).values_list('book__author_id', 'copies'))
+    AuthorSummary = apps.get_model('catalog', 'AuthorSummary')
+    AuthorSummary.objects.bulk_create(
+        (AuthorSummary(author_id=author_id, books=books, copies=copies.get(author_id, 0))
+         for author_id, books in Book.objects.filter(author__isnull=False).order_by().values('author_id')
+                                            .annotate(books=Count('pk')).values_list('author_id', 'books')),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSummary',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='catalog.author', verbose_name='автор')),
+                ('books', models.PositiveIntegerField(default=0, verbose_name='книг')),
+                ('copies', models.PositiveIntegerField(default=0, verbose_name='копий')),
+            ],
+            options={
+                'verbose_name': 'сводка автора',
+                'verbose_name_plural': 'сводки авторов',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreSummary',
+            fields=[
+                ('genre', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='catalog.genre', verbose_name='жанр')),
+                ('books', models.PositiveIntegerField(default=0, verbose_name='книг')),
+            ],
+            options={
+                'verbose_name': 'сводка жанра',
+                'verbose_name_plural': 'сводки жанров',
+            },
+        ),
+        migrations.CreateModel(
+            name='LanguageSummary',
+            fields=[
+                ('language', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='catalog.language', verbose_name='язык')),
+                ('books', models.PositiveIntegerField(default=0, verbose_name='книг')),
+            ],
+            options={
+                'verbose_name': 'сводка языка',
+                'verbose_name_plural': 'сводки языков',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreLanguageSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('books', models.PositiveIntegerField(default=0, verbose_name='книг')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.genre', verbose_name='жанр')),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.language', verbose_name='язык')),
+            ],
+            options={
+                'verbose_name': 'сводка жанра и языка',
+                'verbose_name_plural': 'сводки жанров и языков',
+                'indexes': [models.Index(fields=['language', 'genre'], name='catalog_genrelang_lang_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='genrelanguagesummary',
+            constraint=models.UniqueConstraint(fields=('genre', 'language'), name='catalog_genrelang_unique'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
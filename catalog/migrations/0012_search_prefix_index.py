@@ -0,0 +1,41 @@
+from django.db import migrations
+
+"""
+Индекс префиксов 3-6 символов для таблицы FTS5 (см. catalog/search.py): слова запроса ищутся как префиксы
+основ ("мастер"*), и без такого индекса FTS5 объединяет списки документов всех слов с этим префиксом -
+время запроса растёт вместе с каталогом. Таблица пересоздаётся, строки копируются из прежней.
+
+Индексы префиксов FTS5:
+https://www.sqlite.org/fts5.html#prefix_indexes
+"""
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE catalog_book_fts_new USING fts5(
+    title, summary, isbn, author, genres,
+    tokenize = 'unicode61 remove_diacritics 2'{0}
+)
+"""
+
+
+def recreate(prefix):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute(CREATE_TABLE.format(",\n    prefix = '{0}'".format(prefix) if prefix else ''))
+        schema_editor.execute('INSERT INTO catalog_book_fts_new (rowid, title, summary, isbn, author, genres) '
+                              'SELECT rowid, title, summary, isbn, author, genres FROM catalog_book_fts')
+        schema_editor.execute("INSERT INTO catalog_book_fts_new (catalog_book_fts_new) VALUES ('optimize')")
+        schema_editor.execute('DROP TABLE catalog_book_fts')
+        schema_editor.execute('ALTER TABLE catalog_book_fts_new RENAME TO catalog_book_fts')
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_facet_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate('3 4 5 6'), recreate(None)),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.urls import reverse     # Используется для генерации URL-адресов путем отмены шаблонов URL-адреса
 import uuid     # Требуется для уникальных экземпляров книги
 from django.contrib.auth.models import User
@@ -83,6 +84,12 @@ class Book(models.Model):
         # Имя во множественном числе для объекта:
         verbose_name_plural = 'книги'
 
+        # Индексы по выражению для поиска без учёта регистра (UPPER(title), как в iexact/istartswith):
+        # https://django.fun/docs/django/ru/4.0/ref/models/indexes/#expressions
+        indexes = [
+            models.Index(Upper('title'), name='catalog_book_title_upper_idx'),
+        ]
+
 
 class BookInstance(models.Model):
     """Модель, представляющая конкретную копию книги (то есть, которая может быть заимствована из библиотеки)."""
@@ -113,6 +120,9 @@ class BookInstance(models.Model):
                                  on_delete=models.SET_NULL,
                                  null=True, blank=True,
                                  verbose_name='абонент-пользователь')
+    # Отмечается пакетной обработкой просроченных выдач (команда process_overdue) вместе с отправкой напоминания;
+    # сбрасывается при выдаче и возврате копии (catalog/loans.py)
+    overdue = models.BooleanField(default=False, editable=False, verbose_name='просрочена')
 
     # Свойство которое можно вызвать из шаблонов, чтобы указать, просрочен ли конкретный экземпляр книги
     @property
@@ -138,11 +148,75 @@ class BookInstance(models.Model):
         # Определение разрешений:
         permissions = (('can_mark_returned', 'установить книгу как возвращенную'), )
 
+        # Составные индексы для частых фильтров: списки заимствований (status='в', borrower) с сортировкой
+        # по due_back, доступные копии (status='н') на главной странице, фильтры в админке.
+        # https://django.fun/docs/django/ru/4.0/ref/models/options/#indexes
+        indexes = [
+            models.Index(fields=['status', 'due_back'], name='catalog_bi_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back'], name='catalog_bi_borrower_status_idx'),
+        ]
+
     def __str__(self):
         """Строка для представления объекта модели (на сайте администратора и т.д.)."""
         return '{0} ({1})'.format(self.id, self.book.title)
 
 
+class BookAvailability(models.Model):
+    """Денормализованные счётчики копий книги по статусам (журнал доступности).
+
+    Поддерживается атомарными UPDATE при каждом изменении статуса копии (catalog/loans.py),
+    расхождения исправляет команда reconcile_availability.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True,
+                                related_name='availability', verbose_name='книга')
+    total = models.PositiveIntegerField(default=0, verbose_name='всего копий')
+    available = models.PositiveIntegerField(default=0, verbose_name='в наличии')
+    loaned = models.PositiveIntegerField(default=0, verbose_name='выдано')
+    reserved = models.PositiveIntegerField(default=0, verbose_name='зарезервировано')
+    maintenance = models.PositiveIntegerField(default=0, verbose_name='на обслуживании')
+
+    # Статус копии (BookInstance.LOAN_STATUS) -> поле счётчика
+    STATUS_FIELDS = {
+        'н': 'available',
+        'в': 'loaned',
+        'р': 'reserved',
+        'о': 'maintenance',
+    }
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'доступность книги'
+        verbose_name_plural = 'доступность книг'
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1} из {2}'.format(self.book_id, self.available, self.total)
+
+
+class Hold(models.Model):
+    """Запись очереди ожидания книги (FIFO по порядку записей, см. catalog/loans.py).
+
+    copy пусто - читатель ждёт копию; заполнено - копия зарезервирована за ним до copy.due_back.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='книга')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='читатель')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='в очереди с')
+    copy = models.OneToOneField(BookInstance, on_delete=models.SET_NULL, null=True, blank=True,
+                                verbose_name='зарезервированная копия')
+
+    class Meta:
+        """Передача метаданных модели"""
+        ordering = ['pk']
+        verbose_name = 'очередь на книгу'
+        verbose_name_plural = 'очереди на книги'
+        # Читатель стоит в очереди на книгу не больше одного раза
+        constraints = [models.UniqueConstraint(fields=['book', 'user'], name='catalog_hold_book_user_unique')]
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1}'.format(self.book_id, self.user_id)
+
+
 class Author(models.Model):
     """Модель, представляющая автора."""
     first_name = models.CharField(max_length=100, verbose_name='имя')
@@ -164,6 +238,12 @@ class Author(models.Model):
         # Имя во множественном числе для объекта:
         verbose_name_plural = 'авторы'
 
+        # Индекс под сортировку списка авторов (курсорный постраничный вывод) и поиск фамилии без учёта регистра
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='catalog_author_name_idx'),
+            models.Index(Upper('last_name'), name='catalog_author_lname_upper_idx'),
+        ]
+
     def get_absolute_url(self):
         """Возвращает URL для доступа к конкретному экземпляру автора."""
         return reverse('author-detail', args=[str(self.id)])
@@ -193,3 +273,88 @@ class Language(models.Model):
 
         # Имя во множественном числе для объекта:
         verbose_name_plural = 'языки'
+
+
+class BatchWatermark(models.Model):
+    """Отметка о последнем запуске пакетной обработки: следующий запуск просматривает только новые записи."""
+    name = models.CharField(max_length=100, primary_key=True, verbose_name='обработка')
+    value = models.DateField(verbose_name='обработано до')
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'отметка пакетной обработки'
+        verbose_name_plural = 'отметки пакетной обработки'
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1}'.format(self.name, self.value)
+
+
+# Сводки для обзора каталога (catalog/facets.py): количество книг по жанрам и языкам и книг и копий у авторов.
+# Поддерживаются сигналами при изменении книг, копий и жанров книг, полностью пересчитываются командой rebuild_facets.
+class GenreSummary(models.Model):
+    """Количество книг жанра."""
+    genre = models.OneToOneField(Genre, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='summary', verbose_name='жанр')
+    books = models.PositiveIntegerField(default=0, verbose_name='книг')
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'сводка жанра'
+        verbose_name_plural = 'сводки жанров'
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1}'.format(self.genre_id, self.books)
+
+
+class LanguageSummary(models.Model):
+    """Количество книг на языке."""
+    language = models.OneToOneField(Language, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='summary', verbose_name='язык')
+    books = models.PositiveIntegerField(default=0, verbose_name='книг')
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'сводка языка'
+        verbose_name_plural = 'сводки языков'
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1}'.format(self.language_id, self.books)
+
+
+class GenreLanguageSummary(models.Model):
+    """Количество книг жанра на языке: счётчики одного фильтра обзора при выбранном другом."""
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, verbose_name='жанр')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, verbose_name='язык')
+    books = models.PositiveIntegerField(default=0, verbose_name='книг')
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'сводка жанра и языка'
+        verbose_name_plural = 'сводки жанров и языков'
+        constraints = [models.UniqueConstraint(fields=['genre', 'language'], name='catalog_genrelang_unique')]
+        # Счётчики жанров при выбранном языке (счётчики языков при выбранном жанре - по уникальному индексу)
+        indexes = [models.Index(fields=['language', 'genre'], name='catalog_genrelang_lang_idx')]
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}/{1}: {2}'.format(self.genre_id, self.language_id, self.books)
+
+
+class AuthorSummary(models.Model):
+    """Количество книг автора и их копий."""
+    author = models.OneToOneField(Author, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='summary', verbose_name='автор')
+    books = models.PositiveIntegerField(default=0, verbose_name='книг')
+    copies = models.PositiveIntegerField(default=0, verbose_name='копий')
+
+    class Meta:
+        """Передача метаданных модели"""
+        verbose_name = 'сводка автора'
+        verbose_name_plural = 'сводки авторов'
+
+    def __str__(self):
+        """Строка для представления объекта модели (на сайте администратора и т.д.)."""
+        return '{0}: {1} / {2}'.format(self.author_id, self.books, self.copies)
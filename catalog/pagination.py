@@ -0,0 +1,282 @@
+from collections.abc import Sequence
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+"""
+Постраничный вывод по ключу (keyset/cursor pagination).
+
+Вместо OFFSET следующая страница выбирается условием "после последней записи текущей страницы"
+по полям сортировки, поэтому страница N стоит столько же, сколько первая, а общий COUNT(*) не нужен.
+
+Постраничный вывод Django (для сравнения):
+https://django.fun/docs/django/ru/4.0/topics/pagination/
+Криптографическая подпись (для непрозрачных токенов):
+https://django.fun/docs/django/ru/4.0/topics/signing/
+"""
+
+
+class InvalidCursor(Exception):
+    """Токен курсора повреждён или подделан."""
+
+
+class CursorPage(Sequence):
+    """Страница курсорного постраничного вывода (без номера страницы и общего количества)."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        # Заполняются set_page_urls(): ссылки с сохранением остальных параметров запроса
+        self.next_url = None
+        self.previous_url = None
+
+    def __repr__(self):
+        return '<CursorPage of {0} objects>'.format(len(self.object_list))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], forward=True)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], forward=False)
+
+
+class CursorPaginator:
+    """Курсорный постраничный вывод по упорядоченному набору полей.
+
+    ordering - имена полей модели (с '-' для убывания), последним должно идти уникальное поле (pk),
+    чтобы порядок был полным. NULL считается наименьшим значением при любом направлении сортировки.
+    """
+
+    salt = 'catalog.pagination'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        opts = queryset.model._meta
+        self.ordering = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            self.ordering.append((field, descending))
+
+    def _order_by(self, reverse=False):
+        expressions = []
+        for field, descending in self.ordering:
+            if descending != reverse:
+                expressions.append(F(field.attname).desc(nulls_last=True) if field.null else F(field.attname).desc())
+            else:
+                expressions.append(F(field.attname).asc(nulls_first=True) if field.null else F(field.attname).asc())
+        return expressions
+
+    def _after(self, values, reverse=False):
+        """Условие "строго после values" в порядке сортировки (или в обратном порядке при reverse)."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, values):
+            if descending == reverse:
+                # По возрастанию: после значения идут большие, после NULL - все непустые
+                after = Q(**{field.attname + '__isnull': False}) if value is None \
+                    else Q(**{field.attname + '__gt': value})
+            else:
+                # По убыванию: после значения идут меньшие и NULL, после NULL - ничего
+                after = None if value is None \
+                    else Q(**{field.attname + '__lt': value}) | Q(**{field.attname + '__isnull': True})
+            if after is not None:
+                condition |= equal & after
+            equal &= Q(**{field.attname + '__isnull': True}) if value is None \
+                else Q(**{field.attname: value})
+        return condition
+
+    def _values(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.attname] for field, _ in self.ordering]
+        return [getattr(obj, field.attname) for field, _ in self.ordering]
+
+    def encode_cursor(self, obj, forward=True):
+        values = [None if value is None else str(value) for value in self._values(obj)]
+        return signing.dumps([values, forward], salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            values, forward = signing.loads(cursor, salt=self.salt)
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [None if value is None else field.to_python(value)
+                      for (field, _), value in zip(self.ordering, values)]
+        # ValidationError - подписанный курсор другого списка, значения которого не подходят к полям этого
+        except (signing.BadSignature, ValidationError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        return values, bool(forward)
+
+    def _page_queryset(self, cursor):
+        """Запрос страницы: (QuerySet на per_page + 1 строк, направление вперёд, был ли курсор)."""
+        if not cursor:
+            return self.queryset.order_by(*self._order_by())[:self.per_page + 1], True, False
+        values, forward = self.decode_cursor(cursor)
+        queryset = self.queryset.filter(self._after(values, reverse=not forward))
+        return queryset.order_by(*self._order_by(reverse=not forward))[:self.per_page + 1], forward, True
+
+    def page(self, cursor=None):
+        """Возвращает страницу после (или перед) позицией, закодированной в cursor."""
+        queryset, forward, has_cursor = self._page_queryset(cursor)
+        return self._page(list(queryset), forward, has_cursor)
+
+    async def apage(self, cursor=None):
+        """Асинхронный вариант page() для асинхронных представлений."""
+        queryset, forward, has_cursor = self._page_queryset(cursor)
+        return self._page([obj async for obj in queryset], forward, has_cursor)
+
+    def _page(self, object_list, forward, has_cursor):
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if forward:
+            return CursorPage(object_list, self, has_next=has_more, has_previous=has_cursor)
+        object_list.reverse()
+        return CursorPage(object_list, self, has_next=has_cursor, has_previous=has_more)
+
+
+class CursorPaginationMixin:
+    """Курсорный постраничный вывод для generic.ListView (подключается явно, вместо Paginator).
+
+    Порядок берётся из cursor_ordering, а по умолчанию - из Meta.ordering модели с добавлением pk.
+    """
+
+    cursor_ordering = None
+    cursor_query_param = 'cursor'
+
+    def get_cursor_ordering(self):
+        if self.cursor_ordering is not None:
+            return self.cursor_ordering
+        return list(self.model._meta.ordering) + ['pk']
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise Http404('Неверная позиция страницы.')
+        set_page_urls(self.request, page, self.cursor_query_param)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+def cursor_url(request, cursor, query_param='cursor'):
+    """URL текущей страницы с заменённым курсором (остальные параметры запроса сохраняются)."""
+    params = request.GET.copy()
+    params.pop(query_param, None)
+    if cursor is not None:
+        params[query_param] = cursor
+    query = params.urlencode()
+    return '{0}?{1}'.format(request.path, query) if query else request.path
+
+
+def set_page_urls(request, page, query_param='cursor'):
+    page.next_url = cursor_url(request, page.next_cursor, query_param)
+    page.previous_url = cursor_url(request, page.previous_cursor, query_param)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator с приблизительным количеством записей для больших таблиц без фильтров (сайт администратора).
+
+    Точный COUNT(*) по всей таблице в SQLite и PostgreSQL - полный просмотр. Для запроса без условий количество
+    берётся из статистики базы данных (sqlite_stat1 после ANALYZE, pg_class.reltuples), если оно больше
+    estimate_threshold; при фильтрах, без статистики и для небольших таблиц считается точно.
+    Статистика обновляется только командой ANALYZE и может отставать от таблицы, поэтому номер страницы
+    за оценкой не отклоняется, а количество уточняется по прочитанным строкам (см. page()).
+    """
+
+    estimate_threshold = 10000
+
+    @cached_property
+    def estimate(self):
+        """Количество из статистики (может быть устаревшим) или None, если считается точно."""
+        estimate = self.estimated_count()
+        return estimate if estimate is not None and estimate > self.estimate_threshold else None
+
+    @cached_property
+    def count(self):
+        return super().count if self.estimate is None else self.estimate
+
+    def validate_number(self, number):
+        if self.estimate is None:
+            return super().validate_number(number)
+        # Оценка может быть занижена (статистика устарела): верхняя граница проверяется выборкой в page()
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        """Страница по номеру; при оценке количество уточняется по прочитанным строкам.
+
+        Читается на одну строку больше страницы: если она есть, количество - не меньше прочитанного
+        (все страницы за устаревшей оценкой доступны), если нет - это последняя страница и количество точное.
+        """
+        if self.estimate is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        if len(object_list) > self.per_page:
+            count = max(self.count, bottom + len(object_list))
+        else:
+            count = bottom + len(object_list)
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        return self._get_page(object_list[:self.per_page], number, self)
+
+    def estimated_count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or queryset.query.where or queryset.query.distinct:
+            return None
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Таблица sqlite_stat1 появляется после первого ANALYZE; ошибка запроса в SQLite не прерывает транзакцию
+                try:
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+                except DatabaseError:
+                    return None
+                # Первое число в stat - количество строк таблицы (или индекса)
+                counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                return max(counts) if counts else None
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                return int(row[0]) if row and row[0] >= 0 else None
+        return None
@@ -0,0 +1,98 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+"""
+Маршрутизация чтения каталога на реплики базы данных.
+
+Чтение моделей приложения catalog во время обработки запроса (см. catalog/middleware.py) уходит на одну
+из реплик CATALOG_READ_REPLICAS; запись, чтение внутри транзакции и всё вне запросов (команды управления,
+cron) - на основную базу (default). Запрос "прикрепляется" к основной базе, если:
+    - это не GET/HEAD или в течение CATALOG_REPLICA_LAG секунд после записи этого же клиента (cookie);
+    - код выполняется внутри pin_to_primary() - например, сервис выдачи (catalog/loans.py)
+      или страница, данные которой изменились не дольше CATALOG_REPLICA_LAG секунд назад (catalog/caching.py).
+
+Несколько баз данных и маршрутизаторы:
+https://django.fun/docs/django/ru/4.0/topics/db/multi-db/
+"""
+
+# Модели приложения, которые всегда читаются из основной базы
+PRIMARY_ONLY = {'batchwatermark'}
+# Приложения, запись в которые не прикрепляет клиента к основной базе (django_cache - таблица DatabaseCache)
+NOT_DATA = {'django_cache'}
+
+_pinned = ContextVar('catalog_pinned_to_primary', default=False)
+_request = ContextVar('catalog_request_state', default=None)
+
+
+class RequestState:
+    """Состояние текущего запроса: была ли в нём запись в базу данных."""
+
+    def __init__(self):
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'CATALOG_READ_REPLICAS', [])
+
+
+def replica_lag():
+    """Допустимое отставание реплик, секунды."""
+    return getattr(settings, 'CATALOG_REPLICA_LAG', 5)
+
+
+@contextmanager
+def pin_to_primary(enabled=True):
+    """Всё чтение внутри блока выполняется из основной базы."""
+    token = _pinned.set(True) if enabled else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _pinned.reset(token)
+
+
+@contextmanager
+def request_scope(pinned=False):
+    """Границы запроса для маршрутизатора (используется PrimaryPinMiddleware); возвращает RequestState."""
+    state = RequestState()
+    token = _request.set(state)
+    try:
+        with pin_to_primary(pinned):
+            yield state
+    finally:
+        _request.reset(token)
+
+
+class CatalogReplicaRouter:
+    """Маршрутизатор: чтение каталога - с реплик, всё остальное - с основной базы."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'catalog':
+            return None
+        if (_request.get() is None or _pinned.get() or not replicas()
+                or model._meta.model_name in PRIMARY_ONLY or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        # Запись в таблицу кэша (DatabaseCache) не меняет данных, которые клиент мог бы не увидеть на реплике
+        if state is not None and model._meta.app_label not in NOT_DATA:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными основной базы (см. команду sync_replica)
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,181 @@
+import re
+from collections.abc import Sequence
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+"""
+Полнотекстовый поиск по книгам на основе виртуальной таблицы SQLite FTS5.
+
+Таблица catalog_book_fts (rowid = Book.id) хранит заголовок, краткое изложение, ISBN, имя автора и названия
+жанров, с индексом префиксов 3-6 символов для поиска основ слов (миграция 0012). Индекс поддерживается
+сигналами (catalog/signals.py) и полностью перестраивается командой
+    python manage.py rebuild_search_index
+
+FTS5:
+https://www.sqlite.org/fts5.html
+Выполнение необработанных SQL-запросов:
+https://django.fun/docs/django/ru/4.0/topics/db/sql/#executing-custom-sql-directly
+"""
+
+FTS_TABLE = 'catalog_book_fts'
+
+# Веса столбцов для ранжирования bm25: title, summary, isbn, author, genres
+RANK_WEIGHTS = (10.0, 1.0, 5.0, 4.0, 2.0)
+
+CHUNK_SIZE = 500
+
+# Сколько совпадений считается и показывается: количество выводится как "1000+", а страницы дальше не открываются.
+# Ранжируются при этом все совпадения (bm25 и выбор лучших LIMIT строк без полной сортировки), поэтому
+# самые релевантные книги попадают на первые страницы независимо от того, когда они добавлены.
+# Цена - bm25 для каждого совпадения: запрос из одного частого слова на миллионном каталоге занимает
+# сотни миллисекунд (benchmarks/baselines); ускорять такие запросы стоит кэшем страниц, а не усечением выборки.
+MAX_RESULTS = 1000
+
+# Окончания русских слов (самые длинные - первыми). Простейшая замена морфологии:
+# от слова отрезается окончание, а основа ищется как префикс ("мастера" -> "мастер*").
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое',
+    'ее', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ие', 'ые', 'ия', 'ью', 'а', 'я', 'о',
+    'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+
+
+def is_available(using=None):
+    """FTS5 доступен только на SQLite; на других СУБД поиск идёт через icontains."""
+    return (using or connection).vendor == 'sqlite'
+
+
+def stem(word):
+    """Отрезает окончание слова, оставляя основу не короче MIN_STEM символов."""
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match(query):
+    """Превращает пользовательский запрос в выражение MATCH: все слова обязательны, каждое - как префикс."""
+    terms = [stem(word) for word in re.findall(r'\w+', query.lower())]
+    return ' '.join('"{0}"*'.format(term) for term in terms if term)
+
+
+def _book_rows(book_ids):
+    """Строки для индекса: (id, title, summary, isbn, автор, жанры)."""
+    through = Book.genre.through
+    genres = {}
+    for book_id, name in through.objects.filter(book_id__in=book_ids).values_list('book_id', 'genre__name'):
+        genres.setdefault(book_id, []).append(name)
+
+    books = Book.objects.filter(pk__in=book_ids).values_list(
+        'pk', 'title', 'summary', 'isbn', 'author__first_name', 'author__last_name')
+    for pk, title, summary, isbn, first_name, last_name in books:
+        author = ' '.join(name for name in (first_name, last_name) if name)
+        yield pk, title, summary, isbn, author, ' '.join(genres.get(pk, ()))
+
+
+def remove_books(book_ids):
+    """Удаляет книги из индекса."""
+    if not is_available():
+        return
+    book_ids = list(book_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), CHUNK_SIZE):
+            chunk = book_ids[start:start + CHUNK_SIZE]
+            cursor.execute('DELETE FROM {0} WHERE rowid IN ({1})'.format(FTS_TABLE, ', '.join(['%s'] * len(chunk))),
+                           chunk)
+
+
+def index_books(book_ids):
+    """Добавляет или обновляет книги в индексе (частями по CHUNK_SIZE)."""
+    if not is_available():
+        return
+    book_ids = list(book_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), CHUNK_SIZE):
+            chunk = book_ids[start:start + CHUNK_SIZE]
+            remove_books(chunk)
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, title, summary, isbn, author, genres) VALUES (%s, %s, %s, %s, %s, %s)'
+                .format(FTS_TABLE), list(_book_rows(chunk)))
+
+
+def rebuild():
+    """Полностью перестраивает индекс; возвращает количество проиндексированных книг."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0}'.format(FTS_TABLE))
+    total = 0
+    last_pk = 0
+    while True:
+        chunk = list(Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        index_books(chunk)
+        total += len(chunk)
+        last_pk = chunk[-1]
+    with connection.cursor() as cursor:
+        # Слияние сегментов индекса после массовой вставки
+        cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(FTS_TABLE))
+    return total
+
+
+class SearchResults(Sequence):
+    """Ленивый ранжированный результат поиска для Paginator: считает и загружает только запрошенный срез.
+
+    Учитываются не больше MAX_RESULTS совпадений; truncated - совпадений больше.
+    """
+
+    def __init__(self, match):
+        self.match = match
+        self._count = None
+        self.truncated = False
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM (SELECT 1 FROM {0} WHERE {0} MATCH %s LIMIT %s)'.format(FTS_TABLE),
+                               [self.match, MAX_RESULTS + 1])
+                count = cursor.fetchone()[0]
+            self.truncated = count > MAX_RESULTS
+            self._count = min(count, MAX_RESULTS)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = MAX_RESULTS if index.stop is None else min(index.stop, MAX_RESULTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, {1}), rowid DESC LIMIT %s OFFSET %s'.format(
+                    FTS_TABLE, ', '.join(str(weight) for weight in RANK_WEIGHTS)),
+                [self.match, max(stop - start, 0), start])
+            ids = [row[0] for row in cursor.fetchall()]
+        books = Book.objects.select_related('author').in_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+
+def search(query):
+    """Ищет книги по заголовку, изложению, ISBN, автору и жанрам; результат упорядочен по релевантности."""
+    if not is_available():
+        words = re.findall(r'\w+', query)
+        condition = Q()
+        for word in words:
+            condition &= (Q(title__icontains=word) | Q(summary__icontains=word) | Q(isbn__icontains=word)
+                          | Q(author__last_name__icontains=word) | Q(genre__name__icontains=word))
+        if not words:
+            return Book.objects.none()
+        return Book.objects.filter(condition).select_related('author').distinct().order_by('title', 'pk')
+
+    match = build_match(query)
+    if not match:
+        return []
+    return SearchResults(match)
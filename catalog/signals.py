@@ -0,0 +1,257 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver, Signal
+
+from . import facets, loans, search
+from .caching import invalidate_tags, book_tag, author_tag
+from .models import Author, Genre, Language, Book, BookInstance
+from .stats import CatalogStats
+
+"""
+Сигналы:
+https://django.fun/docs/django/ru/4.0/topics/signals/
+https://django.fun/docs/django/ru/4.0/ref/signals/#module-django.db.models.signals
+"""
+
+# Массовые операции (bulk_create, update) не отправляют сигналы моделей. Код, который меняет книги и их копии
+# массово, отправляет этот сигнал с аргументом book_ids внутри своей транзакции. Необязательный аргумент
+# previous - состояние книг до изменения (facets.snapshot()): с ним сводки обзора меняются на разницу,
+# без него - пересчитываются для всех жанров, языков и авторов книг.
+books_bulk_changed = Signal()
+
+
+# Любое изменение книг, копий, авторов и жанров делает счётчики главной страницы устаревшими. Кэш сбрасывается
+# после фиксации транзакции: иначе запрос, пришедший до неё, закэширует прежние счётчики на весь timeout.
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookInstance)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BookInstance)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def invalidate_catalog_stats(sender, **kwargs):
+    transaction.on_commit(CatalogStats.invalidate)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_catalog_stats_on_genre_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(CatalogStats.invalidate)
+
+
+# Полнотекстовый индекс: книга индексируется вместе с именем автора и названиями жанров,
+# поэтому изменение автора или жанра переиндексирует все их книги
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, created, **kwargs):
+    if not created:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Genre)
+def index_genre_books(sender, instance, created, **kwargs):
+    if not created:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+# При удалении автора (SET_NULL) и жанра (каскадное удаление связей) сигналы для книг не отправляются:
+# запоминаем книги до удаления и переиндексируем после
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_books_before_delete(sender, instance, **kwargs):
+    instance._book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_books_after_delete(sender, instance, **kwargs):
+    search.index_books(getattr(instance, '_book_ids', ()))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_books_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # genre.book_set.clear(): список книг известен только до очистки
+        instance._book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            search.index_books([instance.pk])
+        elif action == 'post_clear':
+            search.index_books(getattr(instance, '_book_ids', ()))
+        else:
+            search.index_books(pk_set)
+
+
+@receiver(books_bulk_changed)
+def books_bulk_changed_handler(sender, book_ids, previous=None, **kwargs):
+    search.index_books(book_ids)
+    loans.refresh(book_ids)
+    if previous is None:
+        facets.refresh(**facets.book_keys(book_ids))
+    else:
+        facets.apply_changes(previous, facets.snapshot(book_ids))
+    transaction.on_commit(CatalogStats.invalidate)
+    author_ids = Book.objects.filter(pk__in=book_ids).values_list('author_id', flat=True).distinct()
+    invalidate_tags('books', 'authors', 'availability', 'book-genres',
+                    *map(book_tag, book_ids), *map(author_tag, author_ids))
+
+
+# Кэш страниц (catalog/caching.py): изменение сбрасывает только метки зависящих от него страниц.
+# Прежние автор книги и книга копии запоминаются до сохранения, чтобы сбросить и страницу, с которой запись ушла.
+@receiver(pre_save, sender=Book)
+def remember_previous_book_state(sender, instance, **kwargs):
+    # Прежний язык нужен сводкам обзора каталога
+    instance._previous_author_id, instance._previous_language_id = None, None
+    if instance.pk is not None:
+        previous = Book.objects.filter(pk=instance.pk).values_list('author_id', 'language_id').first()
+        if previous is not None:
+            instance._previous_author_id, instance._previous_language_id = previous
+
+
+@receiver(pre_save, sender=BookInstance)
+def remember_previous_copy_state(sender, instance, **kwargs):
+    # Прежние книга и статус копии нужны и кэшу страниц, и журналу доступности
+    instance._previous_book_id, instance._previous_status = None, None
+    if not instance._state.adding:
+        previous = BookInstance.objects.filter(pk=instance.pk).values_list('book_id', 'status').first()
+        if previous is not None:
+            instance._previous_book_id, instance._previous_status = previous
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_pages(sender, instance, created=False, **kwargs):
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    # 'authors' - количество книг в списке авторов: меняется при добавлении, удалении и смене автора книги
+    authors_changed = created or kwargs['signal'] is post_delete or previous_author_id != instance.author_id
+    invalidate_tags('books', book_tag(instance.pk), authors_changed and 'authors',
+                    instance.author_id and author_tag(instance.author_id),
+                    previous_author_id and author_tag(previous_author_id))
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_bookinstance_pages(sender, instance, **kwargs):
+    # 'availability' - значки доступности в списке книг
+    book_ids = {instance.book_id, getattr(instance, '_previous_book_id', None)} - {None}
+    author_ids = Book.objects.filter(pk__in=book_ids).values_list('author_id', flat=True)
+    invalidate_tags('availability', *map(book_tag, book_ids), *(author_tag(pk) for pk in author_ids if pk))
+
+
+# Журнал доступности: изменение копии через save()/delete() (например, в админке) переносит её между
+# счётчиками книги. Операции catalog/loans.py обновляют журнал сами.
+@receiver(post_save, sender=BookInstance)
+def record_copy_saved(sender, instance, created, **kwargs):
+    previous_book_id = getattr(instance, '_previous_book_id', None)
+    previous_status = getattr(instance, '_previous_status', None)
+    if created or previous_book_id is None:
+        loans.record_status_change(instance.book_id, None, instance.status)
+    elif previous_book_id != instance.book_id:
+        loans.record_status_change(previous_book_id, previous_status, None)
+        loans.record_status_change(instance.book_id, None, instance.status)
+    elif previous_status != instance.status:
+        loans.record_status_change(instance.book_id, previous_status, instance.status)
+
+
+@receiver(post_delete, sender=BookInstance)
+def record_copy_deleted(sender, instance, **kwargs):
+    loans.record_status_change(instance.book_id, instance.status, None)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_pages(sender, instance, **kwargs):
+    # Имя автора выводится в списке книг и на страницах его книг
+    book_ids = getattr(instance, '_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+    invalidate_tags('authors', 'books', author_tag(instance.pk), *map(book_tag, book_ids))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre_pages(sender, **kwargs):
+    invalidate_tags('genres')
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def invalidate_language_pages(sender, **kwargs):
+    invalidate_tags('languages')
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_pages_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # 'book-genres' - жанры в списках книг API (catalog/api.py)
+        invalidate_tags('book-genres')
+        if not reverse:
+            invalidate_tags(book_tag(instance.pk))
+        elif action == 'post_clear':
+            invalidate_tags(*map(book_tag, getattr(instance, '_book_ids', ())))
+        else:
+            invalidate_tags(*map(book_tag, pk_set))
+
+
+# Сводки для обзора каталога (catalog/facets.py): каждое изменение меняет счётчики на разницу. Состояние удаляемой
+# книги запоминается до удаления (связи с жанрами удаляются вместе с книгой без сигнала m2m_changed), удаляемые
+# связи с жанрами - до удаления (remove() получает и жанры, которых у книги нет; clear() - вовсе без списка).
+@receiver(post_save, sender=Book)
+def refresh_book_facets(sender, instance, created, **kwargs):
+    previous_language_id = getattr(instance, '_previous_language_id', None)
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if created:
+        # У новой книги ещё нет жанров и копий
+        facets.apply_changes({}, {instance.pk: (instance.language_id, instance.author_id, frozenset(), 0)})
+    elif (previous_language_id, previous_author_id) != (instance.language_id, instance.author_id):
+        after = facets.snapshot([instance.pk])
+        before = {pk: (previous_language_id, previous_author_id) + state[2:] for pk, state in after.items()}
+        facets.apply_changes(before, after)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_facets(sender, instance, **kwargs):
+    instance._facet_state = facets.snapshot([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def refresh_deleted_book_facets(sender, instance, **kwargs):
+    facets.apply_changes(getattr(instance, '_facet_state', {}), {})
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def refresh_genre_facets(sender, instance, action, reverse, pk_set, **kwargs):
+    # Прямая сторона - book.genre.add(), обратная - genre.book_set.add(); связи - пары (книга, жанр)
+    if action in ('pre_remove', 'pre_clear'):
+        links = Book.genre.through.objects.filter(**{'genre_id' if reverse else 'book_id': instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{('book_id' if reverse else 'genre_id') + '__in': pk_set})
+        instance._facet_links = list(links.values_list('book_id', 'genre_id'))
+    elif action == 'post_add':
+        facets.genres_changed([(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set], added=True)
+    elif action in ('post_remove', 'post_clear'):
+        facets.genres_changed(getattr(instance, '_facet_links', ()), added=False)
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def refresh_copy_facets(sender, instance, created=False, **kwargs):
+    # Количество копий автора меняется при добавлении, удалении и переносе копии к другой книге, но не при выдаче
+    if kwargs['signal'] is post_delete:
+        facets.copies_changed({instance.book_id: -1})
+    elif created:
+        facets.copies_changed({instance.book_id: 1})
+    else:
+        previous_book_id = getattr(instance, '_previous_book_id', None)
+        if previous_book_id is not None and previous_book_id != instance.book_id:
+            facets.copies_changed({previous_book_id: -1, instance.book_id: 1})
@@ -0,0 +1,84 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+from . import routers
+from .models import Author, Genre, Book, BookInstance
+
+"""
+Фреймворк кэширования Django:
+https://django.fun/docs/django/ru/4.0/topics/cache/#the-low-level-cache-api
+"""
+
+
+class CatalogStats:
+    """Счётчики главной страницы: считаются одним запросом и хранятся в кэше."""
+
+    cache_key = 'catalog:stats'
+    # Метка "счётчики недавно изменились": пока она есть, счётчики считаются по основной базе, а не по реплике
+    changed_key = 'catalog:stats:changed'
+
+    # Страховочное время жизни на случай изменений в обход сигналов (update(), raw SQL)
+    timeout = getattr(settings, 'CATALOG_STATS_TIMEOUT', 60 * 60)
+
+    # Слова для подсчёта жанров и книг на главной странице
+    genre_word = 'Роман'
+    book_word = 'Мастер'
+
+    @classmethod
+    def querysets(cls):
+        """Наборы записей для каждого счётчика (имя контекста -> QuerySet)."""
+        return {
+            'num_books': Book.objects.all(),
+            'num_instances': BookInstance.objects.all(),
+            'num_instances_available': BookInstance.objects.filter(status__exact='н'),
+            'num_authors': Author.objects.all(),
+            'num_genres_word': Genre.objects.filter(name__icontains=cls.genre_word),
+            'num_books_word': Book.objects.filter(title__icontains=cls.book_word),
+        }
+
+    @classmethod
+    def compute(cls, using=None):
+        """Вычисляет все счётчики за одно обращение к базе данных (по умолчанию - к базе для чтения каталога).
+
+        Каждый QuerySet становится скалярным подзапросом COUNT(*) в одном SELECT.
+        """
+        using = using or router.db_for_read(Book)
+        names, columns, params = [], [], []
+        for name, queryset in cls.querysets().items():
+            sql, query_params = queryset.order_by().values('pk').query.sql_with_params()
+            names.append(name)
+            columns.append('(SELECT COUNT(*) FROM ({0}) subquery)'.format(sql))
+            params.extend(query_params)
+
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT {0}'.format(', '.join(columns)), params)
+            row = cursor.fetchone()
+        return dict(zip(names, row))
+
+    @classmethod
+    def get(cls):
+        """Возвращает счётчики из кэша, при отсутствии - вычисляет и сохраняет."""
+        stats = cache.get(cls.cache_key)
+        if stats is None:
+            stats = cls.compute(DEFAULT_DB_ALIAS if cache.get(cls.changed_key) else None)
+            cache.set(cls.cache_key, stats, cls.timeout)
+        return stats
+
+    @classmethod
+    async def aget(cls):
+        """Асинхронный вариант get(): при отсутствии в кэше все счётчики считаются тем же одним запросом."""
+        stats = await cache.aget(cls.cache_key)
+        if stats is None:
+            using = DEFAULT_DB_ALIAS if await cache.aget(cls.changed_key) else None
+            stats = await sync_to_async(cls.compute)(using)
+            await cache.aset(cls.cache_key, stats, cls.timeout)
+        return stats
+
+    @classmethod
+    def invalidate(cls):
+        """Сбрасывает кэш: следующий запрос пересчитает счётчики."""
+        cache.delete(cls.cache_key)
+        if routers.replicas():
+            cache.set(cls.changed_key, True, routers.replica_lag())
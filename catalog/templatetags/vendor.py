@@ -0,0 +1,19 @@
+from django import template
+
+from catalog import vendor
+
+"""
+Адреса сторонних библиотек интерфейса (catalog/vendor.py):
+    {% load vendor %}
+    <link rel="stylesheet" href="{% vendor_url 'bootstrap.css' %}">
+
+Собственные теги шаблонов:
+https://django.fun/docs/django/ru/4.0/howto/custom-template-tags/
+"""
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_url(name):
+    return vendor.asset_url(name)
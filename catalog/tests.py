@@ -1,3 +1,978 @@
-from django.test import TestCase
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.db.models import F
+from django.templatetags.static import static
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import checks, facets, loans, metrics, routers, search, vendor, views
+from locallibrary.staticfiles import StaticFilesMiddleware
+
+from .caching import author_tag, book_tag, tag_versions
+from .middleware import PrimaryPinMiddleware, RequestMetricsMiddleware
+from .models import (Author, Genre, Language, Book, BookInstance, BookAvailability, BatchWatermark, Hold,
+                     GenreSummary, LanguageSummary, GenreLanguageSummary, AuthorSummary)
+from .pagination import CursorPaginator, EstimatedCountPaginator
+from .stats import CatalogStats
 
 # Create your tests here.
+
+"""
+Тестирование в Django:
+https://django.fun/docs/django/ru/4.0/topics/testing/overview/
+https://django.fun/docs/django/ru/4.0/topics/testing/tools/#django.test.TransactionTestCase.assertNumQueries
+"""
+
+
+class QueryBudgetMixin:
+    """Проверка "бюджета" SQL-запросов представления.
+
+    Бюджет не должен зависеть от количества связанных записей: представление запрашивается
+    дважды - до и после добавления связанных данных (grow), и оба раза должно уложиться
+    ровно в budget запросов. Так изменение шаблона не вернёт незаметно проблему N+1.
+    Кэш очищается перед каждым запросом: измеряется отрисовка страницы, а не ответ из кэша.
+    """
+
+    def assertQueryBudget(self, url, budget, grow=None):
+        cache.clear()
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if grow is not None:
+            grow()
+            cache.clear()
+            with self.assertNumQueries(budget):
+                self.client.get(url)
+        return response
+
+
+class CatalogDataMixin:
+    """Минимальный набор данных каталога для тестов представлений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Михаил', last_name='Булгаков')
+        cls.language = Language.objects.create(name='Русский')
+        cls.genre = Genre.objects.create(name='Роман')
+        cls.book = cls.create_book('Мастер и Маргарита', '9785170000001')
+
+    @classmethod
+    def create_book(cls, title, isbn, copies=2):
+        book = Book.objects.create(title=title, summary='Краткое изложение', isbn=isbn,
+                                   author=cls.author, language=cls.language)
+        book.genre.add(cls.genre)
+        for number in range(copies):
+            BookInstance.objects.create(book=book, imprint='Издание {0}'.format(number), status='н')
+        return book
+
+
+class BookDetailViewTest(QueryBudgetMixin, CatalogDataMixin, TestCase):
+
+    def test_query_budget(self):
+        def grow():
+            genre = Genre.objects.create(name='Мистика')
+            self.book.genre.add(genre)
+            for number in range(5):
+                BookInstance.objects.create(book=self.book, imprint='Доп. {0}'.format(number), status='в')
+
+        # Книга с автором, языком и доступностью, жанры, первые копии
+        self.assertQueryBudget(reverse('book-detail', args=[self.book.pk]), 3, grow=grow)
+
+    def test_copies_limited(self):
+        for number in range(3):
+            BookInstance.objects.create(book=self.book, imprint='Доп. {0}'.format(number), status='н')
+        cache.clear()
+        with mock.patch.object(views.BookDetailView, 'copies_limit', 2):
+            response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertEqual(len(response.context['copies']), 2)
+        self.assertContains(response, 'Показаны первые 2 из 5 копий.')
+
+
+class AuthorDetailViewTest(QueryBudgetMixin, CatalogDataMixin, TestCase):
+
+    def test_query_budget(self):
+        def grow():
+            for number in range(5):
+                self.create_book('Книга {0}'.format(number), '978517000010{0}'.format(number))
+
+        # Автор, книги автора с количеством копий
+        response = self.assertQueryBudget(reverse('author-detail', args=[self.author.pk]), 2, grow=grow)
+        self.assertContains(response, 'Мастер и Маргарита</a> (2)')
+
+
+class IndexViewTest(CatalogDataMixin, TestCase):
+
+    def test_visits_without_db_writes(self):
+        user = User.objects.create_user('reader', password='reader')
+        self.client.force_login(user)
+        for num_visits in range(3):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], num_visits)
+            # Счётчик посещений - в подписанном cookie: ни сессия, ни что-либо другое не записывается
+            writes = [query['sql'] for query in queries.captured_queries
+                      if not query['sql'].lstrip().upper().startswith('SELECT')]
+            self.assertEqual(writes, [])
+
+    def test_stats_single_query_and_invalidation(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            stats = CatalogStats.get()
+        self.assertEqual((stats['num_books'], stats['num_instances'], stats['num_books_word']), (1, 2, 1))
+        with self.assertNumQueries(0):
+            CatalogStats.get()
+
+        # До фиксации транзакции в кэше остаются прежние счётчики, после - сбрасываются
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_book('Белая гвардия', '9785170000002')
+            self.assertEqual(CatalogStats.get()['num_books'], 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(CatalogStats.get()['num_books'], 2)
+
+    def test_tampered_cookie(self):
+        self.client.cookies['num_visits'] = '100'
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 0)
+
+
+class SearchTest(CatalogDataMixin, TestCase):
+
+    def titles(self, query):
+        return [book.title for book in search.search(query)[:10]]
+
+    def test_signals_keep_index(self):
+        book = self.create_book('Белая гвардия', '9785170000002')
+        self.assertEqual(self.titles('гвардии'), ['Белая гвардия'])
+        # Книга находится по имени автора и названию жанра; переименование переиндексирует книги
+        self.author.last_name = 'Толстой'
+        self.author.save()
+        self.assertEqual(len(self.titles('толстой')), 2)
+        self.book.genre.add(Genre.objects.create(name='Мистика'))
+        self.assertEqual(self.titles('мистика'), ['Мастер и Маргарита'])
+        BookInstance.objects.filter(book=book).delete()
+        book.delete()
+        self.assertEqual(self.titles('гвардия'), [])
+
+    def test_rebuild_command_and_capped_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {0}'.format(search.FTS_TABLE))
+        self.assertEqual(self.titles('маргарита'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.titles('маргарита'), ['Мастер и Маргарита'])
+
+        self.create_book('Мастер-класс', '9785170000002')
+        with mock.patch.object(search, 'MAX_RESULTS', 1):
+            response = self.client.get(reverse('search'), {'q': 'мастер'})
+        self.assertContains(response, 'Найдено книг: 1+')
+        self.assertEqual(len(response.context['book_list']), 1)
+
+    def test_ranks_all_matches(self):
+        # Более новые книги со словом только в изложении не вытесняют более старую книгу с ним в заголовке
+        for number in range(3):
+            Book.objects.create(title='Книга {0}'.format(number), summary='О мастерах и подмастерьях',
+                                isbn='978517000010{0}'.format(number), author=self.author)
+        with mock.patch.object(search, 'MAX_RESULTS', 1):
+            self.assertEqual(self.titles('мастер'), ['Мастер и Маргарита'])
+        self.assertEqual(self.titles('мастер')[0], 'Мастер и Маргарита')
+
+
+class CursorPaginationTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def pages(self, url):
+        """Списки pk страниц при переходе по ссылкам "далее" от первой страницы, затем "назад" от последней."""
+        forward, backward = [], []
+        while True:
+            page = self.client.get(url).context['page_obj']
+            forward.append([obj.pk for obj in page])
+            if not page.has_next():
+                break
+            url = page.next_url
+        while True:
+            page = self.client.get(url).context['page_obj']
+            backward.insert(0, [obj.pk for obj in page])
+            if not page.has_previous():
+                break
+            url = page.previous_url
+        return forward, backward
+
+    def test_forward_and_back(self):
+        for number in range(6):
+            self.create_book('Книга {0}'.format(number), '97800000000{0:02d}'.format(number), copies=0)
+        # Страницы для анонимных посетителей кэшируются (CachedViewMixin) - нужен контекст каждой отрисовки
+        self.client.force_login(User.objects.create_user('reader'))
+        forward, backward = self.pages(reverse('books'))
+        self.assertEqual([len(page) for page in forward], [3, 3, 1])
+        self.assertEqual(sum(forward, []), list(Book.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(backward, forward)
+
+    def test_loan_lists_with_null_due_back(self):
+        self.create_book('Белая гвардия', '9785170000002', copies=5)
+        user = User.objects.create_user('reader', is_staff=True)
+        user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        today = datetime.date.today()
+        for number, copy in enumerate(BookInstance.objects.all()):
+            # Каждая третья выдача без срока возврата: NULL идут первыми
+            due_back = None if number % 3 == 0 else today + datetime.timedelta(days=number % 2)
+            BookInstance.objects.filter(pk=copy.pk).update(status='в', borrower=user, due_back=due_back)
+        expected = list(BookInstance.objects.order_by(F('due_back').asc(nulls_first=True), 'pk')
+                        .values_list('pk', flat=True))
+
+        self.client.force_login(user)
+        for name, view in (('my-borrowed', views.LoanedBooksByUserListView),
+                           ('all-borrowed', views.LoanedBooksByStaffListView)):
+            with self.subTest(name), mock.patch.object(view, 'paginate_by', 2):
+                forward, backward = self.pages(reverse(name))
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward)
+
+    def test_invalid_cursor(self):
+        url = reverse('authors')
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 404)
+        paginator = CursorPaginator(Author.objects.all(), 1, ['last_name', 'first_name', 'pk'])
+        cursor = paginator.encode_cursor(self.author)
+        self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 200)
+        self.assertEqual(self.client.get(url, {'cursor': cursor[:-1] + 'x'}).status_code, 404)
+        # Курсор с верной подписью, но чужими значениями (другой список с теми же полями сортировки)
+        for values in (['Булгаков'], ['Булгаков', 'Михаил', 'не число']):
+            cursor = signing.dumps([values, True], salt=CursorPaginator.salt, compress=True)
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+
+@override_settings(CATALOG_READ_REPLICAS=['replica'])
+class CatalogReplicaRouterTest(SimpleTestCase):
+    router = routers.CatalogReplicaRouter()
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_catalog_reads_in_request_use_replica(self):
+        with routers.request_scope():
+            self.assertEqual(self.router.db_for_read(Book), 'replica')
+            self.assertIsNone(self.router.db_for_read(User))
+            with routers.pin_to_primary():
+                self.assertEqual(self.router.db_for_read(BookInstance), 'default')
+
+    def test_write_pins_client_to_primary(self):
+        def write(request):
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+            self.router.db_for_write(BookInstance)
+            return HttpResponse()
+
+        response = PrimaryPinMiddleware(write)(RequestFactory().post('/'))
+        self.assertIn(PrimaryPinMiddleware.cookie_name, response.cookies)
+
+        def read(request):
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES[PrimaryPinMiddleware.cookie_name] = '1'
+        response = PrimaryPinMiddleware(read)(request)
+        self.assertNotIn(PrimaryPinMiddleware.cookie_name, response.cookies)
+
+    def test_cache_table_write_does_not_pin(self):
+        with routers.request_scope() as state:
+            self.router.db_for_write(DatabaseCache('catalog_cache', {}).cache_model_class)
+        self.assertFalse(state.wrote)
+
+    async def test_async_write_pins_client_to_primary(self):
+        async def write(request):
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+            self.router.db_for_write(BookInstance)
+            return HttpResponse()
+
+        middleware = PrimaryPinMiddleware(write)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().post('/'))
+        self.assertIn(PrimaryPinMiddleware.cookie_name, response.cookies)
+
+
+class AdminChangelistTest(QueryBudgetMixin, CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+
+    def test_book_changelist_budget(self):
+        def grow():
+            for number in range(5):
+                self.create_book('Книга {0}'.format(number), '978517000020{0}'.format(number))
+
+        # Сессия, пользователь, статистика таблицы и точное количество (таблица мала), книги с авторами, жанры
+        self.assertQueryBudget(reverse('admin:catalog_book_changelist'), 6, grow=grow)
+
+    def test_bookinstance_changelist_budget(self):
+        def grow():
+            borrower = User.objects.create_user('reader')
+            for number in range(5):
+                BookInstance.objects.create(book=self.create_book('Книга {0}'.format(number),
+                                                                  '978517000030{0}'.format(number)),
+                                            imprint='Доп.', status='в', borrower=borrower)
+
+        # Сессия, пользователь, статистика таблицы и точное количество, копии с книгами и читателями
+        self.assertQueryBudget(reverse('admin:catalog_bookinstance_changelist'), 5, grow=grow)
+
+
+class EstimatedCountPaginatorTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        for number in range(3):
+            self.create_book('Книга {0}'.format(number), '978517000040{0}'.format(number), copies=0)
+        # Статистика собрана при 4 книгах, после этого добавлено ещё 4
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for number in range(4):
+            self.create_book('Книга {0}'.format(number + 3), '978517000041{0}'.format(number), copies=0)
+        threshold = mock.patch.object(EstimatedCountPaginator, 'estimate_threshold', 0)
+        threshold.start()
+        self.addCleanup(threshold.stop)
+
+    def test_pages_past_stale_estimate(self):
+        paginator = EstimatedCountPaginator(Book.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 4)
+        books, number = [], 1
+        while True:
+            page = paginator.page(number)
+            books += page
+            if not page.has_next():
+                break
+            number += 1
+        self.assertEqual(books, list(Book.objects.order_by('pk')))
+        # На последней странице количество точное
+        self.assertEqual((paginator.count, paginator.num_pages, page.end_index()), (8, 4, 8))
+        with self.assertRaises(EmptyPage):
+            paginator.page(5)
+
+    def test_admin_changelist_past_stale_estimate(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        with mock.patch.object(admin.site._registry[Book], 'list_per_page', 2):
+            response = self.client.get(reverse('admin:catalog_book_changelist'), {'p': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+
+class AdminBookCopiesTest(QueryBudgetMixin, CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        self.reader = User.objects.create_user('reader')
+        # Типы содержимого кэшируются на весь процесс - прогреваем, чтобы бюджет не зависел от порядка тестов
+        ContentType.objects.get_for_models(Book, BookInstance)
+
+    def lend(self, count):
+        for number in range(count):
+            BookInstance.objects.create(book=self.book, imprint='Доп. {0}'.format(number), status='в',
+                                        borrower=self.reader, due_back=datetime.date(2020, 1, 1))
+
+    def test_change_view_budget(self):
+        # Вставка копий показывает не больше limit строк и не зависит от количества копий книги
+        self.lend(25)
+        self.assertQueryBudget(reverse('admin:catalog_book_change', args=[self.book.pk]), 11,
+                               grow=lambda: self.lend(10))
+
+    def test_bulk_actions(self):
+        self.lend(5)
+        selected = [str(pk) for pk in BookInstance.objects.filter(status='в').values_list('pk', flat=True)[:3]]
+        url = reverse('admin:catalog_bookinstance_changelist')
+
+        self.client.post(url, {'action': 'extend_due_back', '_selected_action': selected})
+        self.assertEqual(BookInstance.objects.filter(due_back=datetime.date(2020, 1, 15)).count(), 3)
+
+        self.client.post(url, {'action': 'mark_returned', '_selected_action': selected})
+        availability = BookAvailability.objects.get(book=self.book)
+        self.assertEqual((availability.total, availability.available, availability.loaned), (7, 5, 2))
+
+
+class ApiTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sparse_fields_and_cursor(self):
+        for number in range(3):
+            self.create_book('Книга {0}'.format(number), '978517000040{0}'.format(number))
+        url = reverse('api-list', args=['books'])
+        # Книги страницы и их жанры
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {'fields': 'title,genres', 'limit': 3}).json()
+        self.assertEqual(data['results'][0], {'title': 'Мастер и Маргарита', 'genres': [self.genre.pk]})
+        self.assertEqual(len(self.client.get(data['next']).json()['results']), 1)
+        self.assertEqual(self.client.get(url, {'fields': 'borrower'}).status_code, 400)
+
+    def test_not_modified(self):
+        url = reverse('api-detail', args=['books', self.book.pk])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class AvailabilityTest(CatalogDataMixin, TestCase):
+
+    def test_counts_in_request_order(self):
+        due_back = datetime.date.today() + datetime.timedelta(days=3)
+        BookInstance.objects.create(book=self.book, imprint='Издание 2', status='в', due_back=due_back)
+        BookInstance.objects.create(book=self.book, imprint='Издание 3', status='р')
+        # Одна порция ISBN - один запрос
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('availability'), ['0000000000000', '9785170000001', '0000000000000'],
+                                        content_type='application/json')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines, [
+            {'isbn': '0000000000000', 'found': False, 'available': 0, 'loaned': 0, 'reserved': 0,
+             'earliest_due_back': None},
+            {'isbn': '9785170000001', 'found': True, 'available': 2, 'loaned': 1, 'reserved': 1,
+             'earliest_due_back': due_back.isoformat()},
+        ])
+
+    def test_gzip(self):
+        response = self.client.get(reverse('availability'), {'isbn': '9785170000001', 'format': 'csv'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(content.splitlines()[1], '9785170000001,True,2,0,0,')
+        self.assertEqual(self.client.get(reverse('availability')).status_code, 400)
+
+    def test_reconcile_drifted_ledger(self):
+        other = self.create_book('Белая гвардия', '9785170000002')
+        BookAvailability.objects.filter(book=self.book).update(total=0, available=0)
+        # Уменьшение нулевого счётчика не нарушает CHECK (счётчик >= 0)
+        self.book.bookinstance_set.first().delete()
+        self.assertEqual(BookAvailability.objects.values_list('total', 'available').get(book=self.book), (0, 0))
+
+        tags = [book_tag(self.book.pk), author_tag(self.author.pk), book_tag(other.pk), 'availability']
+        before = tag_versions(tags)
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_availability', stdout=out)
+        self.assertIn('исправлено: 1', out.getvalue())
+        self.assertEqual(BookAvailability.objects.values_list('total', 'available').get(book=self.book), (1, 1))
+        # Страницы исправленной книги и её автора сброшены, страница другой книги - нет
+        after = tag_versions(tags)
+        self.assertEqual([before[tag] != after[tag] for tag in tags], [True, True, False, True])
+
+
+class RequestMetricsTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_server_timing_and_histograms(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        response = self.client.get(url)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, 0 duplicate", tpl;dur=')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        with override_settings(CATALOG_SLOW_REQUEST_MS=0), self.assertLogs('catalog.performance', 'WARNING'):
+            data = self.client.get(reverse('metrics')).json()
+        self.assertEqual(data['views']['book-detail']['total_ms']['count'], 1)
+        self.assertGreater(data['views']['book-detail']['render_ms']['count'], 0)
+
+    def test_duplicate_queries(self):
+        with metrics.request_scope() as current:
+            for _ in range(2):
+                Book.objects.get(pk=self.book.pk)
+        self.assertEqual((current.queries, current.duplicates), (2, 1))
+
+    async def test_async_view(self):
+        async def view(request):
+            self.assertIsNotNone(metrics._current.get())
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=0\.0;desc="0 queries, 0 duplicate"')
+
+    def test_middleware_runs_async_under_asgi(self):
+        # При DEBUG Django пишет в журнал django.request о каждом слое, вокруг которого пришлось переключать режим
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+
+class LoanEngineTest(CatalogDataMixin, TestCase):
+
+    def test_checkout_and_hold_queue(self):
+        first, second, third, fourth = (User.objects.create_user('reader{0}'.format(number)) for number in range(4))
+        copies = {loans.checkout_book(self.book, first).pk, loans.checkout_book(self.book, second).pk}
+        self.assertEqual(len(copies), 2)
+        with self.assertRaises(loans.LoanError):
+            loans.checkout_book(self.book, third)
+
+        # Копий нет: читатели встают в очередь, возвращённая копия резервируется за первым из них
+        self.assertIsNone(loans.reserve_book(self.book, third).copy)
+        self.assertIsNone(loans.reserve_book(self.book, fourth).copy)
+        returned = loans.return_book(BookInstance.objects.get(borrower=first))
+        self.assertEqual(Hold.objects.get(user=third).copy_id, returned.pk)
+        with self.assertRaises(loans.LoanError):
+            loans.checkout_book(self.book, fourth)
+        self.assertEqual(loans.checkout_book(self.book, third).pk, returned.pk)
+        self.assertFalse(Hold.objects.filter(user=third).exists())
+
+        # Резерв, который не забрали в срок, переходит дальше по очереди, а без очереди - в наличие
+        loans.return_book(BookInstance.objects.get(borrower=second))
+        self.assertEqual(loans.expire_holds(datetime.date.today() + datetime.timedelta(days=loans.HOLD_DAYS + 1)), 1)
+        self.assertFalse(Hold.objects.exists())
+        availability = BookAvailability.objects.get(book=self.book)
+        self.assertEqual((availability.available, availability.loaned, availability.reserved), (1, 1, 0))
+
+
+class ImportCatalogTest(CatalogDataMixin, TestCase):
+
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        return path
+
+    def test_csv_and_jsonl(self):
+        call_command('import_catalog', self.write('partner.csv', (
+            'isbn,title,author_first_name,author_last_name,language,genres,copies\n'
+            '9785170000002,Белая гвардия,Михаил,Булгаков,Русский,Роман;Драма,2\n'
+            '9785170000003,Война и мир,Лев,Толстой,Русский,Роман,1\n')), stdout=io.StringIO())
+        call_command('import_catalog', self.write('partner.jsonl', (
+            '{"isbn": "9785170000004", "title": "Собачье сердце", "author_first_name": "Михаил", '
+            '"author_last_name": "Булгаков", "genres": ["Повесть"], "copies": 3}\n'
+            '{"isbn": "9785170000003", "title": "Война и мир", "author_first_name": "Лев", '
+            '"author_last_name": "Толстой", "genres": "Роман;Эпопея", "copies": 5}\n')), stdout=io.StringIO())
+
+        # Существующий автор найден, новый создан один раз и с именем и фамилией на своих местах
+        self.assertEqual(sorted(Author.objects.values_list('last_name', 'first_name')),
+                         [('Булгаков', 'Михаил'), ('Толстой', 'Лев')])
+        self.assertEqual(Book.objects.filter(author=self.author).count(), 3)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(sorted(Genre.objects.values_list('name', flat=True)),
+                         ['Драма', 'Повесть', 'Роман', 'Эпопея'])
+        # Жанры обновлённой книги заменены, копии созданы только при первом импорте
+        tolstoy = Book.objects.get(isbn='9785170000003')
+        self.assertEqual(sorted(tolstoy.genre.values_list('name', flat=True)), ['Роман', 'Эпопея'])
+        self.assertEqual(tolstoy.bookinstance_set.count(), 1)
+        self.assertEqual(BookInstance.objects.count(), 2 + 2 + 1 + 3)
+        # Сводки обзора каталога изменены на разницу и совпадают с полным пересчётом
+        self.assertEqual(facets.rebuild(), 0)
+
+    def test_jsonl_field_types(self):
+        stderr = io.StringIO()
+        call_command('import_catalog', self.write('partner.jsonl', (
+            '{"isbn": 9785170000005, "title": "Театральный роман", "author_last_name": "Булгаков", '
+            '"author_first_name": "Михаил", "genres": ["Роман", 1920], "copies": "2"}\n'
+            '{"isbn": "9785170000006", "title": "Бег", "status": 1}\n'
+            '{"isbn": "9785170000007", "title": "Дни Турбиных", "genres": {"name": "Пьеса"}}\n'
+            '{"isbn": "9785170000008", "title": ["Зойкина квартира"]}\n'
+            '{"isbn": "9785170000009", "title": "Батум", "imprint": true}\n')),
+            stdout=io.StringIO(), stderr=stderr)
+
+        # Число в текстовом поле приводится к строке, значения других типов отклоняют только свою строку
+        book = Book.objects.get(isbn='9785170000005')
+        self.assertEqual(book.author, self.author)
+        self.assertEqual(sorted(book.genre.values_list('name', flat=True)), ['1920', 'Роман'])
+        self.assertEqual(book.bookinstance_set.count(), 2)
+        self.assertFalse(Book.objects.filter(isbn__in=['9785170000006', '9785170000007', '9785170000008',
+                                                       '9785170000009']).exists())
+        self.assertEqual([line.split(':')[0] for line in stderr.getvalue().splitlines()],
+                         ['Строка 2 пропущена', 'Строка 3 пропущена', 'Строка 4 пропущена', 'Строка 5 пропущена'])
+
+
+class ExportTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='password', is_staff=True)
+
+    def export(self, dataset, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('catalog-export', args=[dataset]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_staff_only(self):
+        url = reverse('catalog-export', args=['books'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('reader', password='password'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['users'])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 404)
+
+    def test_books_genres_merge_join(self):
+        drama = Genre.objects.create(name='Драма')
+        self.book.genre.add(drama)
+        without_genres = self.create_book('Белая гвардия', '9785170000002')
+        without_genres.genre.clear()
+        self.create_book('Собачье сердце', '9785170000003').genre.set([drama])
+
+        lines = self.export('books', format='jsonl').decode().splitlines()
+        rows = {row['isbn']: row for row in map(json.loads, lines)}
+        # Жанры каждой книги - только её собственные, книга без жанров не сдвигает соседей
+        self.assertEqual(sorted(rows['9785170000001']['genres'].split(';')), ['Драма', 'Роман'])
+        self.assertEqual(rows['9785170000002']['genres'], '')
+        self.assertEqual(rows['9785170000003']['genres'], 'Драма')
+        self.assertEqual(rows['9785170000003']['author_last_name'], 'Булгаков')
+
+    def test_csv_and_gzip(self):
+        content = self.export('books')
+        self.assertEqual(gzip.decompress(self.export('books', gzip='1')), content)
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0], 'isbn,title,summary,author_first_name,author_last_name,language,genres')
+        self.assertEqual(lines[1], '9785170000001,Мастер и Маргарита,Краткое изложение,Михаил,Булгаков,Русский,Роман')
+
+    def test_bookinstances_without_borrower(self):
+        copy = self.book.bookinstance_set.first()
+        copy.borrower = self.staff
+        copy.status = 'в'
+        copy.save()
+        rows = [json.loads(line) for line in self.export('bookinstances', format='jsonl').splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(set(rows[0]), {'id', 'isbn', 'imprint', 'status', 'due_back'})
+
+
+class ProcessOverdueTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        self.yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        self.first, self.second, self.third = (
+            User.objects.create_user('reader{0}'.format(number), email='reader{0}@example.com'.format(number))
+            for number in range(3))
+
+    def process_overdue(self):
+        call_command('process_overdue', stdout=io.StringIO())
+
+    def test_marks_overdue_and_expires_holds(self):
+        overdue = loans.checkout_book(self.book, self.first, due_back=self.yesterday)
+        loans.checkout_book(self.book, self.second)
+        loans.reserve_book(self.book, self.third)
+        reserved = loans.return_book(BookInstance.objects.get(borrower=self.second))
+        BookInstance.objects.filter(pk=reserved.pk).update(due_back=self.yesterday)
+
+        self.process_overdue()
+        self.assertTrue(BookInstance.objects.get(pk=overdue.pk).overdue)
+        self.assertEqual([message.to for message in mail.outbox], [['reader0@example.com']])
+        # Резерв, не забранный в срок, снят, и копия без очереди вернулась в наличие
+        self.assertFalse(Hold.objects.exists())
+        self.assertEqual(BookInstance.objects.get(pk=reserved.pk).status, 'н')
+
+    def test_second_run_skips_processed_loans(self):
+        loan = loans.checkout_book(self.book, self.first, due_back=self.yesterday)
+        self.process_overdue()
+        self.assertTrue(BookInstance.objects.get(pk=loan.pk).overdue)
+        self.assertEqual(BatchWatermark.objects.get(name='process_overdue').value, datetime.date.today())
+        self.assertEqual(len(mail.outbox), 1)
+
+        self.process_overdue()
+        self.assertEqual(len(mail.outbox), 1)
+        out = io.StringIO()
+        call_command('process_overdue', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Новых просроченных выдач: 0')
+
+    def test_scan_starts_at_watermark(self):
+        BatchWatermark.objects.create(name='process_overdue', value=self.yesterday)
+        # Срок наступил до отметки - выдача обработана предыдущим запуском
+        earlier = loans.checkout_book(self.book, self.first, due_back=self.yesterday - datetime.timedelta(days=2))
+        loan = loans.checkout_book(self.book, self.second, due_back=self.yesterday)
+
+        self.process_overdue()
+        self.assertFalse(BookInstance.objects.get(pk=earlier.pk).overdue)
+        self.assertTrue(BookInstance.objects.get(pk=loan.pk).overdue)
+        self.assertEqual([message.to for message in mail.outbox], [['reader1@example.com']])
+
+
+class PageCacheTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.bookinstance_set.first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_copy_save_evicts_its_book_and_author(self):
+        other_author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        other_book = self.create_book('Белая гвардия', '9785170000002')
+        other_authors_book = Book.objects.create(title='Война и мир', summary='Краткое изложение',
+                                                 isbn='9785170000003', author=other_author, language=self.language)
+        urls = {
+            'book': reverse('book-detail', args=[self.book.pk]),
+            'author': reverse('author-detail', args=[self.author.pk]),
+            'other_book': reverse('book-detail', args=[other_book.pk]),
+            'other_authors_book': reverse('book-detail', args=[other_authors_book.pk]),
+            'other_author': reverse('author-detail', args=[other_author.pk]),
+        }
+        for url in urls.values():
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookInstance.objects.filter(book=self.book).first().save()
+        # Страница из кэша не обращается к базе данных
+        for name, url in urls.items():
+            with self.subTest(name), CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertEqual(bool(queries), name in ('book', 'author'), name)
+
+
+class FragmentCacheTest(CatalogDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user('reader')
+        self.client.force_login(self.reader)
+
+    def test_book_row_follows_book_version(self):
+        url = reverse('books')
+        self.assertContains(self.client.get(url), 'Мастер и Маргарита')
+        self.book.title = 'Белая гвардия'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertContains(self.client.get(url), 'Белая гвардия')
+
+    def test_sidebar_per_user_and_permission(self):
+        url = reverse('authors')
+        self.assertNotContains(self.client.get(url), 'Все заимствованные')
+        librarian = User.objects.create_user('librarian')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.force_login(librarian)
+        response = self.client.get(url)
+        self.assertContains(response, 'Пользователь: librarian')
+        self.assertContains(response, 'Все заимствованные')
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Все заимствованные')
+
+
+class FacetSummaryTest(CatalogDataMixin, TestCase):
+
+    def assertSummaries(self):
+        # Сводки, поддержанные сигналами, совпадают с полным пересчётом
+        self.assertEqual(facets.rebuild(), 0)
+
+    def test_signals_keep_summaries(self):
+        english = Language.objects.create(name='Английский')
+        book = self.create_book('Белая гвардия', '9785170000002', copies=1)
+        self.assertEqual(GenreSummary.objects.get(genre=self.genre).books, 2)
+        self.assertEqual((self.author.summary.books, AuthorSummary.objects.get(author=self.author).copies), (2, 3))
+        self.assertSummaries()
+
+        book.language = english
+        book.save()
+        self.assertEqual(GenreLanguageSummary.objects.get(genre=self.genre, language=english).books, 1)
+        self.assertEqual(LanguageSummary.objects.get(language=self.language).books, 1)
+        book.genre.clear()
+        self.assertFalse(GenreLanguageSummary.objects.filter(language=english).exists())
+        self.assertSummaries()
+
+        BookInstance.objects.filter(book=book).delete()
+        book.delete()
+        self.assertEqual(AuthorSummary.objects.values_list('books', 'copies').get(author=self.author), (1, 2))
+        self.assertFalse(LanguageSummary.objects.filter(language=english).exists())
+        self.assertSummaries()
+
+    def test_book_edit_applies_deltas(self):
+        def summary_queries(book):
+            with CaptureQueriesContext(connection) as queries:
+                book.save()
+            tables = [model._meta.db_table for model in (GenreSummary, LanguageSummary, GenreLanguageSummary,
+                                                         AuthorSummary)]
+            return [query['sql'] for query in queries.captured_queries
+                    if any(table in query['sql'] for table in tables)]
+
+        # Правка названия сводок не касается, смена автора - только строк двух авторов, без подсчёта книг
+        self.book.title = 'Белая гвардия'
+        self.assertEqual(summary_queries(self.book), [])
+        self.book.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        queries = summary_queries(self.book)
+        self.assertTrue(queries)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(AuthorSummary.objects.values_list('books', 'copies').get(author=self.book.author), (1, 2))
+        self.assertFalse(AuthorSummary.objects.filter(author=self.author).exists())
+        self.assertSummaries()
+
+    def test_genre_and_copy_changes_apply_deltas(self):
+        other = Genre.objects.create(name='Мистика')
+        book = self.create_book('Белая гвардия', '9785170000002', copies=0)
+        other_author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        other_book = Book.objects.create(title='Война и мир', summary='Краткое изложение', isbn='9785170000003',
+                                         author=other_author, language=self.language)
+
+        def move_copy():
+            copy = BookInstance.objects.filter(book=self.book).first()
+            copy.book = other_book
+            copy.save()
+
+        changes = [
+            lambda: book.genre.add(other),
+            # Жанра 'Пьеса' у книги нет - его удаление счётчики не меняет
+            lambda: book.genre.remove(self.genre, Genre.objects.create(name='Пьеса')),
+            lambda: other.book_set.add(self.book, other_book),
+            lambda: other.book_set.remove(other_book),
+            lambda: BookInstance.objects.create(book=book, imprint='Доп.', status='н'),
+            move_copy,
+            lambda: BookInstance.objects.get(book=other_book).delete(),
+            lambda: book.genre.clear(),
+            lambda: other.book_set.clear(),
+        ]
+        for number, change in enumerate(changes):
+            # Счётчики меняются на разницу, без пересчёта всех книг жанра или копий автора
+            with mock.patch.object(facets, 'refresh', side_effect=AssertionError('полный пересчёт')):
+                change()
+            with self.subTest(number):
+                self.assertSummaries()
+        # Последняя копия автора удалена, но книга у него осталась - строка сводки на месте
+        self.assertEqual(AuthorSummary.objects.values_list('books', 'copies').get(author=other_author), (1, 0))
+
+    def test_author_list_follows_book_count(self):
+        cache.clear()
+        url = reverse('authors')
+        self.assertContains(self.client.get(url), 'книг: 1')
+        other = Author.objects.create(first_name='Лев', last_name='Толстой')
+        with self.captureOnCommitCallbacks(execute=True):
+            book = self.create_book('Белая гвардия', '9785170000002', copies=0)
+        self.assertContains(self.client.get(url), 'книг: 2')
+        book.author = other
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        self.assertContains(self.client.get(url), 'книг: 1', count=2)
+
+    def test_browse_follows_availability(self):
+        cache.clear()
+        url = reverse('browse')
+        self.assertContains(self.client.get(url), 'в наличии: 2 из 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            loans.checkout_book(self.book, User.objects.create_user('reader'))
+        self.assertContains(self.client.get(url), 'в наличии: 1 из 2')
+
+    def test_browse_counts(self):
+        english = Language.objects.create(name='Английский')
+        other = Genre.objects.create(name='Мистика')
+        book = self.create_book('Белая гвардия', '9785170000002')
+        book.genre.add(other)
+        Book.objects.filter(pk=book.pk).update(language=english)
+        facets.rebuild()
+
+        response = self.client.get(reverse('browse'), {'language': english.pk})
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual([(genre['name'], genre['books']) for genre in response.context['genres']],
+                         [('Мистика', 1), ('Роман', 1)])
+        self.assertEqual(list(response.context['book_list']), [book])
+
+        # Отбор книг жанра проверкой EXISTS (частый жанр) и соединением (редкий) даёт одну и ту же страницу
+        for page_size in (1, 10):
+            cache.clear()
+            with mock.patch.object(views.BrowseView, 'paginate_by', page_size):
+                response = self.client.get(reverse('browse'), {'genre': self.genre.pk})
+            self.assertEqual(list(response.context['book_list']), [self.book, book][:page_size])
+
+        with self.assertNumQueries(3):
+            # Счётчики жанров и языков и страница книг - независимо от количества книг
+            response = self.client.get(reverse('browse'), {'genre': self.genre.pk, 'language': english.pk})
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual([(language['name'], language['books']) for language in response.context['languages']],
+                         [('Английский', 1), ('Русский', 1)])
+
+
+class StaticFilesTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        storages = {'staticfiles': {'BACKEND': 'locallibrary.staticfiles.CompressedManifestStaticFilesStorage'}}
+        settings = override_settings(STATIC_ROOT=self.root, STORAGES=storages)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('view'))
+
+    def get(self, url, **headers):
+        return self.middleware(RequestFactory().get(url, **headers))
+
+    def test_hashed_file_compressed_and_cached(self):
+        url = static('admin/css/base.css')
+        self.assertNotEqual(url, '/static/admin/css/base.css')
+        response = self.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertLess(int(response['Content-Length']), len(body))
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unhashed_and_unknown_paths(self):
+        response = self.get('/static/admin/css/base.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.get('/static/missing.css').content, b'view')
+
+    async def test_async(self):
+        async def view(request):
+            return HttpResponse('view')
+
+        middleware = StaticFilesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get(static('admin/css/base.css')))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response.close()
+        self.assertEqual((await middleware(RequestFactory().get('/static/missing.css'))).content, b'view')
+
+
+class VendorTest(SimpleTestCase):
+
+    def test_local_urls_only(self):
+        for name, path in vendor.ASSETS.items():
+            self.assertEqual(vendor.asset_url(name), static(path))
+
+    def test_missing_files_fail_deploy_check(self):
+        with mock.patch.dict(vendor.ASSETS, {'jquery.js': 'catalog/vendor/missing/jquery.min.js'}, clear=True):
+            self.assertEqual([message.id for message in checks.check_vendor_files(None)], ['catalog.W001'])
+            self.assertEqual([message.id for message in checks.check_vendor_files_deploy(None)], ['catalog.E001'])
+        with mock.patch.dict(vendor.ASSETS, {'styles.css': 'catalog/css/styles.css'}, clear=True):
+            self.assertEqual(checks.check_vendor_files_deploy(None), [])
+
+
+class StartupTest(SimpleTestCase):
+
+    def test_production_settings_drop_dev_apps(self):
+        with mock.patch.dict(os.environ, DJANGO_SECRET_KEY='test'):
+            production = importlib.import_module('locallibrary.settings_production')
+        self.assertNotIn('django_extensions', production.INSTALLED_APPS)
+        self.assertIn('catalog.apps.CatalogConfig', production.INSTALLED_APPS)
+
+    def test_production_cache_shared_between_processes(self):
+        with mock.patch.dict(os.environ, DJANGO_SECRET_KEY='test'):
+            production = importlib.reload(importlib.import_module('locallibrary.settings_production'))
+        self.assertEqual(production.CACHES['default']['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        with mock.patch.dict(os.environ, DJANGO_SECRET_KEY='test', DJANGO_REDIS_URL='redis://cache:6379/1'):
+            production = importlib.reload(production)
+        self.assertEqual(production.CACHES['default']['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
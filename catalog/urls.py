@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, re_path
 from . import views
+from . import api
 
 """
 Совет W3C:
@@ -15,16 +17,49 @@ https://docs.python.org/3/library/re.html
 https://django.fun/docs/django/ru/4.0/topics/http/urls/#views-extra-options
 """
 
+# Под ASGI страницы каталога можно обслуживать асинхронными представлениями (см. catalog/async_views.py);
+# модуль импортируется только в этом случае, процессам WSGI он не нужен
+if getattr(settings, 'CATALOG_ASYNC_VIEWS', False):
+    from . import async_views
+
+    pages = {
+        'index': async_views.index,
+        'books': async_views.book_list,
+        'book-detail': async_views.book_detail,
+        'authors': async_views.author_list,
+        'author-detail': async_views.author_detail,
+        'my-borrowed': async_views.loaned_books_by_user,
+        'all-borrowed': async_views.loaned_books_by_staff,
+    }
+else:
+    pages = {
+        'index': views.index,
+        'books': views.BookListView.as_view(),
+        'book-detail': views.BookDetailView.as_view(),
+        'authors': views.AuthorListView.as_view(),
+        'author-detail': views.AuthorDetailView.as_view(),
+        'my-borrowed': views.LoanedBooksByUserListView.as_view(),
+        'all-borrowed': views.LoanedBooksByStaffListView.as_view(),
+    }
+
 urlpatterns = [
-    path('', views.index, name='index'),   # Главная/индексная страница
-    path('books/', views.BookListView.as_view(), name='books'),   # Список всех книг
+    path('', pages['index'], name='index'),   # Главная/индексная страница
+    path('books/', pages['books'], name='books'),   # Список всех книг
     # Детальная информация для определённой книги
     # path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
     # Детальная информация для определённой книги
-    re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
-    path('authors/', views.AuthorListView.as_view(), name='authors'),   # Список всех авторов
+    re_path(r'^book/(?P<pk>\d+)$', pages['book-detail'], name='book-detail'),
+    path('authors/', pages['authors'], name='authors'),   # Список всех авторов
     # Детальная информация для определённого автора
-    re_path(r'^author/(?P<pk>\d+)$', views.AuthorDetailView.as_view(), name='author-detail'),
-    re_path(r'^mybooks/$', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
-    re_path(r'^allbooks/$', views.LoanedBooksByStaffListView.as_view(), name='all-borrowed'),
+    re_path(r'^author/(?P<pk>\d+)$', pages['author-detail'], name='author-detail'),
+    re_path(r'^mybooks/$', pages['my-borrowed'], name='my-borrowed'),
+    re_path(r'^allbooks/$', pages['all-borrowed'], name='all-borrowed'),
+    path('search/', views.SearchView.as_view(), name='search'),   # Полнотекстовый поиск по книгам
+    path('browse/', views.BrowseView.as_view(), name='browse'),   # Обзор книг по жанрам и языкам
+    path('export/<str:dataset>/', views.export_catalog, name='catalog-export'),   # Выгрузка каталога (сотрудники)
+    path('availability/', views.book_availability, name='availability'),   # Доступность копий по списку ISBN
+    path('metrics/', views.request_metrics, name='metrics'),   # Показатели запросов (сотрудники)
+    # JSON API только для чтения (catalog/api.py)
+    path('api/<str:resource>/', api.ApiView.as_view(), name='api-list'),
+    path('api/<str:resource>/<str:pk>/', api.ApiView.as_view(), name='api-detail'),
 ]
@@ -0,0 +1,81 @@
+import os
+
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+"""
+Сторонние библиотеки интерфейса (Bootstrap 3, jQuery), хранящиеся в статических файлах приложения.
+
+Файлы загружаются командой
+    python manage.py vendor_static
+в catalog/static/catalog/vendor/ и добавляются в репозиторий; при сборке рабочего сервера команда выполняется
+перед collectstatic (загружает только недостающие файлы, см. locallibrary/settings_production.py), и дальше
+библиотеки собираются вместе с остальной статикой (хэшированные имена, сжатие - см. locallibrary/staticfiles.py).
+Запасного адреса на CDN нет: страницы не зависят от сторонних серверов. Если файлов нет, проверка
+catalog.E001 (manage.py check --deploy) завершается ошибкой, а при разработке выводится предупреждение catalog.W001.
+"""
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'catalog', 'vendor')
+
+# Имя в шаблоне -> путь статического файла
+ASSETS = {
+    'bootstrap.css': 'catalog/vendor/bootstrap-3.3.7/css/bootstrap.min.css',
+    'bootstrap.js': 'catalog/vendor/bootstrap-3.3.7/js/bootstrap.min.js',
+    'jquery.js': 'catalog/vendor/jquery-1.12.4/jquery.min.js',
+}
+
+# Источники загрузки: адрес -> каталог в VENDOR_DIR. Из архива Bootstrap берётся дистрибутив целиком:
+# CSS ссылается на шрифты (../fonts/) и карты исходников, а ManifestStaticFilesStorage проверяет эти ссылки.
+SOURCES = [
+    ('https://github.com/twbs/bootstrap/releases/download/v3.3.7/bootstrap-3.3.7-dist.zip', 'bootstrap-3.3.7'),
+    ('https://code.jquery.com/jquery-1.12.4.min.js', 'jquery-1.12.4/jquery.min.js'),
+]
+
+
+def asset_url(name):
+    """Адрес локальной копии библиотеки name."""
+    return static(ASSETS[name])
+
+
+def missing():
+    """Пути библиотек, которых нет в статических файлах."""
+    return [path for path in ASSETS.values() if not finders.find(path)]
+
+
+def download(url, timeout=60):
+    # urllib.request и zipfile нужны только команде vendor_static; модуль же загружается вместе с шаблонным тегом
+    # vendor_url при создании шаблонного движка, поэтому они импортируются здесь, а не при запуске процесса
+    import urllib.request
+
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def fetch(target_dir=VENDOR_DIR, force=False):
+    """Загружает SOURCES в target_dir (уже загруженные - только при force); возвращает список записанных файлов."""
+    import io
+    import zipfile
+
+    written = []
+    for url, destination in SOURCES:
+        if not force and os.path.exists(os.path.join(target_dir, destination)):
+            continue
+        data = download(url)
+        if url.endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    # Первый каталог архива (bootstrap-3.3.7-dist/) заменяется на destination
+                    relative = member.filename.split('/', 1)[-1]
+                    if member.is_dir() or not relative:
+                        continue
+                    written.append(_write(os.path.join(target_dir, destination, relative), archive.read(member)))
+        else:
+            written.append(_write(os.path.join(target_dir, destination), data))
+    return written
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
@@ -1,6 +1,25 @@
+import json
+import re
+from datetime import date
+
 from django.shortcuts import render
-from django.http import HttpResponse
-from .models import Author, Genre, Language, Book, BookInstance
+from django.db.models import Exists, OuterRef, Prefetch
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse, Http404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+from .models import Author, Book, BookInstance, GenreSummary, LanguageSummary, GenreLanguageSummary
+from .stats import CatalogStats
+from .pagination import CursorPaginationMixin
+from . import search
+from . import export
+from . import availability
+from . import metrics
+from . import visits
+from .caching import CachedViewMixin, attach_versions, book_tag, author_tag
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 
@@ -21,47 +40,23 @@ def index(request):
     # Поиск Field:
     # https://django.fun/docs/django/ru/4.0/ref/models/querysets/#field-lookups
 
-    # Генерация "количеств" некоторых главных объектов
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-
-    # Доступные книги (статус = 'н')
-    num_instances_available = BookInstance.objects.filter(status__exact='н').count()
-
-    # Метод 'all()' применён по умолчанию.
-    num_authors = Author.objects.count()
-
-    # Количество жанров и количество книг, которые содержат в своих заголовках какое-либо слово (без учёта регистра)
-    num_genres_word = Genre.objects.filter(name__icontains='Роман').count()
-    num_books_word = Book.objects.filter(title__icontains='Мастер').count()
+    # Генерация "количеств" некоторых главных объектов: книги, копии, доступные копии (статус = 'н'), авторы,
+    # количество жанров и книг, которые содержат в своих заголовках какое-либо слово (без учёта регистра).
+    # Все счётчики считаются одним запросом и берутся из кэша, пока каталог не изменится (см. catalog/stats.py)
+    stats = CatalogStats.get()
 
-    # Как использовать сессии:
-    # https://django.fun/docs/django/ru/4.0/topics/http/sessions/
-    # Количество посещений этого представления, подсчитанное в переменной сеанса.
-
-    num_visits = request.session.get('num_visits', 0)
-
-    # Подбор числового окончания "раз" = True  или "раза" = False
-    def the_ending():
-        value = num_visits % 10
-        if value == 2 or value == 3 or value == 4:
-            request.session['num_visits'] = num_visits + 1
-            return False
-        return True
-
-    request.session['num_visits'] = num_visits + 1
+    # Количество посещений этого представления хранится в подписанном cookie, а не в сессии:
+    # просмотр главной страницы ничего не записывает в базу данных (см. catalog/visits.py)
+    num_visits = visits.get_visits(request)
 
     # Отрисовка HTML-шаблона index.html с данными в переменной контекста context
-    return render(request, 'catalog/index.html', context={
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_genres_word': num_genres_word,
-        'num_books_word': num_books_word,
+    response = render(request, 'catalog/index.html', context={
+        **stats,
         'num_visits': num_visits,
-        'the_ending': the_ending,
+        # Подбор числового окончания "раз" = True  или "раза" = False
+        'the_ending': visits.the_ending(num_visits),
     })
+    return visits.set_visits(response, num_visits + 1)
 
 
 # Встроенный API представлений на основе классов:
@@ -69,7 +64,7 @@ def index(request):
 # https://ccbv.co.uk/
 # Общие представления на основе классов - упрощенный индекс:
 # https://django.fun/docs/django/ru/4.0/ref/class-based-views/flattened-index/#ListView
-class BookListView(generic.ListView):
+class BookListView(CachedViewMixin, CursorPaginationMixin, generic.ListView):
     """Представление просмотра списка"""
     model = Book
     # Ваше собственное имя для списка в качестве переменной шаблона
@@ -78,62 +73,312 @@ class BookListView(generic.ListView):
     # queryset = Book.objects.filter(title__icontains='Мастер')[:5]
     # Укажите собственное имя/местоположение шаблона
     template_name = 'catalog/book_list.html'
-    # Постраничный вывод (Pagination)
+    # Постраничный вывод (Pagination) по курсору, а не по номеру страницы (см. catalog/pagination.py).
+    # У Book нет Meta.ordering, поэтому страницы упорядочены по pk
     paginate_by = 3
 
     def get_queryset(self):
-        # Получите список всех книг
-        return Book.objects.all()
+        # Получите список всех книг (автор и счётчики доступности выводятся в списке - подтягиваем их тем же запросом)
+        return Book.objects.select_related('author', 'availability')
+
+    def get_cache_tags(self):
+        # Кэш страниц списка сбрасывается при изменении любой книги или автора и при изменении доступности копий
+        # (см. catalog/caching.py)
+        return ['books', 'availability']
 
     def get_context_data(self, *, object_list=None, **kwargs):
         # В первую очередь получаем базовую реализацию контекста
         context = super(BookListView, self).get_context_data(**kwargs)
         # Добавляем новую переменную к контексту и инициализируем её некоторым значением
         context['some_data'] = 'Это просто некоторые данные'
+        # Версии книг для кэша строк списка в шаблоне
+        attach_versions(context['book_list'], book_tag)
         return context
 
 
-class BookDetailView(generic.DetailView):
+class BookDetailView(CachedViewMixin, generic.DetailView):
     """Представление подробного вида"""
     model = Book
 
+    def get_cache_tags(self):
+        # Страница книги зависит от самой книги (с автором и копиями) и справочников жанров и языков
+        return [book_tag(self.kwargs['pk']), 'genres', 'languages']
 
-class AuthorListView(generic.ListView):
+    # Копий на странице: у популярной книги их тысячи, полный список - в админке (см. BookInstanceAdmin)
+    copies_limit = 20
+
+    def get_queryset(self):
+        # Автор, язык и журнал доступности (всего копий) подтягиваются тем же запросом (JOIN), жанры - одним
+        # запросом на связь, а не отдельным ленивым запросом из шаблона:
+        # https://django.fun/docs/django/ru/4.0/ref/models/querysets/#select-related
+        # https://django.fun/docs/django/ru/4.0/ref/models/querysets/#prefetch-related
+        return Book.objects.select_related('author', 'language', 'availability').prefetch_related('genre')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Первые copies_limit копий одним запросом с LIMIT - в порядке индекса book_id, без сортировки
+        # (pk копии - UUID, сортировка по нему или по due_back перебирала бы все копии книги)
+        context['copies'] = list(self.object.bookinstance_set.order_by()[:self.copies_limit])
+        return context
+
+
+class AuthorListView(CachedViewMixin, CursorPaginationMixin, generic.ListView):
     """Представление просмотра списка"""
     model = Author
     context_object_name = 'author_list'
     template_name = 'catalog/author_list.html'
+    # Курсор по Meta.ordering (last_name, first_name) и pk
     paginate_by = 3
 
     def get_queryset(self):
-        return Author.objects.all()
+        # Количество книг автора - из сводки (AuthorSummary), тем же запросом
+        return Author.objects.select_related('summary')
 
+    def get_cache_tags(self):
+        return ['authors']
 
-class AuthorDetailView(generic.DetailView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Версии авторов для кэша строк списка в шаблоне
+        attach_versions(context['author_list'], author_tag)
+        return context
+
+
+class AuthorDetailView(CachedViewMixin, generic.DetailView):
     """Представление подробного вида"""
     model = Author
 
+    def get_cache_tags(self):
+        # Страница автора зависит от автора и его книг с количеством копий
+        return [author_tag(self.kwargs['pk'])]
+
+    def get_queryset(self):
+        # Книги автора загружаются одним запросом вместе с количеством копий каждой книги (num_copies) из журнала
+        # доступности (BookAvailability, LEFT JOIN без группировки), количество книг и копий автора - из сводки
+        # (AuthorSummary, catalog/facets.py): копии не пересчитываются при каждом запросе
+        books = Book.objects.annotate(num_copies=Coalesce('availability__total', 0))
+        return Author.objects.select_related('summary').prefetch_related(Prefetch('book_set', queryset=books))
+
+
+class BrowseView(CachedViewMixin, CursorPaginationMixin, generic.ListView):
+    """Обзор книг по жанру и языку (?genre=<id>&language=<id>) с количеством книг у каждого значения фильтра."""
+    model = Book
+    context_object_name = 'book_list'
+    template_name = 'catalog/browse.html'
+    paginate_by = 10
+
+    def get_cache_tags(self):
+        # 'book-genres' - жанры книг, 'genres' и 'languages' - названия значений фильтров,
+        # 'availability' - значки доступности книг
+        return ['books', 'book-genres', 'genres', 'languages', 'availability']
+
+    def get_filter(self, name):
+        value = self.request.GET.get(name, '')
+        return int(value) if value.isdigit() else None
+
+    def filter_url(self, **filters):
+        """Адрес обзора с изменёнными фильтрами (None - фильтр снят); позиция страницы сбрасывается."""
+        params = self.request.GET.copy()
+        params.pop(self.cursor_query_param, None)
+        for name, value in filters.items():
+            params.pop(name, None)
+            if value is not None:
+                params[name] = value
+        query = params.urlencode()
+        return '{0}?{1}'.format(self.request.path, query) if query else self.request.path
+
+    def get_facet(self, name, rows):
+        """Значения фильтра name из строк сводки (pk, название, книг) со ссылками для шаблона."""
+        selected = self.get_filter(name)
+        return [{'pk': pk, 'name': title, 'books': books, 'selected': pk == selected,
+                 'url': self.filter_url(**{name: pk})} for pk, title, books in rows]
+
+    @cached_property
+    def facets(self):
+        """Значения фильтров жанра и языка с количеством книг с учётом другого выбранного фильтра.
+
+        Счётчики берутся из сводок (catalog/facets.py): по строке на значение фильтра, независимо от количества книг.
+        """
+        genre_id, language_id = self.get_filter('genre'), self.get_filter('language')
+        if language_id is None:
+            genres = GenreSummary.objects.values_list('genre_id', 'genre__name', 'books')
+        else:
+            genres = GenreLanguageSummary.objects.filter(language_id=language_id).values_list(
+                'genre_id', 'genre__name', 'books')
+        if genre_id is None:
+            languages = LanguageSummary.objects.values_list('language_id', 'language__name', 'books')
+        else:
+            languages = GenreLanguageSummary.objects.filter(genre_id=genre_id).values_list(
+                'language_id', 'language__name', 'books')
+        return {
+            'genre': self.get_facet('genre', genres.order_by('genre__name')),
+            'language': self.get_facet('language', languages.order_by('language__name')),
+        }
+
+    def count(self, name):
+        """Количество книг выбранного значения фильтра name; None - фильтр не выбран."""
+        if self.get_filter(name) is None:
+            return None
+        return next((item['books'] for item in self.facets[name] if item['selected']), 0)
+
+    def get_num_books(self):
+        for name in ('genre', 'language'):
+            if self.count(name) is not None:
+                return self.count(name)
+        return CatalogStats.get()['num_books']
+
+    def get_queryset(self):
+        books = Book.objects.select_related('author', 'availability')
+        genre_id, language_id = self.get_filter('genre'), self.get_filter('language')
+        if language_id is not None:
+            books = books.filter(language_id=language_id)
+        if genre_id is not None:
+            # Страница упорядочена по pk. Если книг жанра много, её быстрее набрать, проверяя жанр у книг подряд
+            # (EXISTS по индексу промежуточной таблицы), чем соединять и сортировать все книги жанра; если мало -
+            # наоборот. Из сводок известно m - книг жанра среди примерно n проверяемых (сумма счётчиков жанров,
+            # книга с несколькими жанрами учитывается несколько раз): сортировка m строк против n / m * paginate_by
+            # проверок.
+            scanned = sum(item['books'] for item in self.facets['genre'])
+            if self.count('genre') ** 2 >= scanned * self.paginate_by:
+                books = books.filter(Exists(Book.genre.through.objects.filter(book_id=OuterRef('pk'),
+                                                                              genre_id=genre_id)))
+            else:
+                books = books.filter(genre=genre_id)
+        return books
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['genres'] = self.facets['genre']
+        context['languages'] = self.facets['language']
+        context['all_genres_url'] = self.filter_url(genre=None)
+        context['all_languages_url'] = self.filter_url(language=None)
+        context['num_books'] = self.get_num_books()
+        return context
+
 
 # Тестирование проверки подлинности пользователей
 # Тестирование в представления
 # https://django.fun/docs/django/ru/4.0/topics/auth/default/#limiting-access-to-logged-in-users
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     """Общий список книг на основе классов, предоставленных текущему пользователю."""
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
+    # Курсор по Meta.ordering (due_back) и UUID pk
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='в').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='в') \
+            .select_related('book').order_by('due_back')
 
 
-class LoanedBooksByStaffListView(PermissionRequiredMixin, generic.ListView):
+class LoanedBooksByStaffListView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     """Проверка разрешений на основе класса, предоставленных текущему сотруднику."""
     model = BookInstance
     template_name = 'catalog/bookinstance_list_all_book_borrowed_staff.html'
+    # Курсор по Meta.ordering (due_back) и UUID pk
     paginate_by = 10
     # Разрешения
     permission_required = 'catalog.can_mark_returned'
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='в').order_by('due_back')
+        queryset = BookInstance.objects.filter(status__exact='в').select_related('book', 'borrower')
+        if self.request.GET.get('overdue') == '1':
+            # Только просроченные: условие по индексу (status, due_back), а не проверка is_overdue в шаблоне
+            queryset = queryset.filter(due_back__lt=date.today())
+        return queryset.order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['overdue_only'] = self.request.GET.get('overdue') == '1'
+        return context
+
+
+class SearchView(generic.ListView):
+    """Полнотекстовый поиск по книгам (заголовок, изложение, ISBN, автор, жанры) с ранжированием."""
+    template_name = 'catalog/search.html'
+    context_object_name = 'book_list'
+    # Результаты ранжированы по релевантности, поэтому страницы - обычные, по номеру (LIMIT/OFFSET по индексу FTS5)
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        if not self.query:
+            return []
+        return search.search(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+@staff_member_required
+def export_catalog(request, dataset):
+    """Потоковая выгрузка каталога для сотрудников: /catalog/export/<набор>/?format=jsonl&gzip=1"""
+    fmt = request.GET.get('format', 'csv')
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        raise Http404('Неизвестный набор данных или формат.')
+    compress = request.GET.get('gzip') == '1'
+
+    # Потоковые ответы:
+    # https://django.fun/docs/django/ru/4.0/ref/request-response/#streaminghttpresponse-objects
+    response = StreamingHttpResponse(export.stream(dataset, fmt, compress),
+                                     content_type='application/gzip' if compress else export.FORMATS[fmt])
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(export.filename(dataset, fmt, compress))
+    return response
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def book_availability(request):
+    """
+    Доступность копий по списку ISBN (catalog/availability.py):
+        GET /catalog/availability/?isbn=9780000000001,9780000000002&format=csv
+        POST /catalog/availability/ - ISBN через пробелы, запятые или переводы строк,
+                                      либо JSON: ["9780...", ...] или {"isbns": [...]}
+    Ответ - поток строк в формате jsonl (по умолчанию) или csv, сжатый gzip, если клиент его принимает.
+    """
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in export.FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат.')
+    if request.method == 'POST':
+        isbns = _posted_isbns(request)
+        if isbns is None:
+            return HttpResponseBadRequest('Неверный JSON: ожидается список ISBN или {"isbns": [...]}.')
+    else:
+        isbns = [isbn for value in request.GET.getlist('isbn') for isbn in value.split(',')]
+    isbns = availability.normalize(isbns)
+    if not isbns:
+        return HttpResponseBadRequest('Не указаны ISBN.')
+    if len(isbns) > availability.MAX_ISBNS:
+        return HttpResponseBadRequest('Не больше {0} ISBN в одном запросе.'.format(availability.MAX_ISBNS))
+
+    compress = re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None
+    response = StreamingHttpResponse(
+        export.encode(availability.COLUMNS, availability.lookup(isbns), fmt, compress),
+        content_type=export.FORMATS[fmt])
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def _posted_isbns(request):
+    """Список ISBN из тела POST-запроса; None - если JSON неверный."""
+    if request.content_type != 'application/json':
+        return re.split(r'[\s,;]+', request.body.decode('utf-8', 'replace'))
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get('isbns')
+    if not isinstance(data, list) or not all(isinstance(isbn, str) for isbn in data):
+        return None
+    return data
+
+
+@staff_member_required
+def request_metrics(request):
+    """Гистограммы времени и SQL-запросов по представлениям для сотрудников (catalog/metrics.py)."""
+    return JsonResponse(metrics.snapshot(), json_dumps_params={'ensure_ascii': False, 'indent': 2})
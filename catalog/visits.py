@@ -0,0 +1,34 @@
+"""
+Счётчик посещений главной страницы в подписанном cookie.
+
+Раньше счётчик хранился в сессии, и каждый просмотр главной страницы записывал сессию (UPDATE django_session
+при сессиях в базе данных - под блокировкой записи SQLite). Подписанный cookie не требует записи на сервере,
+а подпись не даёт клиенту подменить значение.
+
+Подписанные cookie:
+https://django.fun/docs/django/ru/4.0/ref/request-response/#django.http.HttpResponse.set_signed_cookie
+"""
+
+COOKIE_NAME = 'num_visits'
+SALT = 'catalog.visits'
+MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_visits(request):
+    """Количество предыдущих посещений (0 - для нового посетителя или при неверной подписи)."""
+    value = request.get_signed_cookie(COOKIE_NAME, default='0', salt=SALT, max_age=MAX_AGE)
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return 0
+
+
+def set_visits(response, num_visits):
+    response.set_signed_cookie(COOKIE_NAME, str(num_visits), salt=SALT, max_age=MAX_AGE,
+                               httponly=True, samesite='Lax')
+    return response
+
+
+def the_ending(num_visits):
+    """Числовое окончание: "раз" = True или "раза" = False (2, 3, 4 раза)."""
+    return num_visits % 10 not in (2, 3, 4)
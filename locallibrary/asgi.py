@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from locallibrary.preload import preload
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_asgi_application()
+
+# URLconf и шаблонные движки загружаются сразу, а не при первом запросе (см. locallibrary/preload.py)
+preload()
@@ -0,0 +1,48 @@
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+"""
+Движок SQLite с настройкой соединения для рабочего сервера (см. locallibrary/settings_production.py).
+
+Дополнительные ключи DATABASES['default']['OPTIONS'] (остальные передаются в sqlite3.connect()):
+    'pragmas' - словарь PRAGMA, выполняемых при открытии каждого соединения (journal_mode, synchronous, ...);
+    'transaction_mode' - 'DEFERRED' (по умолчанию), 'IMMEDIATE' или 'EXCLUSIVE'.
+
+С transaction_mode = 'IMMEDIATE' транзакция (transaction.atomic()) сразу берёт блокировку записи и ждёт её
+до busy_timeout. В режиме DEFERRED транзакция, начавшая с чтения, при первой записи получает
+"database is locked" без ожидания, если другое соединение уже пишет.
+
+Движки баз данных и PRAGMA SQLite:
+https://django.fun/docs/django/ru/4.0/ref/databases/#sqlite-notes
+https://www.sqlite.org/pragma.html
+https://www.sqlite.org/wal.html
+"""
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop('transaction_mode', 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured('Неизвестный transaction_mode: {0}'.format(self.transaction_mode))
+        for name in self.pragmas:
+            if not PRAGMA_NAME.match(name):
+                raise ImproperlyConfigured('Неверное имя PRAGMA: {0}'.format(name))
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute('PRAGMA {0} = {1}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN {0}'.format(self.transaction_mode))
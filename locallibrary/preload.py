@@ -0,0 +1,24 @@
+from django.template import engines
+from django.urls import get_resolver
+
+"""
+Подготовка процесса приложения до первого запроса (вызывается из locallibrary/wsgi.py и asgi.py).
+
+Django загружает URLconf (а с ним представления, формы и модули каталога), строит таблицу обратного
+разрешения адресов (первый вызов reverse() или {% url %} компилирует регулярные выражения всех маршрутов)
+и создаёт шаблонный движок (импортируя библиотеки шаблонных тегов всех приложений) только при первом запросе,
+и его время отклика включает эту работу. preload() выполняет её при импорте приложения: с gunicorn --preload - один раз
+в главном процессе до запуска рабочих (они получают готовые модули при fork), без --preload - при старте
+каждого рабочего процесса, до того как он начнёт принимать запросы. Соединения с базой данных не открываются.
+
+Настройки gunicorn preload_app:
+https://docs.gunicorn.org/en/stable/settings.html#preload-app
+"""
+
+
+def preload():
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for engine in engines.all():
+        engine.engine.template_libraries
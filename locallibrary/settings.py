@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Измерение запросов: SQL, шаблоны, общее время (catalog/metrics.py) - первым, чтобы учесть все слои
+    'catalog.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # Управление сессиями между запросами
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,7 +61,8 @@ ROOT_URLCONF = 'locallibrary.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с измерением времени отрисовки (catalog/metrics.py)
+        'BACKEND': 'catalog.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -88,6 +91,24 @@ DATABASES = {
 }
 
 
+# Кэш (счётчики главной страницы, страницы каталога - см. catalog/stats.py, catalog/caching.py).
+# Локальная память подходит для одного процесса; при нескольких процессах нужен общий кэш (Memcached, Redis),
+# иначе сброс меток в одном процессе не увидят остальные.
+# https://django.fun/docs/django/ru/4.0/topics/cache/#setting-up-the-cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'locallibrary',
+    }
+}
+
+# Асинхронные представления страниц каталога (catalog/async_views.py) - при запуске под ASGI (locallibrary/asgi.py)
+CATALOG_ASYNC_VIEWS = False
+
+# Запросы дольше этого времени (мс) пишутся в журнал 'catalog.performance' (catalog/metrics.py)
+CATALOG_SLOW_REQUEST_MS = 500
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -124,6 +145,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Каталог, в который collectstatic собирает статические файлы всех приложений (не хранится в репозитории)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
 # Тип поля первичного ключа по умолчанию
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,117 @@
+"""
+Настройки для рабочего сервера: общие настройки locallibrary/settings.py с изменениями для эксплуатации.
+
+    DJANGO_SETTINGS_MODULE=locallibrary.settings_production DJANGO_SECRET_KEY=... gunicorn --preload locallibrary.wsgi
+
+С --preload приложение (настройки, модели, URLconf, шаблонные движки - см. locallibrary/preload.py)
+загружается один раз в главном процессе, и рабочие процессы после fork сразу готовы принимать запросы.
+
+Сборка перед запуском (с теми же переменными окружения): библиотеки интерфейса, если их ещё нет в репозитории
+(catalog/vendor.py), статические файлы и проверки развёртывания - без библиотек check --deploy завершается ошибкой.
+
+    python manage.py vendor_static
+    python manage.py collectstatic --noinput
+    python manage.py createcachetable
+    python manage.py check --deploy
+
+Контрольный список развёртывания:
+https://django.fun/docs/django/ru/4.0/howto/deployment/checklist/
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
+
+# Приложения только для разработки не загружаются: django_extensions (shell_plus, runserver_plus) при создании
+# шаблонного движка импортирует свои шаблонные теги, а с ними pygments (см. benchmarks/startup.py)
+DEV_APPS = ['django_extensions']
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEV_APPS]
+
+
+# База данных SQLite с настройкой соединений (locallibrary/backends/sqlite3/base.py):
+# - WAL: читатели не блокируют писателя и наоборот, synchronous = NORMAL в режиме WAL безопасен для целостности;
+# - busy_timeout: ожидание блокировки записи вместо немедленной ошибки "database is locked";
+# - mmap_size, cache_size (в КиБ при отрицательном значении): чтение страниц из памяти;
+# - transaction_mode = IMMEDIATE: транзакция сразу берёт блокировку записи и ждёт её (см. движок).
+# Постоянные соединения (CONN_MAX_AGE) с проверкой перед повторным использованием (CONN_HEALTH_CHECKS):
+# https://django.fun/docs/django/ru/4.0/ref/databases/#persistent-connections
+DATABASES = {
+    'default': {
+        'ENGINE': 'locallibrary.backends.sqlite3',
+        'NAME': os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Секунды ожидания блокировки на уровне модуля sqlite3 (совпадает с busy_timeout)
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+                'temp_store': 'MEMORY',
+            },
+        },
+    }
+}
+
+
+# Общий кэш всех рабочих процессов: версии меток страниц (catalog/caching.py) и счётчики главной страницы
+# (catalog/stats.py) сбрасываются в одном процессе, а читаются во всех - с LocMemCache остальные процессы отдавали бы
+# устаревшие страницы и ответы 304 до истечения срока. Redis - если задан DJANGO_REDIS_URL (нужен пакет redis),
+# иначе таблица кэша в той же базе данных (создаётся командой createcachetable).
+# https://django.fun/docs/django/ru/4.0/topics/cache/#database-caching
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'catalog_cache',
+            # По умолчанию 300 записей - меньше, чем страниц и меток каталога
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+
+# Шаблоны компилируются один раз на процесс (cached loader) независимо от DEBUG; APP_DIRS заменяется явным
+# списком загрузчиков. Изменённые шаблоны подхватываются только после перезапуска сервера.
+# https://django.fun/docs/django/ru/4.0/ref/templates/api/#django.template.loaders.cached.Loader
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+
+# Статические файлы: collectstatic добавляет к именам хэш содержимого и записывает сжатые копии (.gz, .br),
+# StaticFilesMiddleware отдаёт их из процесса приложения раньше остальных слоёв (locallibrary/staticfiles.py).
+# https://django.fun/docs/django/ru/4.0/howto/static-files/deployment/
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'locallibrary.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+MIDDLEWARE = ['locallibrary.staticfiles.StaticFilesMiddleware'] + MIDDLEWARE
@@ -0,0 +1,35 @@
+"""
+Настройки для проверки чтения каталога с реплик на одной машине: основная база и реплика - два файла SQLite.
+
+    python manage.py migrate --settings=locallibrary.settings_replicas
+    python manage.py sync_replica --settings=locallibrary.settings_replicas --interval 5
+    python manage.py runserver --settings=locallibrary.settings_replicas
+
+Реплика обновляется командой sync_replica; интервал имитирует отставание реплики и не должен превышать
+CATALOG_REPLICA_LAG. См. catalog/routers.py и catalog/middleware.py.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        # В тестах реплика - та же база, что и основная
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['catalog.routers.CatalogReplicaRouter']
+
+# Базы данных для чтения каталога и допустимое отставание реплик (секунды)
+CATALOG_READ_REPLICAS = ['replica']
+CATALOG_REPLICA_LAG = 5
+
+# Перед SessionMiddleware: сохранение сессии тоже считается записью
+MIDDLEWARE = MIDDLEWARE[:2] + ['catalog.middleware.PrimaryPinMiddleware'] + MIDDLEWARE[2:]
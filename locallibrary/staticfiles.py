@@ -0,0 +1,168 @@
+import gzip
+import json
+import mimetypes
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # без brotli создаются и отдаются только .gz
+    brotli = None
+
+"""
+Статические файлы на рабочем сервере (locallibrary/settings_production.py).
+
+CompressedManifestStaticFilesStorage - хранилище collectstatic: к именам файлов добавляется хэш содержимого
+(catalog/css/styles.css -> catalog/css/styles.1a2b3c4d5e6f.css, ссылки в CSS переписываются), а рядом
+записываются сжатые копии .gz и .br (если установлен пакет brotli) - сжатие выполняется один раз при сборке.
+
+StaticFilesMiddleware отдаёт собранные файлы (STATIC_ROOT) из процесса приложения без отдельного веб-сервера:
+список файлов читается один раз при запуске, сжатая копия выбирается по Accept-Encoding, файлы с хэшем
+в имени кэшируются браузером на год (содержимое по такому адресу не меняется), остальные проверяются по ETag.
+Слой поддерживает и асинхронный режим, чтобы под ASGI не переключать режим вокруг остальных слоёв.
+
+    python manage.py collectstatic --settings=locallibrary.settings_production
+
+ManifestStaticFilesStorage:
+https://django.fun/docs/django/ru/4.0/ref/contrib/staticfiles/#manifeststaticfilesstorage
+"""
+
+# Сжимаются текстовые форматы; изображения и woff/woff2 уже сжаты
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.eot', '.ttf', '.otf', '.ico')
+MIN_SIZE = 256
+
+# Кодировки в порядке предпочтения: (значение Content-Encoding, расширение сжатой копии)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=60'
+
+
+def compress(path):
+    """Записывает сжатые копии файла path; копия, которая не меньше исходного файла, не записывается."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, создающее сжатые копии собранных файлов."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Сжимаются исходные имена (на них могут ссылаться сторонние скрипты) и окончательные хэшированные имена
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE) and self.exists(name) and self.size(name) >= MIN_SIZE:
+                compress(self.path(name))
+
+
+class StaticFile:
+    """Собранный статический файл и его сжатые копии."""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.etag = '"{0:x}-{1:x}"'.format(stat.st_size, stat.st_mtime_ns)
+        self.last_modified = http_date(stat.st_mtime)
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.variants = [(encoding, path + suffix, os.path.getsize(path + suffix))
+                         for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)]
+
+    def choose(self, accept_encoding):
+        for encoding, path, size in self.variants:
+            if encoding in accept_encoding:
+                return encoding, path, size
+        return None, self.path, self.size
+
+    def response(self, request):
+        if self.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            encoding, path, size = self.choose(request.headers.get('Accept-Encoding', ''))
+            response = FileResponse(open(path, 'rb'), content_type=self.content_type)
+            # FileResponse добавляет Content-Disposition с именем сжатой копии - для статики он не нужен
+            del response['Content-Disposition']
+            response['Content-Length'] = size
+            response['Last-Modified'] = self.last_modified
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = self.etag
+        response['Cache-Control'] = self.cache_control
+        response['X-Content-Type-Options'] = 'nosniff'
+        if self.variants:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+def scan(root, prefix):
+    """Файлы каталога root по адресам prefix + путь; хэшированные имена берутся из манифеста collectstatic."""
+    hashed = set()
+    manifest = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf-8') as file:
+            hashed = set(json.load(file).get('paths', {}).values())
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            files[prefix + relative] = StaticFile(path, relative in hashed)
+    return files
+
+
+class StaticFilesMiddleware:
+    """Отдаёт файлы STATIC_ROOT, не передавая запрос остальным слоям; первым в MIDDLEWARE."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.prefix = settings.STATIC_URL
+        self.files = scan(settings.STATIC_ROOT, self.prefix) if os.path.isdir(settings.STATIC_ROOT) else {}
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(static_file, request)
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        if static_file is None:
+            return await self.get_response(request)
+        return self.serve(static_file, request)
+
+    def find(self, request):
+        return self.files.get(request.path) if request.path.startswith(self.prefix) else None
+
+    def serve(self, static_file, request):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return static_file.response(request)
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from locallibrary.preload import preload
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_wsgi_application()
+
+# URLconf и шаблонные движки загружаются сразу, а не при первом запросе (см. locallibrary/preload.py)
+preload()